@@ -0,0 +1,84 @@
+# pylint: disable=duplicate-code, no-member
+"""Tracks which sensor alerts are active so botanists are only emailed when an alert changes"""
+import os
+from datetime import datetime, timedelta
+import pymssql
+
+SENSOR_TYPES = ('moisture', 'temperature')
+ALERT_COOLDOWN = timedelta(minutes=int(os.getenv("ALERT_COOLDOWN_MINUTES", "60")))
+
+
+def get_alert_states(conn: pymssql.Connection) -> dict[tuple, dict]:
+    '''Gets the stored alert state for every plant and sensor, keyed by (plant_id, sensor_type)'''
+    cur = conn.cursor()
+    cur.execute("""SELECT plant_id, sensor_type, is_active, notified, last_sent
+                   FROM alert_state""")
+    states = {(row[0], row[1]): {'is_active': bool(row[2]), 'notified': bool(row[3]),
+                                 'last_sent': row[4]}
+              for row in cur.fetchall()}
+    cur.close()
+    return states
+
+
+def get_alert_changes(anomalies: dict[str, list[int]], checked_plants: set[int],
+                      states: dict[tuple, dict], now: datetime,
+                      cooldown: timedelta = ALERT_COOLDOWN) -> tuple[dict, dict, list[tuple]]:
+    '''Compares this run's anomalies with the stored alert states.
+    Returns the new alerts and resolved alerts to email, each of the form
+    {'moisture': [plant_ids], 'temperature': [plant_ids]}, and the alert_state rows to save.
+    An alert that re-opens within the cooldown of the last email is recorded but not sent
+    until the cooldown has passed, and only plants with new measurements this run can resolve'''
+    new_alerts = {sensor: [] for sensor in SENSOR_TYPES}
+    resolved = {sensor: [] for sensor in SENSOR_TYPES}
+    updates = []
+
+    for sensor in SENSOR_TYPES:
+        flagged = set(anomalies[sensor])
+        for plant_id in flagged:
+            state = states.get((plant_id, sensor))
+            is_active = bool(state and state['is_active'])
+            if is_active and state['notified']:
+                continue
+            last_sent = state['last_sent'] if state else None
+            if last_sent is None or now - last_sent >= cooldown:
+                new_alerts[sensor].append(plant_id)
+                updates.append((plant_id, sensor, True, True, now, now))
+            elif not is_active:
+                updates.append((plant_id, sensor, True, False, last_sent, now))
+
+        for (plant_id, state_sensor), state in states.items():
+            if (state_sensor == sensor and state['is_active']
+                    and plant_id in checked_plants and plant_id not in flagged):
+                if state['notified']:
+                    resolved[sensor].append(plant_id)
+                updates.append((plant_id, sensor, False, False, state['last_sent'], now))
+
+    return new_alerts, resolved, updates
+
+
+def save_alert_states(conn: pymssql.Connection, updates: list[tuple],
+                      commit: bool = True) -> None:
+    '''Upserts changed alert states, committing unless the caller saves them
+    in a transaction with other changes'''
+    if not updates:
+        return
+    sql = """
+        MERGE alert_state AS target
+        USING (SELECT %s AS plant_id, %s AS sensor_type, %s AS is_active,
+                      %s AS notified, %s AS last_sent, %s AS updated_at) AS source
+        ON target.plant_id = source.plant_id AND target.sensor_type = source.sensor_type
+        WHEN MATCHED THEN UPDATE SET
+            is_active = source.is_active,
+            notified = source.notified,
+            last_sent = source.last_sent,
+            updated_at = source.updated_at
+        WHEN NOT MATCHED THEN INSERT
+            (plant_id, sensor_type, is_active, notified, last_sent, updated_at)
+        VALUES (source.plant_id, source.sensor_type, source.is_active,
+                source.notified, source.last_sent, source.updated_at);
+        """
+    cur = conn.cursor()
+    cur.executemany(sql, [(int(row[0]),) + row[1:] for row in updates])
+    if commit:
+        conn.commit()
+    cur.close()
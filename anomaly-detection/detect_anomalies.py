@@ -1,22 +1,26 @@
-# pylint: disable=duplicate-code
-'''This script detects anomalies in the last 15 measurements from the plant readers'''
-import os
+# pylint: disable=duplicate-code, no-member
+'''This script detects anomalies in new measurements from the plant readers'''
 from datetime import datetime, timedelta
 import pytz
-from scipy.stats import zscore
-from dotenv import load_dotenv
 import pymssql
+import numpy as np
 import pandas as pd
+from dotenv import load_dotenv
+from db_connection import get_connection
+from anomaly_engine import METRICS, ZSCORE_THRESHOLD, add_zscores, count_anomalies
+
+# Running statistics forget old readings by capping their weight at a day of per-minute readings
+WINDOW_SIZE = 1440
+# Plants with fewer readings than this are scored against the new readings alone
+MIN_SAMPLES = 30
+DEFAULT_LOOKBACK_MINUTES = 15
+STATISTICS_COLUMNS = ['plant_id', 'sample_count', 'moisture_mean', 'moisture_m2',
+                      'temperature_mean', 'temperature_m2', 'last_measurement_time']
 
 
 def get_connection_to_db() -> pymssql.Connection:
-    """Gets a pymssql connection to the short term MS SQL short-term DB"""
-    load_dotenv()
-    return pymssql.connect(host=os.getenv("DB_HOST"),
-                           database=os.getenv("DB_NAME"),
-                           user=os.getenv("DB_USERNAME"),
-                           password=os.getenv("DB_PASSWORD"),
-                           port=os.getenv("DB_PORT"))
+    """Gets the cached pymssql connection to the short term MS SQL short-term DB"""
+    return get_connection()
 
 
 def get_time_n_minutes_ago(n: int) -> datetime:
@@ -42,24 +46,134 @@ def get_sql_for_recent_measurements(n: int) -> str:
 
 def get_recent_measurements(n: int = 15) -> pd.DataFrame:
     '''Gets a dataframe with the last n measurement batches from the short-term database'''
-    try:
-        conn = get_connection_to_db()
-        sql = get_sql_for_recent_measurements(n)
-        df = pd.read_sql(sql, conn)
-        return df
-    finally:
-        conn.close()
-
-
-def add_zscore_columns(measurements: pd.DataFrame) -> pd.DataFrame:
-    '''Returns a measurements df with added zscore columns for moisture and temperature'''
-    measurements[['moisture_zscore', 'temperature_zscore']
-                 ] = measurements[['moisture', 'temperature']].apply(zscore)
+    conn = get_connection_to_db()
+    sql = get_sql_for_recent_measurements(n)
+    return pd.read_sql(sql, conn)
+
+
+def add_zscore_columns(measurements: pd.DataFrame,
+                       statistics: pd.DataFrame | None = None) -> pd.DataFrame:
+    '''Returns a measurements df with added zscore columns for moisture and temperature,
+    scored per plant against its running statistics, or against the plant's own
+    readings in the df when it has fewer than MIN_SAMPLES prior readings'''
+    measurements = add_zscores(measurements)
+
+    if statistics is None or statistics.empty:
+        return measurements
+
+    baseline = statistics.set_index('plant_id').reindex(measurements['plant_id'])
+    sample_count = baseline['sample_count'].to_numpy(dtype=float)
+    established = sample_count >= MIN_SAMPLES
+    for metric in METRICS:
+        std = np.sqrt(baseline[f'{metric}_m2'].to_numpy(dtype=float) / (sample_count - 1))
+        running_zscore = (measurements[metric].to_numpy(dtype=float)
+                          - baseline[f'{metric}_mean'].to_numpy(dtype=float)) / std
+        measurements[f'{metric}_zscore'] = np.where(
+            established, running_zscore, measurements[f'{metric}_zscore'])
     return measurements
 
 
+def get_plant_statistics(conn: pymssql.Connection) -> pd.DataFrame:
+    '''Gets the persisted running statistics and watermark for each plant'''
+    return pd.read_sql(f"SELECT {', '.join(STATISTICS_COLUMNS)} FROM plant_statistics", conn)
+
+
+def get_measurements_since(conn: pymssql.Connection) -> pd.DataFrame:
+    '''Gets measurements newer than each plant's watermark, filtering per plant in the
+    query so one lagging plant doesn't pull in everyone else's old readings. Plants
+    without statistics get the last DEFAULT_LOOKBACK_MINUTES of measurements'''
+    lookback = pd.Timestamp(get_time_n_minutes_ago(DEFAULT_LOOKBACK_MINUTES))
+    return pd.read_sql(
+        """SELECT m.plant_id, m.measurement_time, m.moisture, m.temperature
+           FROM measurement AS m
+           LEFT JOIN plant_statistics AS s ON s.plant_id = m.plant_id
+           WHERE m.measurement_time > COALESCE(s.last_measurement_time, %s)
+           ORDER BY m.measurement_time""", conn, params=(lookback.to_pydatetime(),))
+
+
+def update_running_statistics(statistics: pd.DataFrame,
+                              measurements: pd.DataFrame) -> pd.DataFrame:
+    '''Merges new measurements into each plant's running mean and M2 (sum of squared
+    differences) using the parallel form of Welford's algorithm, capping the sample
+    count at WINDOW_SIZE so the statistics follow a rolling window'''
+    grouped = measurements.groupby('plant_id')
+    new = grouped.size().rename('sample_count').to_frame()
+    for metric in METRICS:
+        new[f'{metric}_mean'] = grouped[metric].mean()
+        new[f'{metric}_m2'] = grouped[metric].var(ddof=0) * new['sample_count']
+    new['last_measurement_time'] = grouped['measurement_time'].max()
+
+    old = statistics.set_index('plant_id').reindex(new.index)
+    old_count = old['sample_count'].fillna(0)
+    count = old_count + new['sample_count']
+
+    merged = pd.DataFrame(index=new.index)
+    for metric in METRICS:
+        old_mean = old[f'{metric}_mean'].fillna(0)
+        delta = new[f'{metric}_mean'] - old_mean
+        merged[f'{metric}_mean'] = old_mean + delta * new['sample_count'] / count
+        m2 = (old[f'{metric}_m2'].fillna(0) + new[f'{metric}_m2']
+              + delta ** 2 * old_count * new['sample_count'] / count)
+        merged[f'{metric}_m2'] = m2 * np.minimum(1, (WINDOW_SIZE - 1) / (count - 1).clip(lower=1))
+    merged['sample_count'] = count.clip(upper=WINDOW_SIZE).astype(int)
+    merged['last_measurement_time'] = new['last_measurement_time']
+
+    unchanged = statistics[~statistics['plant_id'].isin(new.index)]
+    return pd.concat([unchanged, merged.reset_index()[STATISTICS_COLUMNS]], ignore_index=True)
+
+
+def save_plant_statistics(conn: pymssql.Connection, statistics: pd.DataFrame,
+                          commit: bool = True) -> None:
+    '''Upserts each plant's running statistics and watermark, committing unless the caller
+    saves them in a transaction with other changes'''
+    sql = """
+        MERGE plant_statistics AS target
+        USING (SELECT %s AS plant_id, %s AS sample_count, %s AS moisture_mean, %s AS moisture_m2,
+                      %s AS temperature_mean, %s AS temperature_m2, %s AS last_measurement_time
+              ) AS source
+        ON target.plant_id = source.plant_id
+        WHEN MATCHED THEN UPDATE SET
+            sample_count = source.sample_count,
+            moisture_mean = source.moisture_mean,
+            moisture_m2 = source.moisture_m2,
+            temperature_mean = source.temperature_mean,
+            temperature_m2 = source.temperature_m2,
+            last_measurement_time = source.last_measurement_time
+        WHEN NOT MATCHED THEN INSERT
+            (plant_id, sample_count, moisture_mean, moisture_m2,
+             temperature_mean, temperature_m2, last_measurement_time)
+        VALUES (source.plant_id, source.sample_count, source.moisture_mean, source.moisture_m2,
+                source.temperature_mean, source.temperature_m2, source.last_measurement_time);
+        """
+    rows = [(int(row.plant_id), int(row.sample_count), float(row.moisture_mean),
+             float(row.moisture_m2), float(row.temperature_mean), float(row.temperature_m2),
+             row.last_measurement_time.to_pydatetime())
+            for row in statistics[STATISTICS_COLUMNS].itertuples(index=False)]
+    if not rows:
+        return
+    cur = conn.cursor()
+    cur.executemany(sql, rows)
+    if commit:
+        conn.commit()
+
+
+def get_new_scored_measurements(conn: pymssql.Connection = None
+                                ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    '''Gets the measurements since the last run scored against each plant's running
+    statistics, and the statistics with them folded in. The statistics aren't saved here,
+    so the caller can save them, and with them the new watermark, once the measurements
+    have been acted on'''
+    conn = conn or get_connection_to_db()
+    statistics = get_plant_statistics(conn)
+    measurements = get_measurements_since(conn)
+    if measurements.empty:
+        return measurements.assign(moisture_zscore=[], temperature_zscore=[]), statistics
+    measurements = add_zscore_columns(measurements, statistics)
+    return measurements, update_running_statistics(statistics, measurements)
+
+
 def get_outliers_by_zscore(measurements: pd.DataFrame,
-                           zscore_threshold: float = 2.5) -> pd.DataFrame:
+                           zscore_threshold: float = ZSCORE_THRESHOLD) -> pd.DataFrame:
     '''Returns a dataframe of outliers whose 
     zscores is greater than 2.5 unless specified otherwise.'''
     # threshold will be specified later on based on data observations
@@ -73,12 +187,10 @@ def get_outliers_by_zscore(measurements: pd.DataFrame,
 def get_outlier_count_per_plant(measurements: pd.DataFrame) -> dict:
     '''Returns the count of outliers in a dictionary where the
       keys are the plant_ids and the values are the outlier counts'''
-    moist_outliers, temp_outliers = get_outliers_by_zscore(measurements)
-    moist_outlier_count = moist_outliers.groupby(
-        ['plant_id'])['plant_id'].count()
-    temp_outlier_count = temp_outliers.groupby(
-        ['plant_id'])['plant_id'].count()
-    return temp_outlier_count, moist_outlier_count
+    counts = count_anomalies(measurements)
+    temp_outlier_count = counts['temperature_anomalies']
+    moist_outlier_count = counts['moisture_anomalies']
+    return temp_outlier_count[temp_outlier_count > 0], moist_outlier_count[moist_outlier_count > 0]
 
 
 def detect_plant_risks(measurements: pd.DataFrame, threshold: int = 5) -> dict[str:bool]:
@@ -94,6 +206,6 @@ def detect_plant_risks(measurements: pd.DataFrame, threshold: int = 5) -> dict[s
 
 
 if __name__ == '__main__':
-    recent_measurements = get_recent_measurements()
-    recent_measurements = add_zscore_columns(recent_measurements)
-    print(detect_plant_risks(recent_measurements))
+    load_dotenv()
+    new_measurements, _ = get_new_scored_measurements()
+    print(detect_plant_risks(new_measurements))
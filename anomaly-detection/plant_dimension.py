@@ -0,0 +1,62 @@
+# pylint: disable=duplicate-code, no-member
+"""In-process cache of the joined plant, plant type, botanist and origin metadata"""
+import os
+import time
+import pymssql
+import pandas as pd
+
+PLANT_DIMENSION_TTL_SECONDS = int(os.getenv("PLANT_DIMENSION_TTL_SECONDS", "3600"))
+PLANT_DIMENSION_SQL = """
+    SELECT p.plant_id, pt.plant_type_id, pt.plant_name, pt.scientific_name,
+           b.botanist_id, b.botanist_name, b.botanist_email, b.botanist_number,
+           o.location_id, o.latitude, o.longitude, o.locality, o.country_code, o.timezone
+    FROM plant p
+    LEFT JOIN plant_type pt ON pt.plant_type_id = p.plant_type_id
+    LEFT JOIN botanist b ON b.botanist_id = p.botanist_id
+    LEFT JOIN origin o ON o.location_id = p.location_id
+    ORDER BY p.plant_id
+    """
+
+_CACHE = {"loaded_at": None, "plants": pd.DataFrame(), "by_id": {}}
+
+
+def load_plant_dimension(conn: pymssql.Connection) -> None:
+    """Loads the joined plant metadata in one query and indexes it by plant_id"""
+    plants = pd.read_sql(PLANT_DIMENSION_SQL, conn)
+    _CACHE["plants"] = plants
+    _CACHE["by_id"] = {plant["plant_id"]: plant for plant in plants.to_dict("records")}
+    _CACHE["loaded_at"] = time.monotonic()
+
+
+def invalidate_plant_dimension() -> None:
+    """Forces the next lookup to reload the metadata"""
+    _CACHE["loaded_at"] = None
+
+
+def refresh_if_stale(conn: pymssql.Connection, max_age: float) -> None:
+    """Reloads the metadata if it has never been loaded or is older than max_age seconds"""
+    loaded_at = _CACHE["loaded_at"]
+    if loaded_at is None or time.monotonic() - loaded_at > max_age:
+        load_plant_dimension(conn)
+
+
+def get_plant_dimension(conn: pymssql.Connection,
+                        max_age: float = PLANT_DIMENSION_TTL_SECONDS) -> pd.DataFrame:
+    """Returns one row of metadata per plant, from the cache while it is fresh"""
+    refresh_if_stale(conn, max_age)
+    return _CACHE["plants"]
+
+
+def get_plant(conn: pymssql.Connection, plant_id: int,
+              max_age: float = PLANT_DIMENSION_TTL_SECONDS) -> dict | None:
+    """Returns the metadata for a single plant, or None if it is unknown"""
+    refresh_if_stale(conn, max_age)
+    return _CACHE["by_id"].get(plant_id)
+
+
+def get_plants(conn: pymssql.Connection, plant_ids: list[int],
+               max_age: float = PLANT_DIMENSION_TTL_SECONDS) -> list[dict]:
+    """Returns the metadata for each known plant in plant_ids"""
+    refresh_if_stale(conn, max_age)
+    return [_CACHE["by_id"][plant_id] for plant_id in plant_ids
+            if plant_id in _CACHE["by_id"]]
@@ -1,53 +1,44 @@
-# pylint: disable= broad-exception-caught,duplicate-code
+# pylint: disable= broad-exception-caught,duplicate-code,no-member
 """Script to send an email to botanists with plants under their
 care that have faulty sensors based on anomaly detection script"""
 
-import os
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from dotenv import load_dotenv
 import pymssql
 import boto3
+from dotenv import load_dotenv
+from db_connection import get_connection
+from plant_dimension import get_plants
 
-from detect_anomalies import get_recent_measurements, detect_plant_risks, add_zscore_columns
-
-
-def get_connection_to_db() -> pymssql.Connection:
-    """Gets a pymssql connection to the short term MS SQL short-term DB"""
-    load_dotenv()
-    return pymssql.connect(host=os.getenv("DB_HOST"),
-                           database=os.getenv("DB_NAME"),
-                           user=os.getenv("DB_USERNAME"),
-                           password=os.getenv("DB_PASSWORD"),
-                           port=os.getenv("DB_PORT"))
-
+from detect_anomalies import (get_new_scored_measurements, detect_plant_risks,
+                              save_plant_statistics)
+from alert_state import SENSOR_TYPES, get_alert_states, get_alert_changes, save_alert_states
 
-def get_botanist_details_from_db(plant_ids: list[int]):
-    """Connecting to database and retrieving botanist details"""
-    conn = get_connection_to_db()
+SES_REGION = "eu-west-2"
+# SES sandbox send rate, used when the account quota can't be read
+DEFAULT_SEND_RATE = 1
+MAX_SEND_WORKERS = 10
 
-    curr = conn.cursor()
 
-    plant_ids_list = ",".join(["%s"] * len(plant_ids))
-
-    query = f"""SELECT plant_id, plant_name, botanist_name, botanist_email
-                FROM plant p
-                JOIN plant_type pt ON pt.plant_type_id = p.plant_type_id
-                JOIN botanist b ON b.botanist_id = p.botanist_id
-                WHERE plant_id IN ({plant_ids_list})"""
+def get_connection_to_db() -> pymssql.Connection:
+    """Gets the cached pymssql connection to the short term MS SQL short-term DB"""
+    return get_connection()
 
-    curr.execute(query, tuple(plant_ids))
-    results = curr.fetchall()
-    conn.close()
 
-    botanist_details = [{
-        "plant_id": row[0],
-        "plant_name": row[1],
-        "botanist_name": row[2],
-        "botanist_email": row[3]
-    } for row in results]
+def get_botanist_details_from_db(plant_ids: list[int], conn: pymssql.Connection = None):
+    """Retrieving botanist details from the cached plant metadata"""
+    conn = conn or get_connection_to_db()
 
-    return botanist_details
+    return [{
+        "plant_id": plant["plant_id"],
+        "plant_name": plant["plant_name"],
+        "botanist_name": plant["botanist_name"],
+        "botanist_email": plant["botanist_email"]
+    } for plant in get_plants(conn, plant_ids)]
 
 
 def format_plant_issues_data(anomaly_data: list[dict], affected_plants: list[int]) -> dict:
@@ -64,8 +55,10 @@ def format_plant_issues_data(anomaly_data: list[dict], affected_plants: list[int
     return plant_issues
 
 
-def group_affected_plants_by_botanist(botanist_details: list[dict], plant_issues: dict) -> dict:
-    """Group affected plants under the botanist responsible for them."""
+def group_affected_plants_by_botanist(botanist_details: list[dict], plant_issues: dict,
+                                      status: str = "has issues") -> dict:
+    """Group affected plants under the botanist responsible for them,
+    keeping the ids of the plants each botanist is emailed about."""
     botanist_plant_map = {}
 
     for botanist in botanist_details:
@@ -77,20 +70,23 @@ def group_affected_plants_by_botanist(botanist_details: list[dict], plant_issues
             if email not in botanist_plant_map:
                 botanist_plant_map[email] = {
                     "botanist_name": botanist["botanist_name"],
+                    "plant_ids": [],
                     "issues": []
                 }
+            botanist_plant_map[email]["plant_ids"].append(plant_id)
             botanist_plant_map[email]["issues"].append(
-                f"Plant {plant_name} (ID: {plant_id}) has issues: {plant_issues[plant_id]}"
+                f"Plant {plant_name} (ID: {plant_id}) {status}: {plant_issues[plant_id]}"
             )
 
     return botanist_plant_map
 
 
-def generate_email_body(botanist_name: str, issues: list[str]) -> str:
+def generate_email_body(botanist_name: str, issues: list[str],
+                        intro: str = "The following plants need your attention:") -> str:
     """Generate a well-formatted email body for a botanist."""
     return f"""Dear {botanist_name},
 
-The following plants need your attention:
+{intro}
 
 {chr(10).join(issues)}
 
@@ -111,15 +107,45 @@ def format_botanist_notification(botanist_details: list[dict], plant_issues: dic
         email_notifications.append({
             "email": email,
             "subject": "Plant Monitoring Alert",
-            "body": email_body
+            "body": email_body,
+            "plant_ids": details["plant_ids"]
         })
 
     return email_notifications
 
 
-def send_email(notification: dict):
+def format_resolved_notification(botanist_details: list[dict], plant_resolutions: dict) -> list:
+    """Format notifications telling each botanist which sensor alerts have cleared."""
+    botanist_plant_map = group_affected_plants_by_botanist(
+        botanist_details, plant_resolutions, status="is back to normal for")
+
+    return [{
+        "email": email,
+        "subject": "Plant Monitoring Alert Resolved",
+        "body": generate_email_body(details["botanist_name"], details["issues"],
+                                    "The following sensor alerts have cleared:"),
+        "plant_ids": details["plant_ids"]
+    } for email, details in botanist_plant_map.items()]
+
+
+@lru_cache(maxsize=1)
+def get_ses_client():
+    """Returns the SES client, created once and reused for every email."""
+    return boto3.client("ses", region_name=SES_REGION)
+
+
+def get_max_send_rate(client) -> int:
+    """Returns the account's SES maximum sends per second."""
+    try:
+        return max(1, int(client.get_send_quota()["MaxSendRate"]))
+    except Exception as e:
+        print(f"Could not read SES send quota, using {DEFAULT_SEND_RATE}/s: {e}")
+        return DEFAULT_SEND_RATE
+
+
+def send_email(notification: dict, client=None):
     """Send an email using AWS SES."""
-    client = boto3.client("ses", region_name="eu-west-2")
+    client = client or get_ses_client()
     message = MIMEMultipart()
     message["Subject"] = notification["subject"]
     message["From"] = "trainee.hadia.fadlelmawla@sigmalabs.co.uk"
@@ -135,33 +161,106 @@ def send_email(notification: dict):
     )
 
 
+def try_send_email(notification: dict, client) -> bool:
+    """Sends one notification, returning whether it was sent rather than
+    raising so one failed email doesn't stop the others."""
+    try:
+        send_email(notification, client)
+        return True
+    except Exception as e:
+        print(f"Failed to email {notification['email']}: {e}")
+        return False
+
+
+def send_emails(notifications: list[dict]) -> list[dict]:
+    """Send notifications concurrently through one SES client, in waves of
+    at most the SES maximum send rate per second. Returns the notifications
+    that failed to send."""
+    client = get_ses_client()
+    send_rate = get_max_send_rate(client)
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=min(send_rate, MAX_SEND_WORKERS)) as executor:
+        for start in range(0, len(notifications), send_rate):
+            wave_start = time.monotonic()
+            wave = notifications[start:start + send_rate]
+            sent = executor.map(lambda notification: try_send_email(
+                notification, client), wave)
+            failed += [notification for notification, ok in zip(wave, sent) if not ok]
+            if start + send_rate < len(notifications):
+                time.sleep(max(0.0, 1 - (time.monotonic() - wave_start)))
+
+    return failed
+
+
+def get_notified_alerts(notifications: list[dict], changes: dict[str, list[int]]) -> set[tuple]:
+    """Returns the (plant_id, sensor_type) alert changes the notifications email about."""
+    return {(plant_id, sensor) for notification in notifications
+            for plant_id in notification["plant_ids"]
+            for sensor in SENSOR_TYPES if plant_id in changes[sensor]}
+
+
+def save_run(conn: pymssql.Connection, statistics, updates: list[tuple]) -> None:
+    """Saves the plants' new statistics and watermarks with the alert states in one
+    transaction. This only happens once the emails are sent, and statistics of None
+    leaves the watermarks where they were so the next run reads the same measurements
+    again and retries any alerts that failed to send"""
+    try:
+        if statistics is not None:
+            save_plant_statistics(conn, statistics, commit=False)
+        save_alert_states(conn, updates, commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
 def run_email_pipeline():
-    """Runs the full anomaly detection and email notification pipeline."""
-    print("Fetching recent measurements...")
-    recent_measurements = get_recent_measurements()
-    recent_measurements = add_zscore_columns(recent_measurements)
+    """Runs the full anomaly detection and email notification pipeline,
+    emailing only alerts that have opened or cleared since the last run."""
+    conn = get_connection_to_db()
+    print("Fetching and scoring new measurements...")
+    recent_measurements, statistics = get_new_scored_measurements(conn)
 
     print("Detecting anomalies...")
     anomalies = detect_plant_risks(recent_measurements)
     print(f"anomalies detected: {anomalies}")
-    affected_plants = anomalies["moisture"] + anomalies["temperature"]
-    if not affected_plants:
-        print("No anomalies detected. No emails sent.")
+
+    new_alerts, resolved, updates = get_alert_changes(
+        anomalies, set(recent_measurements["plant_id"]), get_alert_states(conn), datetime.now())
+    alert_plants = list(dict.fromkeys(
+        new_alerts["moisture"] + new_alerts["temperature"]))
+    resolved_plants = list(dict.fromkeys(
+        resolved["moisture"] + resolved["temperature"]))
+    if not alert_plants and not resolved_plants:
+        save_run(conn, statistics, updates)
+        print("No alert changes. No emails sent.")
         return
-    plant_issues = format_plant_issues_data(anomalies, affected_plants)
 
     print("Fetching botanist details...")
-    botanist_details = get_botanist_details_from_db(affected_plants)
+    botanist_details = get_botanist_details_from_db(
+        list(dict.fromkeys(alert_plants + resolved_plants)), conn)
 
     print("Formatting email notifications...")
-    notifications = format_botanist_notification(
-        botanist_details, plant_issues)
+    alert_notifications = format_botanist_notification(
+        botanist_details, format_plant_issues_data(new_alerts, alert_plants))
+    resolved_notifications = format_resolved_notification(
+        botanist_details, format_plant_issues_data(resolved, resolved_plants))
 
+    notifications = alert_notifications + resolved_notifications
     print(f"Sending {len(notifications)} emails...")
-    for notification in notifications:
-        send_email(notification)
+    failed = send_emails(notifications)
+    if not failed:
+        save_run(conn, statistics, updates)
+        print("Email pipeline completed successfully.")
+        return
 
-    print("Email pipeline completed successfully.")
+    unsent = (get_notified_alerts([n for n in failed if n in alert_notifications], new_alerts)
+              | get_notified_alerts([n for n in failed if n in resolved_notifications],
+                                    resolved))
+    save_run(conn, None, [update for update in updates if update[:2] not in unsent])
+    raise RuntimeError(f"{len(failed)} of {len(notifications)} emails failed to send, "
+                       "they will be retried on the next run")
 
 
 def lambda_handler(event, context):
@@ -169,6 +268,7 @@ def lambda_handler(event, context):
     print(f"Event: {event}")
     print(f"Context: {context}")
     try:
+        load_dotenv()
         run_email_pipeline()
         return {"statusCode": 200, "body": "Email notifications sent successfully."}
 
@@ -180,4 +280,5 @@ def lambda_handler(event, context):
 
 
 if __name__ == "__main__":
+    load_dotenv()
     run_email_pipeline()
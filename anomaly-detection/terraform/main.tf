@@ -36,6 +36,11 @@ data "aws_iam_policy_document" "ses_permissions" {
     actions   = ["ses:SendEmail", "ses:SendRawEmail"]
     resources = ["arn:aws:ses:eu-west-2:129033205317:identity/*" ]
   }
+  statement {
+    effect    = "Allow"
+    actions   = ["ses:GetSendQuota"]
+    resources = ["*"]
+  }
 }
 
 
@@ -67,7 +72,8 @@ resource "aws_lambda_function" "anomaly-alert-lambda" {
                 DB_USERNAME=var.DB_USERNAME,
                 DB_HOST=var.DB_HOST,
                 DB_PORT=var.DB_PORT,
-                DB_PASSWORD=var.DB_PASSWORD
+                DB_PASSWORD=var.DB_PASSWORD,
+                ALERT_COOLDOWN_MINUTES=var.ALERT_COOLDOWN_MINUTES
     }
   }
 }
@@ -23,3 +23,9 @@ variable "DB_PORT" {
   type = string
   description = "SQL Server Database port"
 }
+
+variable "ALERT_COOLDOWN_MINUTES" {
+  type = string
+  description = "Minutes before a re-opened sensor alert is emailed again"
+  default = "60"
+}
\ No newline at end of file
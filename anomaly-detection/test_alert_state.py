@@ -0,0 +1,100 @@
+# pylint: skip-file
+"""Tests for the alert state script"""
+
+from datetime import datetime, timedelta
+import pytest
+from alert_state import get_alert_changes
+
+NOW = datetime(2025, 4, 4, 12, 0)
+COOLDOWN = timedelta(minutes=60)
+
+
+def get_state(is_active, notified, last_sent):
+    """Returns a stored alert state"""
+    return {'is_active': is_active, 'notified': notified, 'last_sent': last_sent}
+
+
+def test_new_alert_opens_and_is_sent():
+    """Test that an anomaly with no stored state is emailed"""
+    new_alerts, resolved, updates = get_alert_changes(
+        {'moisture': [1], 'temperature': []}, {1}, {}, NOW, COOLDOWN)
+
+    assert new_alerts == {'moisture': [1], 'temperature': []}
+    assert resolved == {'moisture': [], 'temperature': []}
+    assert updates == [(1, 'moisture', True, True, NOW, NOW)]
+
+
+def test_active_notified_alert_is_not_resent():
+    """Test that an alert already emailed isn't sent again while it stays open"""
+    states = {(1, 'moisture'): get_state(True, True, NOW - timedelta(hours=5))}
+    new_alerts, _, updates = get_alert_changes(
+        {'moisture': [1], 'temperature': []}, {1}, states, NOW, COOLDOWN)
+
+    assert new_alerts['moisture'] == []
+    assert updates == []
+
+
+def test_reopen_within_cooldown_is_recorded_not_sent():
+    """Test that an alert re-opening within the cooldown is saved as not notified"""
+    last_sent = NOW - timedelta(minutes=10)
+    states = {(1, 'moisture'): get_state(False, False, last_sent)}
+    new_alerts, _, updates = get_alert_changes(
+        {'moisture': [1], 'temperature': []}, {1}, states, NOW, COOLDOWN)
+
+    assert new_alerts['moisture'] == []
+    assert updates == [(1, 'moisture', True, False, last_sent, NOW)]
+
+
+def test_unnotified_alert_waits_for_cooldown():
+    """Test that an active, unsent alert is left alone until the cooldown passes"""
+    states = {(1, 'moisture'): get_state(True, False, NOW - timedelta(minutes=30))}
+    new_alerts, _, updates = get_alert_changes(
+        {'moisture': [1], 'temperature': []}, {1}, states, NOW, COOLDOWN)
+
+    assert new_alerts['moisture'] == []
+    assert updates == []
+
+
+@pytest.mark.parametrize("minutes_since_sent", [60, 90])
+def test_unnotified_alert_is_sent_after_cooldown(minutes_since_sent):
+    """Test that an alert that re-opened within the cooldown is emailed once it has passed"""
+    states = {(1, 'moisture'): get_state(
+        True, False, NOW - timedelta(minutes=minutes_since_sent))}
+    new_alerts, _, updates = get_alert_changes(
+        {'moisture': [1], 'temperature': []}, {1}, states, NOW, COOLDOWN)
+
+    assert new_alerts['moisture'] == [1]
+    assert updates == [(1, 'moisture', True, True, NOW, NOW)]
+
+
+def test_notified_alert_resolves():
+    """Test that a checked plant no longer flagged sends a resolved email"""
+    last_sent = NOW - timedelta(hours=2)
+    states = {(1, 'temperature'): get_state(True, True, last_sent)}
+    new_alerts, resolved, updates = get_alert_changes(
+        {'moisture': [], 'temperature': []}, {1}, states, NOW, COOLDOWN)
+
+    assert new_alerts == {'moisture': [], 'temperature': []}
+    assert resolved['temperature'] == [1]
+    assert updates == [(1, 'temperature', False, False, last_sent, NOW)]
+
+
+def test_unnotified_alert_resolves_silently():
+    """Test that an alert that was never emailed closes without a resolved email"""
+    last_sent = NOW - timedelta(minutes=10)
+    states = {(1, 'temperature'): get_state(True, False, last_sent)}
+    _, resolved, updates = get_alert_changes(
+        {'moisture': [], 'temperature': []}, {1}, states, NOW, COOLDOWN)
+
+    assert resolved['temperature'] == []
+    assert updates == [(1, 'temperature', False, False, last_sent, NOW)]
+
+
+def test_unchecked_plant_does_not_resolve():
+    """Test that a plant without new measurements keeps its alert open"""
+    states = {(1, 'temperature'): get_state(True, True, NOW - timedelta(hours=2))}
+    _, resolved, updates = get_alert_changes(
+        {'moisture': [], 'temperature': []}, set(), states, NOW, COOLDOWN)
+
+    assert resolved['temperature'] == []
+    assert updates == []
@@ -0,0 +1,117 @@
+# pylint: skip-file
+"""Tests for the running statistics in the anomaly detection script"""
+
+from unittest.mock import patch, MagicMock
+import numpy as np
+import pandas as pd
+import pytest
+from detect_anomalies import (WINDOW_SIZE, MIN_SAMPLES, STATISTICS_COLUMNS,
+                              update_running_statistics, add_zscore_columns,
+                              get_measurements_since)
+
+EMPTY_STATISTICS = pd.DataFrame(columns=STATISTICS_COLUMNS)
+
+
+def get_measurements(plant_ids, start="2025-04-04 09:00", seed=0):
+    """Returns per-minute measurements with random readings for each plant id"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "plant_id": plant_ids,
+        "measurement_time": pd.date_range(start, periods=len(plant_ids), freq="min"),
+        "moisture": rng.normal(50, 10, len(plant_ids)),
+        "temperature": rng.normal(15, 3, len(plant_ids))
+    })
+
+
+def get_plant(statistics, plant_id):
+    """Returns one plant's statistics row"""
+    return statistics.set_index("plant_id").loc[plant_id]
+
+
+def test_merge_matches_direct_mean_and_std():
+    """Test statistics merged over several runs match those of all the readings at once"""
+    runs = [get_measurements([1] * 40 + [2] * 7, seed=0),
+            get_measurements([1] * 25 + [2] * 60, start="2025-04-04 10:00", seed=1),
+            get_measurements([2] * 3, start="2025-04-04 12:00", seed=2)]
+
+    statistics = EMPTY_STATISTICS
+    for run in runs:
+        statistics = update_running_statistics(statistics, run)
+
+    everything = pd.concat(runs)
+    for plant_id in (1, 2):
+        readings = everything[everything["plant_id"] == plant_id]
+        plant = get_plant(statistics, plant_id)
+        assert plant["sample_count"] == len(readings)
+        assert plant["last_measurement_time"] == readings["measurement_time"].max()
+        for metric in ("moisture", "temperature"):
+            std = np.sqrt(plant[f"{metric}_m2"] / (plant["sample_count"] - 1))
+            assert plant[f"{metric}_mean"] == pytest.approx(readings[metric].mean())
+            assert std == pytest.approx(readings[metric].std())
+
+
+def test_merge_leaves_other_plants_unchanged():
+    """Test plants without new readings keep their statistics and watermark"""
+    statistics = update_running_statistics(EMPTY_STATISTICS, get_measurements([1, 1, 2, 2]))
+
+    updated = update_running_statistics(statistics, get_measurements([1, 1], seed=3))
+
+    pd.testing.assert_series_equal(get_plant(updated, 2), get_plant(statistics, 2))
+
+
+def test_merge_caps_count_at_window_size():
+    """Test the sample count stops at WINDOW_SIZE while keeping the variance of the readings"""
+    first = get_measurements([1] * (WINDOW_SIZE - 100), seed=4)
+    second = get_measurements([1] * 300, start="2025-04-06", seed=5)
+
+    statistics = update_running_statistics(
+        update_running_statistics(EMPTY_STATISTICS, first), second)
+
+    plant = get_plant(statistics, 1)
+    readings = pd.concat([first, second])
+    assert plant["sample_count"] == WINDOW_SIZE
+    assert plant["moisture_mean"] == pytest.approx(readings["moisture"].mean())
+    assert np.sqrt(plant["moisture_m2"] / (WINDOW_SIZE - 1)) == pytest.approx(
+        readings["moisture"].std())
+
+
+def test_capped_window_weights_new_readings_more():
+    """Test that once the window is full, new readings move the mean more than
+    they would if every reading was kept"""
+    full = get_measurements([1] * WINDOW_SIZE, seed=6)
+    shifted = get_measurements([1] * 100, start="2025-04-06", seed=7)
+    shifted["moisture"] += 20
+
+    plant = get_plant(update_running_statistics(
+        update_running_statistics(EMPTY_STATISTICS, full), shifted), 1)
+
+    all_readings_mean = pd.concat([full, shifted])["moisture"].mean()
+    assert plant["sample_count"] == WINDOW_SIZE
+    assert plant["moisture_mean"] > all_readings_mean
+
+
+def test_zscores_use_running_statistics_once_established():
+    """Test established plants are scored against their statistics and new plants
+    against their own readings"""
+    history = get_measurements([1] * MIN_SAMPLES + [2] * (MIN_SAMPLES - 1), seed=8)
+    statistics = update_running_statistics(EMPTY_STATISTICS, history)
+    new = get_measurements([1, 1, 2, 2], start="2025-04-05", seed=9)
+
+    scored = add_zscore_columns(new.copy(), statistics)
+
+    plant = get_plant(statistics, 1)
+    std = np.sqrt(plant["moisture_m2"] / (plant["sample_count"] - 1))
+    expected = (new["moisture"][:2] - plant["moisture_mean"]) / std
+    np.testing.assert_allclose(scored["moisture_zscore"][:2], expected)
+    own = new["moisture"][2:]
+    np.testing.assert_allclose(scored["moisture_zscore"][2:], (own - own.mean()) / own.std())
+
+
+@patch("detect_anomalies.pd.read_sql")
+def test_measurements_are_filtered_by_each_plants_watermark(mock_read_sql):
+    """Test the query filters on each plant's own watermark rather than the oldest one"""
+    get_measurements_since(MagicMock())
+
+    sql = " ".join(mock_read_sql.call_args.args[0].split())
+    assert "LEFT JOIN plant_statistics AS s ON s.plant_id = m.plant_id" in sql
+    assert "m.measurement_time > COALESCE(s.last_measurement_time, %s)" in sql
@@ -0,0 +1,83 @@
+# pylint: skip-file
+"""Tests for the email sending script"""
+
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from send_email import send_emails, run_email_pipeline
+
+BOTANISTS = [
+    {"plant_id": 1, "plant_name": "Fern", "botanist_name": "Ada", "botanist_email": "ada@x"},
+    {"plant_id": 2, "plant_name": "Palm", "botanist_name": "Bo", "botanist_email": "bo@x"},
+    {"plant_id": 3, "plant_name": "Rose", "botanist_name": "Bo", "botanist_email": "bo@x"}]
+
+
+def get_notification(email):
+    """Returns a notification to email"""
+    return {"email": email, "subject": "Alert", "body": "Hello", "plant_ids": [1]}
+
+
+@patch("send_email.get_max_send_rate", return_value=10)
+@patch("send_email.get_ses_client")
+@patch("send_email.send_email")
+def test_send_emails_returns_only_failed(mock_send, mock_client, mock_rate):
+    """Test that one failed email doesn't stop the others and is returned"""
+    def send(notification, client):
+        if notification["email"] == "bad@x":
+            raise RuntimeError("rejected")
+    mock_send.side_effect = send
+    notifications = [get_notification("ok@x"), get_notification("bad@x"),
+                     get_notification("also-ok@x")]
+
+    assert send_emails(notifications) == [notifications[1]]
+    assert mock_send.call_count == 3
+
+
+@pytest.fixture
+def pipeline():
+    """Patches the pipeline's I/O: plant 1 opens a moisture alert, plant 2 opens a
+    temperature alert and plant 3's moisture alert resolves"""
+    measurements = pd.DataFrame({"plant_id": [1, 2, 3]})
+    statistics = pd.DataFrame({"plant_id": [1, 2, 3]})
+    updates = [(1, "moisture", True, True, "now", "now"),
+               (2, "temperature", True, True, "now", "now"),
+               (3, "moisture", False, False, "then", "now")]
+    with patch("send_email.get_connection_to_db") as conn, \
+            patch("send_email.get_new_scored_measurements",
+                  return_value=(measurements, statistics)), \
+            patch("send_email.detect_plant_risks"), \
+            patch("send_email.get_alert_states"), \
+            patch("send_email.get_alert_changes", return_value=(
+                {"moisture": [1], "temperature": [2]},
+                {"moisture": [3], "temperature": []}, updates)), \
+            patch("send_email.get_botanist_details_from_db", return_value=BOTANISTS), \
+            patch("send_email.send_emails") as send, \
+            patch("send_email.save_run") as save:
+        yield {"conn": conn.return_value, "statistics": statistics, "updates": updates,
+               "send": send, "save": save}
+
+
+def test_pipeline_saves_statistics_when_every_email_sends(pipeline):
+    """Test a fully sent run saves its statistics and every alert state"""
+    pipeline["send"].return_value = []
+
+    run_email_pipeline()
+
+    pipeline["save"].assert_called_once_with(
+        pipeline["conn"], pipeline["statistics"], pipeline["updates"])
+
+
+def test_pipeline_skips_only_failed_alerts(pipeline):
+    """Test a failed email leaves its alerts unsaved and the watermark unmoved,
+    while alerts that were emailed are still saved"""
+    def fail_bo_alert(notifications):
+        return [notification for notification in notifications
+                if notification["email"] == "bo@x" and "Resolved" not in notification["subject"]]
+    pipeline["send"].side_effect = fail_bo_alert
+
+    with pytest.raises(RuntimeError):
+        run_email_pipeline()
+
+    conn, statistics, updates = pipeline["save"].call_args.args
+    assert statistics is None
+    assert updates == [pipeline["updates"][0], pipeline["updates"][2]]
@@ -1,7 +1,10 @@
-# pylint: disable=import-error, no-member, too-many-locals
+# pylint: disable=import-error, no-member, too-many-locals, too-many-arguments
 '''A script that creates a Streamlit dashboard using LMNH plant data from the last 24 hours'''
-from os import environ as ENV
 import io
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pandas as pd
@@ -9,22 +12,45 @@ import streamlit as st
 import altair as alt
 import boto3
 import pymssql
+from db_connection import connect, is_alive
+from anomaly_engine import get_anomaly_summary
+from plant_dimension import (get_plant_dimension, load_plant_dimension,
+                             PLANT_DIMENSION_TTL_SECONDS)
 
 
 BUCKET_NAME = "c16-louis-data"
 PREFIX = "historical/"
-
-
+MEASUREMENT_WINDOW_HOURS = 24
+CACHE_BUCKET_SECONDS = 60
+# Anomaly counts are kept for the current and previous snapshots only
+ANOMALY_CACHE_ENTRIES = 2
+MONTH_PARTITION_FORMAT = "year=%Y/month=%m/"
+DAY_PARTITION_FORMAT = "year=%Y/month=%m/day=%d/"
+# The date-only layout used before the archive was partitioned, until the migrate event moves it
+LEGACY_MONTH_FORMAT = "%Y-%m/"
+LEGACY_DAY_FORMAT = "%Y-%m/%d/"
+MANIFEST_NAME = "_manifest.json"
+HISTORY_COLUMNS = ("plant_id", "measurement_time", "moisture", "temperature")
+HISTORY_DAYS = 90
+S3_MAX_WORKERS = 16
+CHART_WIDTH_PX = 800
+CHART_METRICS = ('temperature', 'moisture')
+# Charts with more readings than this are downsampled to min/max buckets
+MAX_RAW_POINTS = 2 * CHART_WIDTH_PX
+CHART_RESOLUTIONS = ("1min", "5min", "15min", "30min", "1h", "3h", "6h", "12h", "1D", "7D")
+
+
+@st.cache_resource(validate=is_alive)
 def get_conn() -> pymssql.Connection:
-    '''Connects to AWS RDS using pymssql'''
-    load_dotenv()
-    connection = pymssql.connect(host=ENV["DB_HOST"],
-                                 database=ENV["DB_NAME"],
-                                 user=ENV["DB_USERNAME"],
-                                 password=ENV["DB_PASSWORD"],
-                                 port=ENV["DB_PORT"])
+    '''Returns one pymssql connection to AWS RDS shared by every session,
+    replaced when it fails the liveness check'''
+    return connect()
+
 
-    return connection
+@st.cache_resource
+def get_db_lock() -> threading.Lock:
+    '''Returns the lock serialising use of the shared connection across session threads'''
+    return threading.Lock()
 
 
 def execute_query(connection: pymssql.Connection, q: str) -> dict[list]:
@@ -35,29 +61,49 @@ def execute_query(connection: pymssql.Connection, q: str) -> dict[list]:
     return data
 
 
-def get_plant_information(connection: pymssql.Connection) -> pd.DataFrame:
-    '''Queries the database, returns and merges tables'''
-    plant_type_df = pd.read_sql('SELECT * FROM plant_type', connection)
-    botanist_df = pd.read_sql('SELECT * FROM botanist', connection)
-    origin_df = pd.read_sql('SELECT * FROM origin', connection)
-    plant_df = pd.read_sql('SELECT * FROM plant', connection)
-    merged_plant_with_type = pd.merge(plant_df, plant_type_df,
-                                      on='plant_type_id', how='outer')
-    merged_plant_with_type_with_botanist = pd.merge(
-        merged_plant_with_type, botanist_df, on='botanist_id', how='outer')
-    plant_information = pd.merge(
-        merged_plant_with_type_with_botanist, origin_df, on='location_id', how='outer'
-    ).sort_values("plant_id")
-    return plant_information
+@st.cache_data(ttl=PLANT_DIMENSION_TTL_SECONDS)
+def get_plant_information() -> pd.DataFrame:
+    '''Returns the joined plant, type, botanist and origin metadata. st.cache_data holds it
+    for the TTL, so the module's own cache is reloaded here rather than stacking a second TTL'''
+    with get_db_lock():
+        conn = get_conn()
+        load_plant_dimension(conn)
+        return get_plant_dimension(conn)
+
+
+def get_time_bucket(bucket_seconds: int = CACHE_BUCKET_SECONDS) -> int:
+    '''Returns the index of the current time bucket, used as a cache key'''
+    return int(time.time() // bucket_seconds)
+
 
+@st.cache_data(ttl=CACHE_BUCKET_SECONDS * 2)
+def query_measurements(time_bucket: int, hours: int, plant_id: int | None) -> pd.DataFrame:
+    '''Queries measurements in the window ending at the start of time_bucket,
+    cached per bucket so reruns within a bucket skip the database'''
+    window_end = datetime.fromtimestamp(time_bucket * CACHE_BUCKET_SECONDS)
+    query = """SELECT plant_id, measurement_time, last_watered, moisture, temperature
+               FROM measurement
+               WHERE measurement_time > %s"""
+    params = [window_end - timedelta(hours=hours)]
+    if plant_id is not None:
+        query += " AND plant_id = %s"
+        params.append(plant_id)
+    with get_db_lock():
+        return pd.read_sql(query, get_conn(), params=tuple(params))
 
-def get_measurements(connection: pymssql.Connection) -> pd.DataFrame:
-    '''Returns all measurements from the measurement table taken within 24 hours'''
-    query = "SELECT * FROM measurement;"
-    measurement = pd.read_sql(query, connection)
-    measurement = measurement[measurement['measurement_time']
-                              > datetime.now() - timedelta(hours=24)]
-    return measurement
+
+def get_measurements(hours: int = MEASUREMENT_WINDOW_HOURS,
+                     plant_id: int | None = None) -> pd.DataFrame:
+    '''Returns measurements taken within the last 24 hours, optionally for a single plant'''
+    return query_measurements(get_time_bucket(), hours, plant_id)
+
+
+@st.cache_data(ttl=CACHE_BUCKET_SECONDS * 2)
+def get_merged_measurements(time_bucket: int,
+                            hours: int = MEASUREMENT_WINDOW_HOURS) -> pd.DataFrame:
+    '''Returns every plant's metadata joined to its measurements for time_bucket'''
+    return pd.merge(get_plant_information(), query_measurements(time_bucket, hours, None),
+                    on='plant_id', how='outer')
 
 
 def create_botanist_pie_chart(df: pd.DataFrame) -> alt.Chart:
@@ -84,14 +130,51 @@ def create_botanist_pie_chart(df: pd.DataFrame) -> alt.Chart:
     return chart
 
 
+def get_chart_resolution(start: datetime, end: datetime,
+                         width: int = CHART_WIDTH_PX) -> str:
+    '''Returns the smallest bucket size giving at most one bucket per two pixels of chart width'''
+    target = (end - start) / max(1, width // 2)
+    for resolution in CHART_RESOLUTIONS:
+        if pd.Timedelta(resolution) >= target:
+            return resolution
+    return CHART_RESOLUTIONS[-1]
+
+
+def downsample_min_max(measurements: pd.DataFrame, resolution: str,
+                       metrics: tuple[str] = CHART_METRICS) -> pd.DataFrame:
+    '''Keeps the first, last, minimum and maximum reading of each metric in each time bucket,
+    so peaks and troughs survive while the point count is bounded by the bucket count'''
+    measurements = measurements.dropna(subset=['measurement_time', *metrics])
+    grouped = measurements.groupby(measurements['measurement_time'].dt.floor(resolution))
+    kept_rows = [grouped['measurement_time'].idxmin(), grouped['measurement_time'].idxmax()]
+    for metric in metrics:
+        kept_rows += [grouped[metric].idxmin(), grouped[metric].idxmax()]
+    return measurements.loc[pd.concat(kept_rows).unique()].sort_values('measurement_time')
+
+
+def get_chart_points(measurements: pd.DataFrame,
+                     width: int = CHART_WIDTH_PX) -> tuple[pd.DataFrame, str | None]:
+    '''Returns the raw readings when there are few enough to draw, otherwise min/max buckets
+    sized from the time range and chart width, along with the bucket size used'''
+    if len(measurements) <= MAX_RAW_POINTS:
+        return measurements, None
+    times = measurements['measurement_time']
+    resolution = get_chart_resolution(times.min(), times.max(), width)
+    return downsample_min_max(measurements, resolution), resolution
+
+
 def create_single_plant_chart(merged_df: pd.DataFrame, plant_id: int) -> alt.Chart:
-    '''Creates a 24hr reading chart for a single plant using ID'''
+    '''Creates a reading chart for a single plant using ID, downsampled for long ranges'''
     single_plant_measurement = merged_df[merged_df['plant_id'] == plant_id].sort_values(
         "measurement_time").reset_index()
 
     plant_name = single_plant_measurement['plant_name'].iloc[0]
+    chart_points, resolution = get_chart_points(single_plant_measurement)
+    title = f"Temperature and moisture content of the {plant_name}"
+    if resolution is not None:
+        title += f" (min/max per {resolution})"
 
-    base = alt.Chart(single_plant_measurement).encode(
+    base = alt.Chart(chart_points[['measurement_time', *CHART_METRICS]]).encode(
         alt.X('measurement_time:T').title(None),
     ).properties(width=20)
 
@@ -107,7 +190,7 @@ def create_single_plant_chart(merged_df: pd.DataFrame, plant_id: int) -> alt.Cha
 
     chart = alt.layer(temperature_line, moisture_line).resolve_scale(
         y='independent'
-    ).properties(title=f"Temperature and moisture content of the {plant_name}")
+    ).properties(title=title)
 
     return chart, plant_name
 
@@ -121,46 +204,39 @@ def display_reading_change(merged_df: pd.DataFrame) -> float:
     return temperature_mean, moisture_mean
 
 
-def get_temp_anomalies(merged_df: pd.DataFrame) -> pd.DataFrame:
-    '''Returns a dataframe of plant_id and anomaly count (temp with |zscore| > 2.5)'''
-    merged_df = merged_df.copy()
-    merged_df['temperature_zscore'] = merged_df.groupby('plant_id')['temperature'].transform(
-        lambda x: (x - x.mean()) / x.std()
-    )
+@st.cache_data(ttl=CACHE_BUCKET_SECONDS * 2, max_entries=ANOMALY_CACHE_ENTRIES)
+def get_cached_anomaly_summary(merged_df: pd.DataFrame) -> pd.DataFrame:
+    '''Returns the per-plant anomaly counts for every metric. st.cache_data keys them on
+    the snapshot's contents, so the moisture and temperature charts share one pass'''
+    return get_anomaly_summary(merged_df)
 
-    merged_df['anomalies'] = (abs(merged_df['temperature_zscore']) > 2.5).groupby(
-        merged_df['plant_id']).transform('sum')
 
-    return merged_df[['plant_id', 'anomalies']].drop_duplicates()
+def get_anomalies(merged_df: pd.DataFrame, metric: str) -> pd.DataFrame:
+    '''Returns a dataframe of plant_id and anomaly count (metric with |zscore| > 2.5).
+    The counts for every metric come from one cached pass over the snapshot'''
+    summary = get_cached_anomaly_summary(merged_df)
+    return summary[f'{metric}_anomalies'].rename('anomalies').reset_index()
 
 
-def get_moisture_anomalies(merged_df: pd.DataFrame) -> pd.DataFrame:
+def get_temp_anomalies(merged_df: pd.DataFrame) -> pd.DataFrame:
     '''Returns a dataframe of plant_id and anomaly count (temp with |zscore| > 2.5)'''
-    merged_df = merged_df.copy()
-    merged_df['moisture_zscore'] = merged_df.groupby('plant_id')['moisture'].transform(
-        lambda x: (x - x.mean()) / x.std()
-    )
+    return get_anomalies(merged_df, 'temperature')
 
-    merged_df['anomalies'] = (abs(merged_df['moisture_zscore']) > 2.5).groupby(
-        merged_df['plant_id']).transform('sum')
 
-    return merged_df[['plant_id', 'anomalies']].drop_duplicates()
+def get_moisture_anomalies(merged_df: pd.DataFrame) -> pd.DataFrame:
+    '''Returns a dataframe of plant_id and anomaly count (moisture with |zscore| > 2.5)'''
+    return get_anomalies(merged_df, 'moisture')
 
 
-def get_plant_by_temperature_anomaly_chart(
-        merged_df: pd.DataFrame, plant_df: pd.DataFrame) -> alt.Chart:
+def create_anomaly_chart(anomaly_summary: pd.DataFrame, plant_df: pd.DataFrame,
+                         title: str) -> alt.Chart:
     '''Returns a bar chart of the top 10 plants by anomaly count'''
-    anomaly_summary = get_temp_anomalies(
-        merged_df).reset_index().drop(columns=['index'])
     anomaly_df = pd.merge(anomaly_summary, plant_df,
                           how='outer', on="plant_id")
     top_10_anomalies = anomaly_df.sort_values(
         'anomalies', ascending=False).head(10)
     top_10_anomalies = top_10_anomalies[[
         'plant_id', "anomalies", "plant_name"]]
-    top_10_anomalies.rename(columns={
-                            "plant_id": "Plant ID", "anomalies": "Anomaly Count",
-                            "plant_name": "Name"})
     chart = alt.Chart(top_10_anomalies).mark_bar().encode(
         x=alt.X('anomalies:Q', axis=alt.Axis(title='Anomaly Count')),
         y=alt.Y('plant_name:O', sort=alt.EncodingSortField(
@@ -171,65 +247,206 @@ def get_plant_by_temperature_anomaly_chart(
     ).properties(
         width=600,
         height=400,
-        title='Anomalous temperature results per plant in the last 24 hours'
+        title=title
     )
 
     return chart
 
 
-def get_plant_by_moisture_anomaly_chart(
+def get_plant_by_temperature_anomaly_chart(
         merged_df: pd.DataFrame, plant_df: pd.DataFrame) -> alt.Chart:
-    '''Returns a bar chart of the top 10 plants by anomaly count'''
-    anomaly_summary = get_moisture_anomalies(
-        merged_df).reset_index().drop(columns=['index'])
-    anomaly_df = pd.merge(anomaly_summary, plant_df,
-                          how='outer', on="plant_id")
-    top_10_anomalies = anomaly_df.sort_values(
-        'anomalies', ascending=False).head(10)
-    top_10_anomalies = top_10_anomalies[[
-        'plant_id', "anomalies", "plant_name"]]
-    top_10_anomalies.rename(columns={
-                            "plant_id": "Plant ID", "anomalies": "Anomaly Count",
-                            "plant_name": "Name"})
-    chart = alt.Chart(top_10_anomalies).mark_bar().encode(
-        x=alt.X('anomalies:Q', axis=alt.Axis(title='Anomaly Count')),
-        y=alt.Y('plant_name:O', sort=alt.EncodingSortField(
-            field='anomalies', order='descending'), axis=alt.Axis(title='Plant Name')),
-        color=alt.Color('anomalies:Q', scale=alt.Scale(scheme='greens'), legend=alt.Legend(
-            title='Anomaly Count')),
-        tooltip=['plant_name', 'plant_id', 'anomalies']
-    ).properties(
-        width=600,
-        height=400,
-        title='Anomalous moisture results per plant in the last 24 hours'
-    )
+    '''Returns a bar chart of the top 10 plants by temperature anomaly count'''
+    return create_anomaly_chart(
+        get_temp_anomalies(merged_df), plant_df,
+        'Anomalous temperature results per plant in the last 24 hours')
 
-    return chart
+
+def get_plant_by_moisture_anomaly_chart(
+        merged_df: pd.DataFrame, plant_df: pd.DataFrame) -> alt.Chart:
+    '''Returns a bar chart of the top 10 plants by moisture anomaly count'''
+    return create_anomaly_chart(
+        get_moisture_anomalies(merged_df), plant_df,
+        'Anomalous moisture results per plant in the last 24 hours')
+
+
+def get_partition_prefixes(prefix: str, start: datetime, end: datetime) -> dict[str, list[str]]:
+    """Returns the month partition prefixes covering start to end, each with its day partitions"""
+    partitions = {}
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end:
+        partitions.setdefault(f"{prefix}{day.strftime(MONTH_PARTITION_FORMAT)}", []).append(
+            f"{prefix}{day.strftime(DAY_PARTITION_FORMAT)}")
+        day += timedelta(days=1)
+    return partitions
+
+
+def list_parquet_keys(s3, bucket: str, prefix: str) -> list[str]:
+    """Lists every parquet key under prefix, following pagination past 1,000 keys"""
+    paginator = s3.get_paginator("list_objects_v2")
+    keys = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", [])
+                    if obj["Key"].endswith(".parquet"))
+    return keys
+
+
+def read_manifest(s3, bucket: str, partition_prefix: str) -> list[dict] | None:
+    """Returns the file entries of a partition's manifest, or None if it has none"""
+    try:
+        body = s3.get_object(Bucket=bucket, Key=f"{partition_prefix}{MANIFEST_NAME}")["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(body)["files"]
+
+
+def is_file_needed(entry: dict, start: datetime, end: datetime,
+                   plant_ids: tuple[int] = None) -> bool:
+    """Returns whether a file's manifest entry overlaps start to end and holds any of plant_ids"""
+    if not (pd.Timestamp(entry["min_time"]) <= end and start <= pd.Timestamp(entry["max_time"])):
+        return False
+    return not (plant_ids and set(plant_ids).isdisjoint(entry["plant_ids"]))
+
+
+def get_legacy_keys(s3, bucket: str, prefix: str, day_prefixes: list[str]) -> list[str]:
+    """Returns the parquet keys of the legacy date-only layout for the given day partitions.
+    Legacy files have no manifests, so each month is listed and only the wanted days' files
+    and the month's compacted file are kept. Once the compact lambda's migrate event has
+    moved a month, its listing comes back empty"""
+    days = [datetime.strptime(day[len(prefix):], DAY_PARTITION_FORMAT) for day in day_prefixes]
+    months = {f"{prefix}{day.strftime(LEGACY_MONTH_FORMAT)}" for day in days}
+    wanted = months | {f"{prefix}{day.strftime(LEGACY_DAY_FORMAT)}" for day in days}
+    return [key for month in sorted(months) for key in list_parquet_keys(s3, bucket, month)
+            if key.rsplit("/", 1)[0] + "/" in wanted]
+
+
+def find_history_keys(s3, bucket: str, prefix: str, start: datetime, end: datetime,
+                      *, plant_ids: tuple[int] = None) -> list[str]:
+    """Returns the parquet keys holding rows between start and end for plant_ids, read from
+    the partition manifests instead of listing. A month with a manifest has been compacted,
+    so its day partitions aren't read. The archive lambda writes a day's manifest before
+    deleting the rows from the database, so a day without one either has no files or is
+    still in the legacy layout, which is listed instead and filtered on read.
+    Partitions are named after the archive time, which is up to an hour after the rows,
+    so the partitions up to an hour past end are included"""
+    partitions = get_partition_prefixes(prefix, start, end + timedelta(hours=1))
+    with ThreadPoolExecutor(max_workers=S3_MAX_WORKERS) as executor:
+        month_files = dict(zip(partitions, executor.map(
+            lambda partition: read_manifest(s3, bucket, partition), partitions)))
+        day_prefixes = [day for month, days in partitions.items()
+                        if month_files[month] is None for day in days]
+        day_files = list(executor.map(
+            lambda partition: read_manifest(s3, bucket, partition), day_prefixes))
+
+    entries = [entry for files in [*month_files.values(), *day_files]
+               for entry in files or []]
+    unindexed_days = [day for day, files in zip(day_prefixes, day_files) if files is None]
+    legacy_keys = get_legacy_keys(s3, bucket, prefix, unindexed_days) if unindexed_days else []
+    return [entry["key"] for entry in entries
+            if is_file_needed(entry, start, end, plant_ids)] + legacy_keys
+
+
+def get_parquet_filters(start: datetime = None, end: datetime = None,
+                        plant_ids: tuple[int] = None) -> list[tuple] | None:
+    """Builds row filters the parquet reader can push down"""
+    filters = []
+    if start:
+        filters.append(("measurement_time", ">=", pd.Timestamp(start)))
+    if end:
+        filters.append(("measurement_time", "<=", pd.Timestamp(end)))
+    if plant_ids:
+        filters.append(("plant_id", "in", list(plant_ids)))
+    return filters or None
+
+
+def read_parquet_object(s3, bucket: str, key: str, columns: list[str],
+                        filters: list[tuple] | None) -> pd.DataFrame:
+    """Downloads a single parquet object, reading only the requested columns and rows"""
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    return pd.read_parquet(io.BytesIO(body), columns=columns, filters=filters)
 
 
 @st.cache_data(ttl=3600)
-def load_data_from_s3(bucket: str, prefix: str) -> pd.DataFrame:
-    """Connecting to s3 and loading data from buckets"""
+def load_data_from_s3(bucket: str, prefix: str, start: datetime = None, end: datetime = None,
+                      *, plant_ids: tuple[int] = None,
+                      columns: tuple[str] = HISTORY_COLUMNS) -> pd.DataFrame:
+    """Connecting to s3 and concurrently loading historical data, optionally
+    limited to a date range and set of plants"""
     s3 = boto3.client("s3")
-    response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
+    if start and end:
+        parquet_keys = find_history_keys(s3, bucket, prefix, start, end,
+                                         plant_ids=plant_ids)
+    else:
+        parquet_keys = list_parquet_keys(s3, bucket, prefix)
 
-    if "Contents" not in response:
+    if not parquet_keys:
         return pd.DataFrame()
 
-    parquet_keys = [obj["Key"] for obj in response["Contents"]
-                    if obj["Key"].endswith(".parquet")]
-
-    dataframes = [
-        pd.read_parquet(io.BytesIO(s3.get_object(
-            Bucket=bucket, Key=key)["Body"].read()))
-        for key in parquet_keys
-    ]
+    filters = get_parquet_filters(start, end, plant_ids)
+    with ThreadPoolExecutor(max_workers=S3_MAX_WORKERS) as executor:
+        dataframes = list(executor.map(
+            lambda key: read_parquet_object(
+                s3, bucket, key, list(columns), filters),
+            parquet_keys))
 
     return pd.concat(dataframes, ignore_index=True) if dataframes else pd.DataFrame()
 
 
-def streamlit(merged_df: pd.DataFrame, plant_df: pd.DataFrame,
-              merged_long_df: pd.DataFrame) -> None:
+@st.cache_data(ttl=3600)
+def get_merged_history(history_end: datetime, plant_id: int,
+                       days: int = HISTORY_DAYS) -> pd.DataFrame:
+    '''Returns a plant's last days of S3 history ending at history_end, with its name.
+    Only the files whose manifest entries list the plant are downloaded'''
+    longterm_df = load_data_from_s3(BUCKET_NAME, PREFIX,
+                                    history_end - timedelta(days=days), history_end,
+                                    plant_ids=(plant_id,))
+    if longterm_df.empty:
+        return longterm_df
+    return pd.merge(longterm_df, get_plant_information()[['plant_id', 'plant_name']],
+                    on='plant_id', how='left')
+
+
+@st.fragment
+def short_term_section(merged_df: pd.DataFrame) -> None:
+    '''Single plant chart for the last 24 hours. Changing the plant reruns only this section'''
+    st.subheader("Short-Term 24-Hour Database Insights")
+
+    chosen_plant_id = int(st.selectbox(
+        "Which plant would you like to analyse? Choose a plant ID:",
+        (merged_df['plant_id'].unique()), key='short-term-id'))
+    plant_chart, plant_name = create_single_plant_chart(
+        merged_df, chosen_plant_id)
+
+    st.write(f"You have selected the {plant_name}: ID {chosen_plant_id}")
+    st.altair_chart(plant_chart)
+
+
+@st.fragment
+def long_term_section() -> None:
+    '''Single plant chart from S3 history, only loaded once the section is switched on'''
+    st.subheader("Long-Term Database Insights")
+
+    if not st.toggle(f"Load the last {HISTORY_DAYS} days of history", key='load-history'):
+        return
+
+    chosen_plant_id_long = int(st.selectbox(
+        "Which plant would you like to analyse? Choose a plant ID:",
+        (get_plant_information()['plant_id'].sort_values()), key='long-term-id'))
+
+    history_end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    merged_long_df = get_merged_history(history_end, chosen_plant_id_long)
+    if merged_long_df.empty:
+        st.write("No long-term data found for this plant.")
+        return
+
+    plant_chart_long, plant_name_long = create_single_plant_chart(
+        merged_long_df, chosen_plant_id_long)
+
+    st.write(
+        f"You have selected the {plant_name_long}: ID {chosen_plant_id_long}")
+    st.altair_chart(plant_chart_long)
+
+
+def streamlit(merged_df: pd.DataFrame, plant_df: pd.DataFrame) -> None:
     '''Execute the streamlit code'''
 
     st.title(
@@ -292,28 +509,9 @@ def streamlit(merged_df: pd.DataFrame, plant_df: pd.DataFrame,
 
         st.altair_chart(temperature_anomaly_chart)
 
-    st.subheader("Short-Term 24-Hour Database Insights")
-
-    chosen_plant_id = int(st.selectbox(
-        "Which plant would you like to analyse? Choose a plant ID:",
-        (merged_df['plant_id'].unique()), key='short-term-id'))
-    plant_chart, plant_name = create_single_plant_chart(
-        merged_df, chosen_plant_id)
-
-    st.write(f"You have selected the {plant_name}: ID {chosen_plant_id}")
-    st.altair_chart(plant_chart)
-
-    st.subheader("Long-Term Database Insights")
-
-    chosen_plant_id_long = int(st.selectbox(
-        "Which plant would you like to analyse? Choose a plant ID:",
-        (merged_long_df['plant_id'].unique()), key='long-term-id'))
-    plant_chart_long, plant_name_long = create_single_plant_chart(
-        merged_long_df, chosen_plant_id_long)
+    short_term_section(merged_df)
 
-    st.write(
-        f"You have selected the {plant_name_long}: ID {chosen_plant_id_long}")
-    st.altair_chart(plant_chart_long)
+    long_term_section()
 
 
 if __name__ == "__main__":
@@ -321,13 +519,7 @@ if __name__ == "__main__":
     st.set_page_config(
         page_title="Botanist Dashboard", layout="wide")
     load_dotenv()
-    conn = get_conn()
-    plants_df = get_plant_information(conn)
-    measurement_df = get_measurements(conn)
-    merged_24hr_df = pd.merge(plants_df, measurement_df,
-                              on='plant_id', how='outer')
-    longterm_df = load_data_from_s3(BUCKET_NAME, PREFIX)
-    merged_longterm_df = pd.merge(
-        longterm_df, plants_df[['plant_id', 'plant_name']], on='plant_id', how='left')
-
-    streamlit(merged_24hr_df, plants_df, merged_longterm_df)
+    plants_df = get_plant_information()
+    merged_24hr_df = get_merged_measurements(get_time_bucket())
+
+    streamlit(merged_24hr_df, plants_df)
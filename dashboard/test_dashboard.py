@@ -0,0 +1,184 @@
+# pylint: skip-file
+"""Tests for the dashboard's chart downsampling and history file lookup"""
+
+import io
+import json
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from dashboard import (MAX_RAW_POINTS, CHART_WIDTH_PX, CHART_RESOLUTIONS,
+                       get_chart_resolution, downsample_min_max, get_chart_points,
+                       is_file_needed, find_history_keys)
+
+
+def get_readings(count, freq="min", seed=0):
+    """Returns per-minute readings for one plant starting at midnight"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "plant_id": 1,
+        "measurement_time": pd.date_range("2025-04-01", periods=count, freq=freq),
+        "temperature": rng.normal(15, 3, count),
+        "moisture": rng.normal(50, 10, count)
+    })
+
+
+def test_chart_resolution_gives_one_bucket_per_two_pixels():
+    """Test the smallest resolution with at most width / 2 buckets is chosen"""
+    start = datetime(2025, 4, 1)
+
+    assert get_chart_resolution(start, start + timedelta(hours=6)) == "1min"
+    assert get_chart_resolution(start, start + timedelta(days=1)) == "5min"
+    assert get_chart_resolution(start, start + timedelta(days=90)) == "6h"
+    assert get_chart_resolution(start, start + timedelta(days=5000)) == CHART_RESOLUTIONS[-1]
+
+
+def test_downsample_keeps_bucket_extremes():
+    """Test each bucket keeps its first, last, min and max readings, so spikes survive"""
+    readings = get_readings(120)
+    readings.loc[17, "temperature"] = 100.0
+    readings.loc[42, "moisture"] = -5.0
+
+    downsampled = downsample_min_max(readings, "1h")
+
+    for _, bucket in readings.groupby(readings["measurement_time"].dt.floor("1h")):
+        kept = downsampled[downsampled.index.isin(bucket.index)]
+        assert set(kept.index) == {bucket.index[0], bucket.index[-1],
+                                   bucket["temperature"].idxmin(), bucket["temperature"].idxmax(),
+                                   bucket["moisture"].idxmin(), bucket["moisture"].idxmax()}
+    assert downsampled["temperature"].max() == 100.0
+    assert downsampled["moisture"].min() == -5.0
+    assert downsampled["measurement_time"].is_monotonic_increasing
+
+
+def test_downsample_drops_missing_readings():
+    """Test readings without a value aren't drawn as a bucket's extreme"""
+    readings = get_readings(10)
+    readings.loc[3, "moisture"] = np.nan
+
+    assert 3 not in downsample_min_max(readings, "1h").index
+
+
+def test_chart_points_are_raw_up_to_the_cap():
+    """Test readings are drawn as they are until MAX_RAW_POINTS"""
+    readings = get_readings(MAX_RAW_POINTS)
+
+    points, resolution = get_chart_points(readings)
+
+    assert resolution is None
+    assert points is readings
+
+
+def test_chart_points_are_bounded_past_the_cap():
+    """Test 90 days of readings become at most six points per bucket,
+    with one bucket per two pixels"""
+    readings = get_readings(90 * 24 * 60)
+
+    points, resolution = get_chart_points(readings)
+
+    buckets = points["measurement_time"].dt.floor(resolution).nunique()
+    assert resolution == "6h"
+    assert buckets <= CHART_WIDTH_PX // 2
+    assert len(points) <= 6 * buckets
+
+
+class NoSuchKey(Exception):
+    """Stand-in for the client's NoSuchKey error"""
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 client calls the history lookup makes"""
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self):
+        self.objects = {}
+        self.listed = []
+
+    def get_paginator(self, name):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                fake.listed.append(Prefix)
+                yield {"Contents": [{"Key": key} for key in sorted(fake.objects)
+                                    if key.startswith(Prefix)]}
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_manifest(self, partition, files):
+        self.objects[f"{partition}_manifest.json"] = json.dumps({"files": files}).encode()
+
+
+def get_entry(key, min_time, max_time, plant_ids):
+    """Returns a manifest entry"""
+    return {"key": key, "rows": 1, "min_time": min_time.isoformat(),
+            "max_time": max_time.isoformat(), "plant_ids": plant_ids}
+
+
+@pytest.fixture
+def s3():
+    """Fixture providing a bucket with an hourly file on 4 April for plants 1 and 2,
+    a compacted March file for plant 3 and legacy layout files on 5 April"""
+    s3 = FakeS3()
+    april = "historical/year=2025/month=04/day=04/"
+    march = "historical/year=2025/month=03/"
+    s3.put_manifest(april, [get_entry(f"{april}measurements_10.parquet",
+                                      datetime(2025, 4, 4, 9), datetime(2025, 4, 4, 10),
+                                      [1, 2])])
+    s3.put_manifest(march, [get_entry(f"{march}measurements_monthly.parquet",
+                                      datetime(2025, 3, 1), datetime(2025, 3, 31, 23), [3])])
+    for key in ("historical/2025-04/05/measurements_10.parquet",
+                "historical/2025-04/07/measurements_10.parquet"):
+        s3.objects[key] = b""
+    return s3
+
+
+def test_is_file_needed_prunes_by_time_and_plant():
+    """Test files outside the range or without the wanted plants are skipped"""
+    entry = get_entry("key", datetime(2025, 4, 4, 9), datetime(2025, 4, 4, 10), [1, 2])
+
+    assert is_file_needed(entry, datetime(2025, 4, 4, 10), datetime(2025, 4, 5))
+    assert is_file_needed(entry, datetime(2025, 4, 4), datetime(2025, 4, 4, 9), (2, 5))
+    assert not is_file_needed(entry, datetime(2025, 4, 4, 10, 1), datetime(2025, 4, 5))
+    assert not is_file_needed(entry, datetime(2025, 4, 3), datetime(2025, 4, 4, 8))
+    assert not is_file_needed(entry, datetime(2025, 4, 4), datetime(2025, 4, 5), (3,))
+
+
+def test_find_history_keys_reads_manifests_in_range(s3):
+    """Test only the manifests' files overlapping the range and holding the plant are returned"""
+    keys = find_history_keys(s3, None, "historical/", datetime(2025, 3, 30),
+                             datetime(2025, 4, 4, 12), plant_ids=(1,))
+
+    assert keys == ["historical/year=2025/month=04/day=04/measurements_10.parquet"]
+
+
+def test_find_history_keys_uses_compacted_month(s3):
+    """Test a month with a manifest is read from it without reading its days"""
+    keys = find_history_keys(s3, None, "historical/", datetime(2025, 3, 30),
+                             datetime(2025, 3, 31), plant_ids=(3,))
+
+    assert keys == ["historical/year=2025/month=03/measurements_monthly.parquet"]
+    assert "historical/2025-03/" not in s3.listed
+
+
+def test_find_history_keys_falls_back_to_legacy_layout(s3):
+    """Test days without a manifest are found in the legacy layout, limited to the range"""
+    keys = find_history_keys(s3, None, "historical/", datetime(2025, 4, 4, 12),
+                             datetime(2025, 4, 6), plant_ids=(1,))
+
+    assert keys == ["historical/2025-04/05/measurements_10.parquet"]
+    assert s3.listed == ["historical/2025-04/"]
+
+
+def test_find_history_keys_lists_nothing_when_indexed(s3):
+    """Test a range whose days all have manifests sends no list requests"""
+    find_history_keys(s3, None, "historical/", datetime(2025, 4, 4, 8),
+                      datetime(2025, 4, 4, 10))
+
+    assert s3.listed == []
@@ -0,0 +1,181 @@
+"""Lambda Handler that compacts hourly historical parquet files into daily and monthly files"""
+# pylint: disable = broad-exception-caught
+import os
+import io
+import logging
+from datetime import datetime, timedelta
+import boto3
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from move_storage import BUCKET_NAME, enable_logging, to_measurement_table
+from manifest import (MANIFEST_NAME, get_file_entry, get_partition_prefix,
+                      get_manifest_key, write_manifest)
+
+DAY_PARTITION = "historical/year=%Y/month=%m/day=%d/"
+MONTH_PARTITION = "historical/year=%Y/month=%m/"
+DAILY_KEY = f"{DAY_PARTITION}measurements_daily.parquet"
+MONTHLY_KEY = f"{MONTH_PARTITION}measurements_monthly.parquet"
+# The date-only layout used before the archive was partitioned, migrated on request
+LEGACY_MONTH_PARTITION = "historical/%Y-%m/"
+LEGACY_DAY_PARTITION = f"{LEGACY_MONTH_PARTITION}%d/"
+LEGACY_MONTHLY_KEY = f"{LEGACY_MONTH_PARTITION}measurements_monthly.parquet"
+# Days are compacted once the archive lambda can no longer add hours to them
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", "2"))
+LOOKBACK_DAYS = int(os.getenv("COMPACT_LOOKBACK_DAYS", "7"))
+# Sorted by plant, so row group min/max statistics let readers skip other plants' rows
+SORT_KEYS = [("plant_id", "ascending"), ("measurement_time", "ascending")]
+# A plant has one reading per measurement_time, matching the UX_measurement_plant_time index
+DEDUPE_KEYS = ["plant_id", "measurement_time"]
+ROW_GROUP_SIZE = int(os.getenv("ROW_GROUP_SIZE", "131072"))
+COMPRESSION = "zstd"
+# delete_objects accepts at most 1,000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+def list_keys(s3_client, prefix: str, suffix: str = ".parquet") -> list[str]:
+    """Lists the keys under prefix ending in suffix, following pagination"""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    keys = []
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", [])
+                    if obj["Key"].endswith(suffix))
+    return keys
+
+
+def read_table(s3_client, key: str) -> pa.Table:
+    """Reads a parquet object from the bucket into an arrow table in MEASUREMENT_SCHEMA"""
+    body = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)["Body"].read()
+    return to_measurement_table(pq.read_table(io.BytesIO(body)))
+
+
+def compact_table(table: pa.Table) -> pa.Table:
+    """Keeps the first reading for each plant and measurement_time, since a rerun can read rows
+    from both a compacted file and its not yet deleted sources, then sorts by plant and time.
+    measurement_id isn't used, as truncating the measurement table reuses ids"""
+    numbered = table.append_column("row_number", pa.array(np.arange(table.num_rows)))
+    first_rows = numbered.group_by(DEDUPE_KEYS, use_threads=False).aggregate(
+        [("row_number", "min")])["row_number_min"]
+    return table.take(first_rows).sort_by(SORT_KEYS)
+
+
+def write_table(s3_client, key: str, table: pa.Table) -> None:
+    """Writes a table to the bucket as one parquet object tuned for range scans"""
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=ROW_GROUP_SIZE,
+                   compression=COMPRESSION, write_statistics=True)
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=buffer.getvalue())
+
+
+def delete_keys(s3_client, keys: list[str]) -> None:
+    """Deletes keys from the bucket in batches"""
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        s3_client.delete_objects(Bucket=BUCKET_NAME, Delete={
+            "Objects": [{"Key": key} for key in keys[start:start + DELETE_BATCH_SIZE]],
+            "Quiet": True})
+
+
+def compact(s3_client, target_key: str, keys: list[str]) -> int:
+    """Merges every key into target_key, including the target itself if it already exists,
+    then points the target's partition manifest at it alone and deletes the other keys,
+    along with the manifests of any partitions nested under the target's.
+    Writing before deleting makes a rerun after a failure safe: the leftover sources are
+    merged again and their repeated rows dropped, and readers following the manifest
+    never see them. Returns the number of files compacted"""
+    sources = [key for key in keys if key != target_key]
+    if not sources:
+        return 0
+
+    tables = [read_table(s3_client, key) for key in keys]
+    table = compact_table(pa.concat_tables(tables))
+    write_table(s3_client, target_key, table)
+
+    partition_prefix = get_partition_prefix(target_key)
+    write_manifest(s3_client, BUCKET_NAME, partition_prefix,
+                   [get_file_entry(target_key, table)])
+    nested_manifests = [key for key in list_keys(s3_client, partition_prefix, MANIFEST_NAME)
+                        if key != get_manifest_key(partition_prefix)]
+    delete_keys(s3_client, sources + nested_manifests)
+    logging.info("Compacted %s files (%s rows) into %s",
+                 len(sources), table.num_rows, target_key)
+    return len(sources)
+
+
+def compact_day(s3_client, day: datetime) -> int:
+    """Compacts a day's hourly files into its daily file"""
+    keys = list_keys(s3_client, day.strftime(DAY_PARTITION))
+    return compact(s3_client, day.strftime(DAILY_KEY), keys)
+
+
+def compact_month(s3_client, month: datetime) -> int:
+    """Compacts a month's daily and any remaining hourly files into its monthly file"""
+    keys = list_keys(s3_client, month.strftime(MONTH_PARTITION))
+    return compact(s3_client, month.strftime(MONTHLY_KEY), keys)
+
+
+def migrate_month(s3_client, month: datetime) -> int:
+    """Moves a month of the legacy date-only layout into the partitioned layout with
+    manifests. A month that was already compacted goes into its monthly file, otherwise
+    each legacy day goes into that day's daily file, merged with anything already there"""
+    legacy_keys = list_keys(s3_client, month.strftime(LEGACY_MONTH_PARTITION))
+    if month.strftime(LEGACY_MONTHLY_KEY) in legacy_keys:
+        keys = list_keys(s3_client, month.strftime(MONTH_PARTITION)) + legacy_keys
+        return compact(s3_client, month.strftime(MONTHLY_KEY), keys)
+
+    days = {}
+    for key in legacy_keys:
+        day = datetime.strptime(get_partition_prefix(key), LEGACY_DAY_PARTITION)
+        days.setdefault(day, []).append(key)
+    return sum(compact(s3_client, day.strftime(DAILY_KEY),
+                       list_keys(s3_client, day.strftime(DAY_PARTITION)) + day_keys)
+               for day, day_keys in days.items())
+
+
+def get_month_start(day: datetime) -> datetime:
+    """Returns midnight on the first day of day's month"""
+    return day.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_compaction_dates(now: datetime, lookback_days: int = LOOKBACK_DAYS,
+                         compact_after_days: int = COMPACT_AFTER_DAYS
+                         ) -> tuple[list[datetime], list[datetime]]:
+    """Returns the complete days in the lookback window, and the months
+    whose last day is in it"""
+    last_day = (now - timedelta(days=compact_after_days)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    days = [last_day - timedelta(days=offset) for offset in range(lookback_days)][::-1]
+    months = [get_month_start(day - timedelta(days=1)) for day in days if day.day == 1]
+    return days, months
+
+
+def handler(event, context):
+    """Main handler function. An event can name specific 'days' (YYYY-MM-DD)
+    or 'months' (YYYY-MM) to compact, for example to backfill older history,
+    and legacy 'migrate' months (YYYY-MM) to move into the partitioned layout"""
+    enable_logging()
+    logging.info("Lambda Running - Event: %s", event)
+    logging.info("Lambda Context passed: %s", context)
+
+    event = event or {}
+    migrate = [datetime.strptime(month, "%Y-%m") for month in event.get("migrate", [])]
+    if "days" in event or "months" in event or migrate:
+        days = [datetime.strptime(day, "%Y-%m-%d") for day in event.get("days", [])]
+        months = [datetime.strptime(month, "%Y-%m") for month in event.get("months", [])]
+    else:
+        days, months = get_compaction_dates(datetime.now())
+
+    s3_client = boto3.client('s3')
+    try:
+        files_migrated = sum(migrate_month(s3_client, month) for month in migrate)
+        days_compacted = sum(compact_day(s3_client, day) > 0 for day in days)
+        months_compacted = sum(compact_month(s3_client, month) > 0 for month in months)
+    except Exception as error:
+        logging.error("Error compacting history: %s", error)
+        return {'status': 500, 'reason': 'S3 Error'}
+
+    return {'status': 200, 'days_compacted': days_compacted,
+            'months_compacted': months_compacted, 'files_migrated': files_migrated}
+
+
+if __name__ == '__main__':
+    handler(None, None)
@@ -0,0 +1,68 @@
+# pylint: skip-file
+"""Fixtures shared by the archive lambda tests"""
+
+import io
+import pytest
+
+
+class NoSuchKey(Exception):
+    """Stand-in for the client's NoSuchKey error"""
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 client calls the archive uses"""
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+
+    def get_paginator(self, name):
+        objects = self.objects
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": key} for key in sorted(objects)
+                                    if key.startswith(Prefix)]}
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = bytes(Body)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {"key": Key, "parts": {}, "status": "open"}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId]["parts"][PartNumber] = bytes(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads[UploadId]
+        upload["status"] = "complete"
+        self.objects[Key] = b"".join(upload["parts"][part["PartNumber"]]
+                                     for part in MultipartUpload["Parts"])
+        return {"Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads[UploadId]["status"] = "aborted"
+
+
+@pytest.fixture
+def s3():
+    """Fixture providing an empty fake bucket"""
+    return FakeS3()
+
+
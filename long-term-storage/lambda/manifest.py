@@ -0,0 +1,74 @@
+"""Per-partition manifests indexing the parquet files in the historical archive"""
+# pylint: disable = no-member
+import os
+import json
+import logging
+import pyarrow as pa
+import pyarrow.compute as pc
+
+MANIFEST_NAME = "_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def get_partition_prefix(key: str) -> str:
+    """Returns the partition prefix (year=/month=/day=) a key is stored under"""
+    return os.path.dirname(key) + "/"
+
+
+def get_manifest_key(partition_prefix: str) -> str:
+    """Returns the key of a partition's manifest"""
+    return f"{partition_prefix}{MANIFEST_NAME}"
+
+
+def get_file_entry(key: str, data: pa.Table | pa.RecordBatch) -> dict:
+    """Returns the manifest entry for a parquet file holding data: its key, row count,
+    first and last measurement_time and the plant ids present"""
+    times = pc.min_max(data["measurement_time"])
+    return {
+        "key": key,
+        "rows": data.num_rows,
+        "min_time": times["min"].as_py().isoformat(),
+        "max_time": times["max"].as_py().isoformat(),
+        "plant_ids": sorted(pc.unique(data["plant_id"]).to_pylist())
+    }
+
+
+def merge_file_entries(entry: dict | None, other: dict) -> dict:
+    """Combines the entries of two chunks of the same file"""
+    if entry is None:
+        return other
+    return {
+        "key": entry["key"],
+        "rows": entry["rows"] + other["rows"],
+        "min_time": min(entry["min_time"], other["min_time"]),
+        "max_time": max(entry["max_time"], other["max_time"]),
+        "plant_ids": sorted(set(entry["plant_ids"]) | set(other["plant_ids"]))
+    }
+
+
+def read_manifest(s3_client, bucket: str, partition_prefix: str) -> list[dict] | None:
+    """Returns the file entries of a partition's manifest, or None if it has none"""
+    try:
+        body = s3_client.get_object(
+            Bucket=bucket, Key=get_manifest_key(partition_prefix))["Body"].read()
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(body)["files"]
+
+
+def write_manifest(s3_client, bucket: str, partition_prefix: str, files: list[dict]) -> None:
+    """Overwrites a partition's manifest with files"""
+    body = json.dumps({"version": MANIFEST_VERSION,
+                       "files": sorted(files, key=lambda entry: entry["key"])})
+    s3_client.put_object(Bucket=bucket, Key=get_manifest_key(partition_prefix),
+                         Body=body.encode("utf-8"), ContentType="application/json")
+    logging.info("Wrote manifest for %s (%s files)", partition_prefix, len(files))
+
+
+def update_manifest(s3_client, bucket: str, entry: dict) -> None:
+    """Adds or replaces a file's entry in its partition's manifest.
+    Only the archive lambda writes new files, so there are no concurrent updates"""
+    partition_prefix = get_partition_prefix(entry["key"])
+    files = read_manifest(s3_client, bucket, partition_prefix) or []
+    files = [file for file in files if file["key"] != entry["key"]]
+    write_manifest(s3_client, bucket, partition_prefix, [*files, entry])
@@ -7,13 +7,90 @@ from datetime import datetime, timedelta
 import boto3
 import pymssql
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from db_connection import get_connection
+from manifest import get_file_entry, merge_file_entries, update_manifest
 
 load_dotenv('.env.prod')
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 PRODUCTION_MODE = os.getenv("PRODUCTION_MODE", 'FALSE').lower() == 'true'
+PARTITIONED_MEASUREMENTS = os.getenv(
+    "PARTITIONED_MEASUREMENTS", 'FALSE').lower() == 'true'
+# Hive-style partitions, so readers and query engines can prune on the key alone
+HOURLY_KEY = "historical/year=%Y/month=%m/day=%d/measurements_%H.parquet"
+ROLLUP_METRICS = ("temperature", "moisture")
+HOURLY_ROLLUP_KEY = "aggregate/hourly/%Y-%m/%d/rollup_%H.parquet"
+DAILY_ROLLUP_KEY = "aggregate/daily/%Y-%m/rollup_%d.parquet"
+STREAMING_EXPORT = os.getenv("STREAMING_EXPORT", 'TRUE').lower() == 'true'
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "50000"))
+# S3 multipart parts must be at least 5MB, except the last one
+PART_SIZE = 8 * 1024 * 1024
+MEASUREMENT_SCHEMA = pa.schema([
+    ("measurement_id", pa.int64()),
+    ("plant_id", pa.int64()),
+    ("measurement_time", pa.timestamp("us")),
+    ("last_watered", pa.timestamp("us")),
+    ("moisture", pa.float64()),
+    ("temperature", pa.float64())
+])
+OLD_DATA_SQL = """SELECT *
+    FROM measurement
+    WHERE measurement_time < %s;"""
+
+
+class MultipartUpload(io.RawIOBase):
+    """Writable stream that uploads to S3 in multipart chunks of part_size bytes,
+    so only one part is held in memory at a time"""
+
+    def __init__(self, s3_client, key: str, part_size: int = PART_SIZE):
+        super().__init__()
+        self.s3_client = s3_client
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = s3_client.create_multipart_upload(
+            Bucket=BUCKET_NAME, Key=key)["UploadId"]
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        if len(self.buffer) >= self.part_size:
+            self.upload_part()
+        return len(data)
+
+    def upload_part(self) -> None:
+        """Upload the buffered bytes as the next part"""
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(Bucket=BUCKET_NAME, Key=self.key,
+                                              UploadId=self.upload_id,
+                                              PartNumber=part_number, Body=bytes(self.buffer))
+        self.parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        self.buffer.clear()
+        logging.info("Uploaded part %s", part_number)
+
+    def complete(self) -> dict:
+        """Upload the remaining bytes and complete the upload"""
+        if self.buffer or not self.parts:
+            self.upload_part()
+        response = self.s3_client.complete_multipart_upload(
+            Bucket=BUCKET_NAME, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts})
+        super().close()
+        return response
+
+    def abort(self) -> None:
+        """Abort the upload so no partial object or orphaned parts are left"""
+        self.s3_client.abort_multipart_upload(
+            Bucket=BUCKET_NAME, Key=self.key, UploadId=self.upload_id)
+        super().close()
 
 
 def enable_logging() -> None:
@@ -25,14 +102,8 @@ def enable_logging() -> None:
 
 
 def connect_to_db() -> pymssql.Connection:
-    """Create a connection to the database"""
-    logging.info("Creating DB connection")
-    return pymssql.connect(host=os.getenv("DB_HOST"),
-                           database=os.getenv("DB_NAME"),
-                           user=os.getenv("DB_USERNAME"),
-                           password=os.getenv("DB_PASSWORD"),
-                           port=os.getenv("DB_PORT"),
-                           as_dict=True)
+    """Get the cached connection to the database, shared by every step of the run"""
+    return get_connection(as_dict=True)
 
 
 def get_old_data(cutoff_date: datetime) -> list[dict]:
@@ -41,18 +112,32 @@ def get_old_data(cutoff_date: datetime) -> list[dict]:
     db_cursor = db_conn.cursor()
     logging.info("Connected, retrieving old data...")
 
-    db_cursor.execute("""SELECT *
-    FROM measurement
-    WHERE measurement_time < %s;""", cutoff_date)
+    db_cursor.execute(OLD_DATA_SQL, cutoff_date)
 
     data = db_cursor.fetchall()
     db_cursor.close()
-    db_conn.close()
-    logging.info("Connection closed, data fetched.")
+    logging.info("Data fetched.")
     return data
 
 
-def generate_file(data: list[dict]) -> io.BytesIO:
+def to_measurement_table(data: pd.DataFrame | pa.Table) -> pa.Table:
+    """Returns measurements as an arrow table in MEASUREMENT_SCHEMA, so files written by pandas
+    (timestamp[ns]) and by the streaming export (timestamp[us]) can be combined"""
+    if isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    # DATETIME columns are only accurate to 1/300s, so dropping nanoseconds loses nothing
+    return data.select(MEASUREMENT_SCHEMA.names).cast(MEASUREMENT_SCHEMA, safe=False)
+
+
+def generate_measurement_file(table: pa.Table) -> io.BytesIO:
+    """Create a parquet file from a measurement table"""
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    logging.info("Saved parquet to buffer")
+    return buffer
+
+
+def generate_file(data: list[dict] | pd.DataFrame) -> io.BytesIO:
     """Create DataFrame and create parquet file from that"""
     logging.info("Creating DataFrame")
     df = pd.DataFrame(data)
@@ -65,7 +150,7 @@ def generate_file(data: list[dict]) -> io.BytesIO:
 
 def generate_key(date_time: datetime) -> str:
     """Generate a file key from date"""
-    key = date_time.strftime("historical/%Y-%m/%d/measurements_%H.parquet")
+    key = date_time.strftime(HOURLY_KEY)
     logging.info("Generated key string: %s", key)
     return key
 
@@ -80,20 +165,153 @@ def upload_data(key: str, buffered_data: io.BytesIO) -> dict:
     return response
 
 
+def stream_old_data(cutoff_date: datetime, key: str,
+                    chunk_size: int = CHUNK_SIZE) -> tuple[int, pd.DataFrame, dict | None]:
+    """Stream old records from the database to a parquet object in chunks of chunk_size rows,
+    one row group per chunk. Returns the number of rows archived, their hourly rollup
+    and the file's manifest entry"""
+    db_conn = connect_to_db()
+    db_cursor = db_conn.cursor()
+    logging.info("Connected, streaming old data...")
+    db_cursor.execute(OLD_DATA_SQL, cutoff_date)
+
+    upload = writer = None
+    rows_archived = 0
+    rollups = []
+    entry = None
+    try:
+        while chunk := db_cursor.fetchmany(chunk_size):
+            batch = pa.RecordBatch.from_pylist(chunk, schema=MEASUREMENT_SCHEMA)
+            if upload is None:
+                upload = MultipartUpload(boto3.client('s3'), key)
+                writer = pq.ParquetWriter(upload, MEASUREMENT_SCHEMA)
+            writer.write_batch(batch)
+            rollups.append(generate_rollup(batch.to_pandas(), "h"))
+            entry = merge_file_entries(entry, get_file_entry(key, batch))
+            rows_archived += batch.num_rows
+            logging.info("Streamed %s rows", rows_archived)
+
+        if upload is not None:
+            writer.close()
+            upload.complete()
+    except Exception:
+        if upload is not None:
+            upload.abort()
+        raise
+    finally:
+        db_cursor.close()
+
+    if not rollups:
+        return 0, pd.DataFrame(), None
+    return rows_archived, combine_rollups(pd.concat(rollups, ignore_index=True), "h"), entry
+
+
+def generate_rollup(data: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Aggregate measurements per plant and period into count, min, max, mean and std"""
+    periods = pd.to_datetime(data["measurement_time"]).dt.floor(freq)
+    grouped = data.groupby(["plant_id", periods.rename("period_start")])
+
+    rollup = grouped.size().rename("count").to_frame()
+    for metric in ROLLUP_METRICS:
+        stats = grouped[metric].agg(["min", "max", "mean", "std"])
+        rollup[[f"{metric}_{stat}" for stat in stats.columns]] = stats
+    return rollup.reset_index()
+
+
+def combine_rollups(rollups: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Merge partial rollups into coarser periods, combining means and
+    variances with the parallel (Chan et al.) form of Welford's algorithm"""
+    rollups = rollups.assign(
+        period_start=rollups["period_start"].dt.floor(freq))
+    keys = ["plant_id", "period_start"]
+    grouped = rollups.groupby(keys)
+    combined = grouped["count"].sum().to_frame()
+
+    for metric in ROLLUP_METRICS:
+        count = rollups["count"]
+        mean = rollups[f"{metric}_mean"]
+        sums = rollups[keys].assign(
+            total=count * mean,
+            total_sq=count * mean ** 2,
+            m2=rollups[f"{metric}_std"].fillna(0) ** 2 * (count - 1)
+        ).groupby(keys).sum()
+
+        combined_mean = sums["total"] / combined["count"]
+        m2 = sums["m2"] + sums["total_sq"] - combined["count"] * combined_mean ** 2
+        combined[f"{metric}_min"] = grouped[f"{metric}_min"].min()
+        combined[f"{metric}_max"] = grouped[f"{metric}_max"].max()
+        combined[f"{metric}_mean"] = combined_mean
+        combined[f"{metric}_std"] = np.sqrt(
+            m2.clip(lower=0) / (combined["count"] - 1).where(combined["count"] > 1))
+    return combined.reset_index()
+
+
+def read_parquet_from_bucket(key: str) -> pd.DataFrame:
+    """Read a parquet object from the bucket into a DataFrame"""
+    s3_client = boto3.client('s3')
+    body = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)["Body"].read()
+    return pd.read_parquet(io.BytesIO(body))
+
+
+def get_hourly_rollups(first_day: datetime, last_day: datetime) -> pd.DataFrame:
+    """Read every hourly rollup archived between first_day and last_day"""
+    s3_client = boto3.client('s3')
+    paginator = s3_client.get_paginator("list_objects_v2")
+    day = first_day
+    keys = []
+    while day <= last_day:
+        prefix = day.strftime(os.path.dirname(HOURLY_ROLLUP_KEY) + "/")
+        for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        day += timedelta(days=1)
+
+    if not keys:
+        return pd.DataFrame()
+    return pd.concat([read_parquet_from_bucket(key) for key in keys], ignore_index=True)
+
+
+def upload_rollups(hourly_rollup: pd.DataFrame, cutoff_date: datetime) -> None:
+    """Write the hourly rollup for this batch, then rebuild the daily rollups of every
+    day it touched from the hourly rollups, so reruns overwrite rather than double count"""
+    upload_data(cutoff_date.strftime(HOURLY_ROLLUP_KEY),
+                generate_file(hourly_rollup))
+
+    days = hourly_rollup["period_start"].dt.floor("D").unique()
+    hourly_rollups = get_hourly_rollups(min(days), cutoff_date)
+    if hourly_rollups.empty:
+        logging.warning("No hourly rollups found to rebuild the daily rollups from")
+        return
+    hourly_rollups = hourly_rollups[
+        hourly_rollups["period_start"].dt.floor("D").isin(days)]
+
+    daily_rollups = combine_rollups(hourly_rollups, "D")
+    for day, daily_rollup in daily_rollups.groupby("period_start"):
+        upload_data(day.strftime(DAILY_ROLLUP_KEY), generate_file(daily_rollup))
+    logging.info("Updated rollups for %s days", len(days))
+
+
 def delete_old_data(cutoff_date: datetime) -> int:
     """Delete old rows from the database"""
     logging.info("Deleting old records from the database.")
     db_conn = connect_to_db()
     db_cursor = db_conn.cursor()
     try:
-        db_cursor.execute("""DELETE
-        FROM measurement
-        WHERE measurement_time < %s;""", cutoff_date)
+        if PARTITIONED_MEASUREMENTS:
+            logging.info("Switching out old partitions")
+            db_cursor.execute(
+                "EXEC switch_out_old_measurements %s;", cutoff_date)
+            rows_count = db_cursor.fetchone()['rows_deleted']
+        else:
+            db_cursor.execute("""DELETE
+            FROM measurement
+            WHERE measurement_time < %s;""", cutoff_date)
+            rows_count = db_cursor.rowcount
 
         if PRODUCTION_MODE:
             db_conn.commit()
             logging.warning("Committed changes to database!")
-        rows_count = db_cursor.rowcount
+        else:
+            db_conn.rollback()
 
     except pymssql.Error as error:
         logging.error("Error - : %s", error)
@@ -101,12 +319,60 @@ def delete_old_data(cutoff_date: datetime) -> int:
         return -1
     finally:
         db_cursor.close()
-        db_conn.close()
 
     logging.info("Dropped %s rows", rows_count)
     return rows_count
 
 
+def export_streaming(cutoff_date: datetime, key: str) -> tuple[dict | None, pd.DataFrame, dict]:
+    """Stream old records to key. Returns an error response, or None with the
+    hourly rollup and manifest entry of the archived rows"""
+    try:
+        rows_archived, hourly_rollup, entry = stream_old_data(cutoff_date, key)
+    except Exception as error:
+        logging.error("Error streaming data to S3: %s", error)
+        return {'status': 500, 'reason': 'S3 Error'}, None, None
+    if not rows_archived:
+        logging.info("No data present... Exiting...")
+        return {'status': 404, 'reason': 'No rows found'}, None, None
+    return None, hourly_rollup, entry
+
+
+def export_in_memory(cutoff_date: datetime, key: str) -> tuple[dict | None, pd.DataFrame, dict]:
+    """Fetch every old record and upload them to key in one request. Returns an error
+    response, or None with the hourly rollup and manifest entry of the archived rows"""
+    old_data = get_old_data(cutoff_date)
+    if not old_data:
+        logging.info("No data present... Exiting...")
+        return {'status': 404, 'reason': 'No rows found'}, None, None
+
+    old_df = pd.DataFrame(old_data)
+    old_table = to_measurement_table(old_df)
+    buffered_data = generate_measurement_file(old_table)
+    response = upload_data(key, buffered_data)
+
+    status = response.get('ResponseMetadata').get('HTTPStatusCode')
+    logging.info("Recieved Status code: %s", status)
+
+    if status != 200:
+        logging.error("Error! - Status Code: %s", status)
+        return {'status': status, 'reason': 'S3 Error'}, None, None
+    return None, generate_rollup(old_df, "h"), get_file_entry(key, old_table)
+
+
+def update_rollups(hourly_rollup: pd.DataFrame, cutoff_date: datetime) -> None:
+    """Upload the rollups of the archived rows. Rows are only deleted in production mode.
+    Otherwise every run archives the same old rows again, and rolling them up each time
+    would double count them in the daily rollups"""
+    if not PRODUCTION_MODE:
+        logging.info("Skipping rollups, as no rows were deleted")
+        return
+    try:
+        upload_rollups(hourly_rollup, cutoff_date)
+    except Exception as error:
+        logging.error("Failed to update rollups: %s", error)
+
+
 def handler(event, context):
     """Main handler function"""
     enable_logging()
@@ -126,26 +392,23 @@ def handler(event, context):
 
     logging.info("Cutting off data older than: %s", cutoff_datetime)
 
-    old_data = get_old_data(cutoff_datetime)
-    if not old_data:
-        logging.info("No data present... Exiting...")
-        return {'status': 404, 'reason': 'No rows found'}
-
-    buffered_data = generate_file(old_data)
     key = generate_key(cutoff_datetime)
-    response = upload_data(key, buffered_data)
+    export = export_streaming if STREAMING_EXPORT else export_in_memory
+    error_response, hourly_rollup, entry = export(cutoff_datetime, key)
+    if error_response:
+        return error_response
 
-    status = response.get('ResponseMetadata').get('HTTPStatusCode')
-    logging.info("Recieved Status code: %s", status)
-
-    if status != 200:
-        logging.error("Error! - Status Code: %s", status)
-        return {'status': status, 'reason': 'S3 Error'}
+    try:
+        update_manifest(boto3.client('s3'), BUCKET_NAME, entry)
+    except Exception as error:
+        logging.error("Error updating manifest: %s", error)
+        return {'status': 500, 'reason': 'S3 Error'}
 
     db_result = delete_old_data(cutoff_datetime)
     if db_result == -1:
         return {'status': 500}
 
+    update_rollups(hourly_rollup, cutoff_datetime)
     return {'status': 200, 'rows_deleted': db_result}
 
 
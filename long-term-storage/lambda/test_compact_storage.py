@@ -0,0 +1,143 @@
+# pylint: skip-file
+"""Tests for the compact storage script"""
+
+import io
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+from compact_storage import (compact_table, compact_day, compact_month, migrate_month,
+                             read_table, get_compaction_dates)
+from manifest import read_manifest
+from move_storage import MEASUREMENT_SCHEMA
+
+
+def get_table(rows: list[tuple]) -> pa.Table:
+    """Returns a measurement table from (measurement_id, plant_id, measurement_time) rows"""
+    return pa.Table.from_pylist([
+        {"measurement_id": measurement_id, "plant_id": plant_id,
+         "measurement_time": measurement_time, "last_watered": measurement_time,
+         "moisture": 90.0, "temperature": 12.0}
+        for measurement_id, plant_id, measurement_time in rows], schema=MEASUREMENT_SCHEMA)
+
+
+def test_compact_table_drops_repeated_readings():
+    """Test a reading read from both a compacted file and its source is kept once"""
+    table = get_table([(1, 2, datetime(2025, 4, 4, 10, 1)),
+                       (2, 1, datetime(2025, 4, 4, 10, 0)),
+                       (1, 2, datetime(2025, 4, 4, 10, 1))])
+
+    result = compact_table(table)
+
+    assert result.num_rows == 2
+    assert result["plant_id"].to_pylist() == [1, 2]
+
+
+def test_compact_table_keeps_readings_sharing_an_id():
+    """Test distinct readings with an id reused after a truncate both survive"""
+    table = get_table([(7, 1, datetime(2025, 4, 4, 10, 0)),
+                       (7, 3, datetime(2025, 4, 5, 11, 0)),
+                       (7, 1, datetime(2025, 4, 5, 11, 0))])
+
+    result = compact_table(table)
+
+    assert result.num_rows == 3
+    assert list(zip(result["plant_id"].to_pylist(),
+                    result["measurement_time"].to_pylist())) == [
+        (1, datetime(2025, 4, 4, 10, 0)), (1, datetime(2025, 4, 5, 11, 0)),
+        (3, datetime(2025, 4, 5, 11, 0))]
+
+
+def put_pandas_file(s3, key, rows):
+    """Writes rows the way the legacy and non-streaming code did, with timestamp[ns] columns"""
+    df = get_table(rows).to_pandas()
+    df["measurement_time"] = df["measurement_time"].astype("datetime64[ns]")
+    df["last_watered"] = df["last_watered"].astype("datetime64[ns]")
+    s3.put_object(Bucket=None, Key=key, Body=df.to_parquet(index=False))
+
+
+def put_streamed_file(s3, key, rows):
+    """Writes rows the way the streaming export does, in MEASUREMENT_SCHEMA"""
+    buffer = io.BytesIO()
+    pq.write_table(get_table(rows), buffer)
+    s3.put_object(Bucket=None, Key=key, Body=buffer.getvalue())
+
+
+def test_migrate_month_mixes_timestamp_units(s3):
+    """Test legacy pandas files and streamed files are merged into one schema"""
+    put_pandas_file(s3, "historical/2025-04/04/measurements_11.parquet",
+                    [(1, 1, datetime(2025, 4, 4, 10, 0))])
+    put_streamed_file(s3, "historical/year=2025/month=04/day=04/measurements_12.parquet",
+                      [(2, 1, datetime(2025, 4, 4, 11, 0))])
+
+    assert migrate_month(s3, datetime(2025, 4, 1)) == 2
+
+    table = read_table(s3, "historical/year=2025/month=04/day=04/measurements_daily.parquet")
+    assert table.schema == MEASUREMENT_SCHEMA
+    assert table["measurement_time"].to_pylist() == [
+        datetime(2025, 4, 4, 10, 0), datetime(2025, 4, 4, 11, 0)]
+
+
+DAY = "historical/year=2025/month=04/day=04/"
+
+
+def test_compact_day_merges_hours_and_rewrites_manifest(s3):
+    """Test a day's hourly files become one daily file, listed alone in the manifest"""
+    put_streamed_file(s3, f"{DAY}measurements_10.parquet",
+                      [(1, 2, datetime(2025, 4, 4, 10, 0)), (2, 1, datetime(2025, 4, 4, 10, 0))])
+    put_streamed_file(s3, f"{DAY}measurements_11.parquet", [(3, 1, datetime(2025, 4, 4, 11, 0))])
+    s3.put_object(Bucket=None, Key=f"{DAY}_manifest.json", Body=b"{}")
+
+    assert compact_day(s3, datetime(2025, 4, 4)) == 2
+
+    daily_key = f"{DAY}measurements_daily.parquet"
+    assert sorted(s3.objects) == [f"{DAY}_manifest.json", daily_key]
+    table = read_table(s3, daily_key)
+    assert table["plant_id"].to_pylist() == [1, 1, 2]
+    assert read_manifest(s3, None, DAY) == [{
+        "key": daily_key, "rows": 3, "min_time": "2025-04-04T10:00:00",
+        "max_time": "2025-04-04T11:00:00", "plant_ids": [1, 2]}]
+
+
+def test_compact_day_rerun_after_failed_delete(s3):
+    """Test a rerun after the sources weren't deleted merges them again without duplicates"""
+    rows = [(1, 1, datetime(2025, 4, 4, 10, 0)), (2, 1, datetime(2025, 4, 4, 10, 1))]
+    put_streamed_file(s3, f"{DAY}measurements_10.parquet", rows)
+    compact_day(s3, datetime(2025, 4, 4))
+    put_streamed_file(s3, f"{DAY}measurements_10.parquet", rows)
+
+    assert compact_day(s3, datetime(2025, 4, 4)) == 1
+    assert read_table(s3, f"{DAY}measurements_daily.parquet").num_rows == 2
+
+
+def test_compact_day_already_compacted(s3):
+    """Test a day holding only its daily file is left alone"""
+    put_streamed_file(s3, f"{DAY}measurements_daily.parquet", [(1, 1, datetime(2025, 4, 4))])
+    before = dict(s3.objects)
+
+    assert compact_day(s3, datetime(2025, 4, 4)) == 0
+    assert s3.objects == before
+
+
+def test_compact_month_removes_day_manifests(s3):
+    """Test a month's daily files merge into its monthly file and the day manifests go"""
+    for day in (4, 5):
+        put_streamed_file(s3, f"historical/year=2025/month=04/day=0{day}/measurements_10.parquet",
+                          [(day, 1, datetime(2025, 4, day, 10, 0))])
+        compact_day(s3, datetime(2025, 4, day))
+
+    assert compact_month(s3, datetime(2025, 4, 1)) == 2
+
+    month = "historical/year=2025/month=04/"
+    assert sorted(s3.objects) == [f"{month}_manifest.json",
+                                  f"{month}measurements_monthly.parquet"]
+    assert read_manifest(s3, None, month)[0]["rows"] == 2
+
+
+def test_get_compaction_dates_includes_finished_month():
+    """Test the lookback covers complete days and the month that ended within it"""
+    days, months = get_compaction_dates(datetime(2025, 5, 4, 3), lookback_days=4,
+                                        compact_after_days=2)
+
+    assert days == [datetime(2025, 4, 29), datetime(2025, 4, 30),
+                    datetime(2025, 5, 1), datetime(2025, 5, 2)]
+    assert months == [datetime(2025, 4, 1)]
@@ -0,0 +1,61 @@
+# pylint: skip-file
+"""Tests for the archive manifests"""
+
+import json
+from datetime import datetime
+import pyarrow as pa
+from manifest import (get_file_entry, merge_file_entries, read_manifest, update_manifest,
+                      get_partition_prefix)
+
+PARTITION = "historical/year=2025/month=04/day=04/"
+KEY = f"{PARTITION}measurements_10.parquet"
+
+
+def get_entry(key, rows, min_hour, max_hour, plant_ids):
+    """Returns a manifest entry for a file covering hours min_hour to max_hour"""
+    return {"key": key, "rows": rows,
+            "min_time": datetime(2025, 4, 4, min_hour).isoformat(),
+            "max_time": datetime(2025, 4, 4, max_hour).isoformat(),
+            "plant_ids": plant_ids}
+
+
+def test_get_file_entry():
+    """Test an entry records the row count, time range and plants of a file"""
+    table = pa.table({"plant_id": [3, 1, 3],
+                      "measurement_time": [datetime(2025, 4, 4, 10, 5),
+                                           datetime(2025, 4, 4, 10, 0),
+                                           datetime(2025, 4, 4, 10, 59)]})
+
+    assert get_file_entry(KEY, table) == get_entry(KEY, 3, 10, 10, [1, 3]) | {
+        "max_time": "2025-04-04T10:59:00"}
+
+
+def test_merge_file_entries_combines_chunks():
+    """Test chunk entries combine into the entry for the whole file"""
+    first = get_entry(KEY, 10, 10, 11, [1, 2])
+    second = get_entry(KEY, 5, 9, 10, [2, 5])
+
+    assert merge_file_entries(None, first) == first
+    assert merge_file_entries(first, second) == get_entry(KEY, 15, 9, 11, [1, 2, 5])
+
+
+def test_get_partition_prefix():
+    """Test a key's partition is the prefix it's stored under"""
+    assert get_partition_prefix(KEY) == PARTITION
+
+
+def test_read_manifest_missing(s3):
+    """Test a partition without a manifest reads as None rather than empty"""
+    assert read_manifest(s3, None, PARTITION) is None
+
+
+def test_update_manifest_adds_and_replaces_entries(s3):
+    """Test updating a manifest keeps other files and replaces a rerun file's entry"""
+    other_key = f"{PARTITION}measurements_09.parquet"
+    update_manifest(s3, None, get_entry(KEY, 10, 10, 10, [1]))
+    update_manifest(s3, None, get_entry(other_key, 4, 9, 9, [2]))
+    update_manifest(s3, None, get_entry(KEY, 12, 10, 10, [1, 3]))
+
+    files = read_manifest(s3, None, PARTITION)
+    assert files == [get_entry(other_key, 4, 9, 9, [2]), get_entry(KEY, 12, 10, 10, [1, 3])]
+    assert json.loads(s3.objects[f"{PARTITION}_manifest.json"])["version"] == 1
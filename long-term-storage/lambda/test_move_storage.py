@@ -0,0 +1,142 @@
+# pylint: skip-file
+"""Tests for the move storage script"""
+
+import io
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from move_storage import (MultipartUpload, stream_old_data, generate_rollup,
+                          combine_rollups, ROLLUP_METRICS)
+
+KEY = "historical/year=2025/month=04/day=04/measurements_10.parquet"
+
+
+class FakeCursor:
+    """Stand-in for a dict cursor returning rows in fetchmany chunks"""
+
+    def __init__(self, rows, fail_after=None):
+        self.rows = rows
+        self.fail_after = fail_after
+        self.fetches = 0
+        self.closed = False
+
+    def execute(self, sql, params):
+        pass
+
+    def fetchmany(self, size):
+        if self.fail_after is not None and self.fetches == self.fail_after:
+            raise ConnectionError("connection lost")
+        chunk = self.rows[self.fetches * size:(self.fetches + 1) * size]
+        self.fetches += 1
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+def get_rows(count, plant_count=3, seed=0):
+    """Returns per-minute measurement rows, as the dict cursor does, cycling through plants"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 4, 4, 9, 0)
+    return [{"measurement_id": i, "plant_id": i % plant_count,
+             "measurement_time": start + timedelta(minutes=i),
+             "last_watered": start, "moisture": float(rng.normal(50, 10)),
+             "temperature": float(rng.normal(15, 3))}
+            for i in range(count)]
+
+
+@pytest.fixture
+def archive(s3):
+    """Patches the S3 client and database connection used by stream_old_data"""
+    with patch("move_storage.boto3.client", return_value=s3), \
+            patch("move_storage.connect_to_db") as connect:
+        yield connect.return_value
+
+
+def test_multipart_upload_splits_at_part_size(s3):
+    """Test parts are uploaded once the buffer reaches part_size, and the rest on complete"""
+    upload = MultipartUpload(s3, KEY, part_size=10)
+    for _ in range(7):
+        upload.write(b"abcd")
+    upload.complete()
+
+    parts = s3.uploads["upload-0"]["parts"]
+    assert [len(parts[number]) for number in sorted(parts)] == [12, 12, 4]
+    assert s3.objects[KEY] == b"abcd" * 7
+
+
+def test_multipart_upload_completes_when_empty(s3):
+    """Test an upload with no data still sends the single part S3 requires"""
+    upload = MultipartUpload(s3, KEY, part_size=10)
+    upload.complete()
+
+    assert s3.objects[KEY] == b""
+    assert upload.closed
+
+
+def test_stream_old_data_writes_chunks(s3, archive):
+    """Test rows are streamed as one row group per chunk, with their manifest entry"""
+    rows = get_rows(25)
+    archive.cursor.return_value = FakeCursor(rows)
+
+    rows_archived, hourly_rollup, entry = stream_old_data(datetime(2025, 4, 5), KEY,
+                                                          chunk_size=10)
+
+    parquet = pq.ParquetFile(io.BytesIO(s3.objects[KEY]))
+    assert rows_archived == 25
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read().to_pylist() == rows
+    assert entry == {"key": KEY, "rows": 25, "min_time": "2025-04-04T09:00:00",
+                     "max_time": "2025-04-04T09:24:00", "plant_ids": [0, 1, 2]}
+    assert hourly_rollup["count"].sum() == 25
+    assert archive.cursor.return_value.closed
+
+
+def test_stream_old_data_without_rows_uploads_nothing(s3, archive):
+    """Test no upload is started when there are no old rows"""
+    archive.cursor.return_value = FakeCursor([])
+
+    assert stream_old_data(datetime(2025, 4, 5), KEY)[0] == 0
+    assert not s3.uploads
+
+
+def test_stream_old_data_aborts_on_error(s3, archive):
+    """Test a failure mid-stream aborts the upload, leaving no partial object"""
+    cursor = FakeCursor(get_rows(25), fail_after=2)
+    archive.cursor.return_value = cursor
+
+    with pytest.raises(ConnectionError):
+        stream_old_data(datetime(2025, 4, 5), KEY, chunk_size=10)
+
+    assert s3.uploads["upload-0"]["status"] == "aborted"
+    assert KEY not in s3.objects
+    assert cursor.closed
+
+
+def test_combined_rollups_match_direct_aggregates():
+    """Test hourly rollups of separate chunks combine into the daily figures of all the rows"""
+    data = pd.DataFrame(get_rows(3000, plant_count=4, seed=1))
+    chunks = [data[:1000], data[1000:1001], data[1001:]]
+
+    hourly = combine_rollups(
+        pd.concat([generate_rollup(chunk, "h") for chunk in chunks], ignore_index=True), "h")
+    daily = combine_rollups(hourly, "D").set_index(["plant_id", "period_start"])
+
+    periods = data["measurement_time"].dt.floor("D").rename("period_start")
+    expected = data.groupby(["plant_id", periods])
+    assert (daily["count"] == expected.size()).all()
+    for metric in ROLLUP_METRICS:
+        for stat in ("min", "max", "mean", "std"):
+            np.testing.assert_allclose(daily[f"{metric}_{stat}"],
+                                       expected[metric].agg(stat), rtol=1e-9)
+
+
+def test_combined_rollup_of_one_reading_has_no_std():
+    """Test a period with a single reading keeps an undefined std rather than 0"""
+    rollup = combine_rollups(generate_rollup(pd.DataFrame(get_rows(1)), "h"), "D")
+
+    assert rollup["count"].tolist() == [1]
+    assert rollup["moisture_std"].isna().all()
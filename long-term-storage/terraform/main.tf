@@ -54,8 +54,28 @@ resource "aws_lambda_function" "long-term-storage-lambda" {
                 DB_PORT=var.DB_PORT,
                 DB_PASSWORD=var.DB_PASSWORD,
                 PRODUCTION_MODE=var.PRODUCTION_MODE,
-                BUCKET_NAME=var.BUCKET_NAME
+                BUCKET_NAME=var.BUCKET_NAME,
+                PARTITIONED_MEASUREMENTS=var.PARTITIONED_MEASUREMENTS,
+                STREAMING_EXPORT=var.STREAMING_EXPORT
 
     }
   }
-}
\ No newline at end of file
+}
+resource "aws_lambda_function" "long-term-compaction-lambda" {
+  function_name = "c16-louis-storage-compaction"
+  image_uri = data.aws_ecr_image.louis-storage-image.image_uri
+  role = aws_iam_role.louis-storage-lambda-iam.arn
+  package_type = "Image"
+  timeout = 900
+  memory_size = 2048
+  image_config {
+    command = ["compact_storage.handler"]
+  }
+  environment {
+    variables = {
+                BUCKET_NAME=var.BUCKET_NAME,
+                COMPACT_AFTER_DAYS=var.COMPACT_AFTER_DAYS,
+                ROW_GROUP_SIZE=var.ROW_GROUP_SIZE
+    }
+  }
+}
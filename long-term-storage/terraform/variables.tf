@@ -32,4 +32,27 @@ variable "PRODUCTION_MODE" {
 variable "BUCKET_NAME" {
   type = string
   description = "Bucket Name"
-}
\ No newline at end of file
+}
+
+variable "PARTITIONED_MEASUREMENTS" {
+  type = bool
+  description = "If set to 'TRUE' old hours are removed by truncating measurement partitions"
+  default = false
+}
+
+variable "STREAMING_EXPORT" {
+  type = bool
+  description = "If set to 'TRUE' old rows are streamed to S3 in chunks with a multipart upload"
+  default = true
+}
+variable "COMPACT_AFTER_DAYS" {
+  type = string
+  description = "Days after which hourly history files are compacted into a daily file"
+  default = "2"
+}
+
+variable "ROW_GROUP_SIZE" {
+  type = string
+  description = "Rows per parquet row group in compacted history files"
+  default = "131072"
+}
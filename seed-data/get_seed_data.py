@@ -1,45 +1,115 @@
 # pylint: disable=duplicate-code
-'''A script that scrapes the API for seed data'''
+'''A script that concurrently scrapes the API for seed data,
+checkpointing to disk so it can resume'''
+import os
 import csv
 import json
 import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 
 
 BASE_URL = "https://data-eng-plants-api.herokuapp.com/plants/"
 NUM_PLANTS = 51
+MAX_WORKERS = 32
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+CHECKPOINT_PATH = "seed_checkpoint.jsonl"
+SEED_TABLES = ("botanist", "origin", "plant_type")
 
 
-def make_get_request(plant_id: int) -> dict:
-    '''Makes a get request, attempting thrice before failing'''
-    url = f"{BASE_URL}{plant_id}"
+class TransientFetchError(Exception):
+    '''Raised when a plant couldn't be fetched this run, but may be on a rerun'''
+
 
-    retries = 3
+def make_get_request(plant_id: int, session: requests.Session = None) -> dict | None:
+    '''Makes a get request, attempting thrice with exponential backoff on 500s.
+    Returns None for a plant that doesn't exist, and raises TransientFetchError
+    for any other failure'''
+    url = f"{BASE_URL}{plant_id}"
+    session = session or requests.Session()
 
-    for attempt in range(retries):
-        response = requests.get(url, timeout=30)
+    for attempt in range(RETRIES):
+        try:
+            response = session.get(url, timeout=30)
+        except requests.RequestException as error:
+            raise TransientFetchError(
+                f"Request for plant ID {plant_id} failed: {error}") from error
 
         if response.status_code == 200:
             return json.loads(response.content)
-        if response.status_code == 500:
+        if response.status_code == 404:
+            print(f"No plant with ID {plant_id}")
+            return None
+        if response.status_code != 500:
+            raise TransientFetchError(
+                f"Failed to fetch data for plant ID {plant_id}: {response.status_code}")
+        if attempt < RETRIES - 1:
             print(
                 f"Status code 500 for plant ID {plant_id}, retrying... (Attempt {attempt + 1})")
-            time.sleep(2)
-        else:
-            print(
-                f"Failed to fetch data for plant ID {plant_id}: {response.status_code}")
-            return None
-
-    print(f"Giving up on plant ID {plant_id} after {retries} attempts.")
-    return None
-
-
-def get_seed_data() -> dict:
-    '''Sorts API get request information into a seed_data dictionary'''
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+
+    raise TransientFetchError(f"Giving up on plant ID {plant_id} after {RETRIES} attempts.")
+
+
+def load_checkpoint(path: str = CHECKPOINT_PATH) -> dict[int, dict]:
+    '''Loads the responses already fetched, keyed by plant id.
+    A partially written last line from a crash is ignored'''
+    responses = {}
+    if not os.path.exists(path):
+        return responses
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            responses[record["plant_id"]] = record["data"]
+    return responses
+
+
+def fetch_all_plants(plant_ids: range, checkpoint_path: str = CHECKPOINT_PATH,
+                     max_workers: int = MAX_WORKERS) -> dict[int, dict]:
+    '''Fetches every plant in plant_ids concurrently over one pooled session, skipping
+    ids already in the checkpoint. Responses and missing plants are appended to the
+    checkpoint, but transient failures aren't, so a rerun fetches them again'''
+    responses = load_checkpoint(checkpoint_path)
+    remaining = [plant_id for plant_id in plant_ids if plant_id not in responses]
+    print(f"{len(responses)} plants loaded from checkpoint, fetching {len(remaining)}...")
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        futures = {executor.submit(make_get_request, plant_id, session): plant_id
+                   for plant_id in remaining}
+        for future in as_completed(futures):
+            plant_id = futures[future]
+            try:
+                responses[plant_id] = future.result()
+            except TransientFetchError as error:
+                print(f"{error} It will be fetched again on the next run.")
+                continue
+            checkpoint.write(json.dumps(
+                {"plant_id": plant_id, "data": responses[plant_id]}) + "\n")
+            checkpoint.flush()
+
+    return responses
+
+
+def get_seed_data(plant_ids: range = range(0, NUM_PLANTS),
+                  checkpoint_path: str = CHECKPOINT_PATH) -> dict:
+    '''Sorts API get request information into a seed_data dictionary.
+    Plants are processed in id order so generated ids don't depend on fetch order'''
     seed_data = {"botanist": [], "origin": [],
-                 "plant_type": [], "plant_id": []}
-    for plant_id in range(0, NUM_PLANTS):
-        data = make_get_request(plant_id)
+                 "plant_type": [], "plant_id": [],
+                 "index": {table: {} for table in SEED_TABLES}, "seen_plants": set()}
+    responses = fetch_all_plants(plant_ids, checkpoint_path)
+    for plant_id in sorted(responses):
+        data = responses[plant_id]
         if data:
             (seed_data, botanist_data) = get_botanist(data, seed_data)
             (seed_data, origin_data) = get_origin(data, seed_data)
@@ -51,19 +121,38 @@ def get_seed_data() -> dict:
     return seed_data
 
 
+def get_record_key(record: dict) -> tuple:
+    '''Returns a hashable key for a record that ignores key order'''
+    return tuple(sorted(record.items()))
+
+
+def add_unique(seed_data: dict, table: str, record: dict) -> dict:
+    '''Appends record to the table if it hasn't been seen, using a hash lookup'''
+    key = get_record_key(record)
+    if key not in seed_data["index"][table]:
+        seed_data[table].append(record)
+        seed_data["index"][table][key] = len(seed_data[table])
+    return record
+
+
+def get_record_id(seed_data: dict, table: str, record: dict) -> int | None:
+    '''Returns the 1-based id assigned to a record, or None if there isn't one'''
+    if not record:
+        return None
+    return seed_data["index"][table].get(get_record_key(record))
+
+
 def get_plant_id(data, seed_data, botanist_data, origin_data, plant_type_data):
     '''Returns the values for plant_id to the seed_data dictionary'''
     plant_id = data.get("plant_id", "")
-    botanist_id = seed_data['botanist'].index(botanist_data)
-    origin_id = seed_data['origin'].index(origin_data)
-    plant_type_id = seed_data['plant_type'].index(plant_type_data)
 
     plant_id_dict = {'plant_id': plant_id,
-                     'botanist_id': botanist_id + 1,
-                     'origin_data': origin_id + 1,
-                     'plant_type_id': plant_type_id + 1}
+                     'botanist_id': get_record_id(seed_data, 'botanist', botanist_data),
+                     'origin_data': get_record_id(seed_data, 'origin', origin_data),
+                     'plant_type_id': get_record_id(seed_data, 'plant_type', plant_type_data)}
 
-    if plant_id is not None and plant_id not in seed_data['plant_id']:
+    if plant_id is not None and plant_id not in seed_data['seen_plants']:
+        seed_data['seen_plants'].add(plant_id)
         seed_data['plant_id'].append(plant_id_dict)
     return seed_data
 
@@ -71,25 +160,26 @@ def get_plant_id(data, seed_data, botanist_data, origin_data, plant_type_data):
 def get_botanist(data, seed_data):
     '''Returns the values for botanist to the seed_data dictionary'''
     botanist = data.get("botanist", "")
-    if botanist and botanist not in seed_data['botanist']:
-        seed_data['botanist'].append(botanist)
+    if botanist:
+        add_unique(seed_data, 'botanist', botanist)
     return seed_data, botanist
 
 
 def get_origin(data, seed_data):
     '''Returns the values for origin to the seed_data dictionary'''
     origin = data.get("origin_location", "")
+    origin_dict = None
     if origin:
         origin_dict = {"latitude": origin[0], "longitude": origin[1],
                        "locality": origin[2], "country_code": origin[3], "timezone": origin[4]}
-        if origin_dict not in seed_data['origin']:
-            seed_data['origin'].append(origin_dict)
+        add_unique(seed_data, 'origin', origin_dict)
     return seed_data, origin_dict
 
 
 def get_plant_type(data, seed_data):
     '''Returns the values for plant_type to the seed_data dictionary'''
     plant_name = data.get("name", "")
+    plant_name_dict = None
     if plant_name:
         plant_name_dict = {}
         scientific_name = data.get("scientific_name", "None")
@@ -97,8 +187,7 @@ def get_plant_type(data, seed_data):
             scientific_name = scientific_name[0]
         plant_name_dict['plant_name'] = plant_name
         plant_name_dict["scientific_name"] = scientific_name
-        if plant_name_dict not in seed_data['plant_type']:
-            seed_data['plant_type'].append(plant_name_dict)
+        add_unique(seed_data, 'plant_type', plant_name_dict)
     return seed_data, plant_name_dict
 
 
@@ -165,8 +254,15 @@ def save_plant_type_data_as_csv(seed_data):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the plants API for seed data")
+    parser.add_argument("--start", type=int, default=0, help="First plant id")
+    parser.add_argument("--end", type=int, default=NUM_PLANTS, help="Plant id to stop before")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                        help="File fetched responses are saved to and resumed from")
+    args = parser.parse_args()
+
     start = time.time()
-    complete_seed_data = get_seed_data()
+    complete_seed_data = get_seed_data(range(args.start, args.end), args.checkpoint)
     end = time.time()
     print(f"This calculation took {end - start} seconds")
     save_all_data_to_csv(complete_seed_data)
@@ -1,36 +1,16 @@
-"""File to read csvs and seed the database"""
+"""File to read csvs and seed the database in a single transaction"""
 import os
 import csv
 import pymssql
 from dotenv import load_dotenv
 
-BOTANIST_SQL = """
-        INSERT into botanist
-        (botanist_name, botanist_email, botanist_number)
-        VALUES
-        (%s, %s, %s);
-        """
-
-ORIGIN_SQL = """
-        INSERT into origin
-        (latitude, longitude, locality, country_code, timezone)
-        VALUES
-        (%s, %s, %s, %s, %s);
-        """
-
-PLANT_TYPE_SQL = """
-        INSERT into plant_type
-        (plant_name, scientific_name)
-        VALUES
-        (%s, %s);
-        """
-
-PLANT_SQL = """
-        INSERT into plant
-        (plant_id, botanist_id, location_id, plant_type_id)
-        VALUES
-        (%s, %s, %s, %s);
-        """
+# SQL Server allows at most 2100 parameters per statement
+MAX_PARAMETERS = 2000
+
+BOTANIST_COLUMNS = ("botanist_name", "botanist_email", "botanist_number")
+ORIGIN_COLUMNS = ("latitude", "longitude", "locality", "country_code", "timezone")
+PLANT_TYPE_COLUMNS = ("plant_name", "scientific_name")
+PLANT_COLUMNS = ("plant_id", "botanist_id", "location_id", "plant_type_id")
 
 
 def get_connection_to_db() -> "pymssql.connection":
@@ -51,18 +31,71 @@ def get_data_from_file(path: str):
         return [tuple(row) for row in csv_reader]
 
 
-def add_data_to_database(data, sql_command: str):
-    """Create connection, Pass data and SQL to upload function"""
-    db_conn = get_connection_to_db()
-    upload_many_rows(data, db_conn, sql_command)
-    db_conn.close()
+def get_batches(rows: list[tuple], column_count: int):
+    """Splits rows into batches that stay under the parameter limit"""
+    batch_size = max(1, MAX_PARAMETERS // column_count)
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def insert_with_generated_ids(cur, table: str, columns: tuple[str],
+                              id_column: str, rows: list[tuple]) -> dict[int, int]:
+    """Inserts rows into a table with an IDENTITY key, returning a map from each
+    row's 1-based position in the csv to the id the database generated for it.
+    MERGE is used because, unlike INSERT, its OUTPUT can return the source row number"""
+    column_list = ", ".join(columns)
+    placeholders = ", ".join(["%s"] * (len(columns) + 1))
+    generated_ids = {}
+
+    numbered_rows = [(row_number, *row) for row_number, row in enumerate(rows, 1)]
+    for batch in get_batches(numbered_rows, len(columns) + 1):
+        values = ",\n".join([f"({placeholders})"] * len(batch))
+        cur.execute(f"""
+            MERGE INTO {table}
+            USING (VALUES {values}) AS source (row_number, {column_list})
+            ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT ({column_list})
+                VALUES ({", ".join(f"source.{column}" for column in columns)})
+            OUTPUT source.row_number, INSERTED.{id_column};""",
+                    tuple(value for row in batch for value in row))
+        generated_ids.update(dict(cur.fetchall()))
 
+    return generated_ids
 
-def upload_many_rows(rows: list[tuple], conn: "pymssql.Connection", sql_command: str) -> None:
-    """Uploads a single measurement row to the database for the specified connection."""
+
+def insert_rows(cur, table: str, columns: tuple[str], rows: list[tuple]) -> None:
+    """Inserts rows as multi-row VALUES statements"""
+    placeholders = ", ".join(["%s"] * len(columns))
+    for batch in get_batches(rows, len(columns)):
+        values = ",\n".join([f"({placeholders})"] * len(batch))
+        cur.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values};",
+                    tuple(value for row in batch for value in row))
+
+
+def seed_database(conn: "pymssql.Connection", botanists: list[tuple], origins: list[tuple],
+                  plant_types: list[tuple], plants: list[tuple]) -> None:
+    """Seeds all four tables in one transaction, mapping the csv row numbers the
+    plant rows refer to onto the ids generated for them. Rolls back on any error"""
     cur = conn.cursor()
-    cur.executemany(sql_command, rows)
-    conn.commit()
+    try:
+        botanist_ids = insert_with_generated_ids(
+            cur, "botanist", BOTANIST_COLUMNS, "botanist_id", botanists)
+        origin_ids = insert_with_generated_ids(
+            cur, "origin", ORIGIN_COLUMNS, "location_id", origins)
+        plant_type_ids = insert_with_generated_ids(
+            cur, "plant_type", PLANT_TYPE_COLUMNS, "plant_type_id", plant_types)
+
+        plant_rows = [(plant_id, botanist_ids[int(botanist)], origin_ids[int(origin)],
+                       plant_type_ids[int(plant_type)])
+                      for plant_id, botanist, origin, plant_type in plants]
+        insert_rows(cur, "plant", PLANT_COLUMNS, plant_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
 
 
 if __name__ == "__main__":
@@ -71,7 +104,6 @@ if __name__ == "__main__":
     plant_type = get_data_from_file("plant_type.csv")
     plant_data = get_data_from_file("plant_id.csv")
 
-    add_data_to_database(botanist_data, BOTANIST_SQL)
-    add_data_to_database(origin_data, ORIGIN_SQL)
-    add_data_to_database(plant_type, PLANT_TYPE_SQL)
-    add_data_to_database(plant_data, PLANT_SQL)
+    db_conn = get_connection_to_db()
+    seed_database(db_conn, botanist_data, origin_data, plant_type, plant_data)
+    db_conn.close()
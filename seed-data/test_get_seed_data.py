@@ -0,0 +1,78 @@
+# pylint: skip-file
+"""Tests for the seed data script"""
+
+import json
+from unittest.mock import patch
+from get_seed_data import (TransientFetchError, load_checkpoint, fetch_all_plants,
+                           get_seed_data)
+
+
+def get_plant(plant_id, botanist="Ada", origin="London", name="Fern"):
+    """Returns an API response for a plant"""
+    return {"plant_id": plant_id,
+            "botanist": {"name": botanist, "email": f"{botanist}@x", "phone": "1"},
+            "origin_location": ["51.5", "-0.1", origin, "GB", "Europe/London"],
+            "name": name, "scientific_name": [f"{name}us"]}
+
+
+def write_checkpoint(path, records, partial_line=""):
+    """Writes checkpoint records, optionally followed by a line cut off mid-write"""
+    with open(path, "w", encoding="utf-8") as file:
+        for plant_id, data in records.items():
+            file.write(json.dumps({"plant_id": plant_id, "data": data}) + "\n")
+        file.write(partial_line)
+
+
+def test_load_checkpoint_ignores_partial_line(tmp_path):
+    """Test a line cut off by a crash is skipped and the complete ones are loaded"""
+    path = tmp_path / "checkpoint.jsonl"
+    write_checkpoint(path, {0: get_plant(0), 1: None}, '{"plant_id": 2, "da')
+
+    assert load_checkpoint(str(path)) == {0: get_plant(0), 1: None}
+
+
+def test_load_checkpoint_missing(tmp_path):
+    """Test there is nothing to resume without a checkpoint"""
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == {}
+
+
+@patch("get_seed_data.make_get_request")
+def test_fetch_all_plants_resumes_from_checkpoint(mock_request, tmp_path):
+    """Test plants in the checkpoint aren't fetched again, new responses and missing plants
+    are checkpointed and transient failures are left to be fetched on the next run"""
+    path = tmp_path / "checkpoint.jsonl"
+    write_checkpoint(path, {0: get_plant(0), 1: None})
+
+    def request(plant_id, session):
+        if plant_id == 3:
+            raise TransientFetchError("timed out.")
+        return get_plant(plant_id) if plant_id == 2 else None
+    mock_request.side_effect = request
+
+    responses = fetch_all_plants(range(5), str(path), max_workers=2)
+
+    assert sorted(call.args[0] for call in mock_request.call_args_list) == [2, 3, 4]
+    assert responses == {0: get_plant(0), 1: None, 2: get_plant(2), 4: None}
+    assert load_checkpoint(str(path)) == responses
+
+
+@patch("get_seed_data.fetch_all_plants")
+def test_get_seed_data_deduplicates_records(mock_fetch):
+    """Test shared botanists, origins and plant types are stored once and referenced by id"""
+    mock_fetch.return_value = {
+        2: get_plant(2, botanist="Bo", origin="Paris", name="Palm"),
+        0: get_plant(0),
+        1: get_plant(1, name="Palm"),
+        3: None
+    }
+
+    seed_data = get_seed_data(range(4))
+
+    assert [botanist["name"] for botanist in seed_data["botanist"]] == ["Ada", "Bo"]
+    assert [origin["locality"] for origin in seed_data["origin"]] == ["London", "Paris"]
+    assert [plant_type["plant_name"] for plant_type in seed_data["plant_type"]] == [
+        "Fern", "Palm"]
+    assert seed_data["plant_id"] == [
+        {"plant_id": 0, "botanist_id": 1, "origin_data": 1, "plant_type_id": 1},
+        {"plant_id": 1, "botanist_id": 1, "origin_data": 1, "plant_type_id": 2},
+        {"plant_id": 2, "botanist_id": 2, "origin_data": 2, "plant_type_id": 2}]
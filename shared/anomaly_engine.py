@@ -0,0 +1,34 @@
+# pylint: disable=duplicate-code
+"""Per-plant z-scores and anomaly counts, shared by the dashboard and the anomaly detector"""
+import pandas as pd
+
+METRICS = ('moisture', 'temperature')
+ZSCORE_THRESHOLD = 2.5
+# Sample standard deviation, matching the detector's running statistics (M2 / (n - 1))
+ZSCORE_DDOF = 1
+
+
+def add_zscores(measurements: pd.DataFrame, metrics: tuple[str] = METRICS) -> pd.DataFrame:
+    '''Returns the measurements with a {metric}_zscore column for each metric,
+    scored against the plant's own readings in one groupby pass'''
+    columns = list(metrics)
+    grouped = measurements.groupby('plant_id')[columns]
+    zscores = ((measurements[columns] - grouped.transform('mean'))
+               / grouped.transform('std', ddof=ZSCORE_DDOF))
+    return measurements.assign(**{f'{metric}_zscore': zscores[metric] for metric in metrics})
+
+
+def count_anomalies(scored: pd.DataFrame, threshold: float = ZSCORE_THRESHOLD,
+                    metrics: tuple[str] = METRICS) -> pd.DataFrame:
+    '''Returns a dataframe indexed by plant_id of how many of each plant's readings
+    have a |zscore| above the threshold, with one {metric}_anomalies column per metric'''
+    flags = scored[[f'{metric}_zscore' for metric in metrics]].abs() > threshold
+    flags.columns = [f'{metric}_anomalies' for metric in metrics]
+    return flags.groupby(scored['plant_id']).sum()
+
+
+def get_anomaly_summary(measurements: pd.DataFrame,
+                        threshold: float = ZSCORE_THRESHOLD) -> pd.DataFrame:
+    '''Returns the per-plant anomaly counts for every metric from one scoring pass.
+    Nothing is cached here, callers that repeat it cache the result themselves'''
+    return count_anomalies(add_zscores(measurements), threshold)
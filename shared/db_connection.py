@@ -0,0 +1,80 @@
+# pylint: disable=duplicate-code, no-member
+"""Module scope pymssql connection cache, reused across warm Lambda invocations.
+The DB_ settings are read from the environment, which each entry point loads itself"""
+import os
+import time
+import logging
+import pymssql
+
+_CONNECTIONS = {}
+CONNECT_METRICS = {
+    "connects": 0,
+    "reconnects": 0,
+    "reuses": 0,
+    "connect_seconds": 0.0,
+    "last_connect_seconds": 0.0
+}
+
+
+def connect(as_dict: bool = False) -> pymssql.Connection:
+    """Opens a new pymssql connection to the short-term DB, recording how long the login took"""
+    start = time.perf_counter()
+    conn = pymssql.connect(host=os.getenv("DB_HOST"),
+                           database=os.getenv("DB_NAME"),
+                           user=os.getenv("DB_USERNAME"),
+                           password=os.getenv("DB_PASSWORD"),
+                           port=os.getenv("DB_PORT"),
+                           as_dict=as_dict)
+    elapsed = time.perf_counter() - start
+
+    CONNECT_METRICS["connects"] += 1
+    CONNECT_METRICS["connect_seconds"] += elapsed
+    CONNECT_METRICS["last_connect_seconds"] = elapsed
+    logging.info("Opened DB connection in %.3fs", elapsed)
+    return conn
+
+
+def is_alive(conn: pymssql.Connection) -> bool:
+    """Checks a connection can still run a query"""
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1;")
+        cur.fetchall()
+        cur.close()
+        return True
+    except (pymssql.Error, AttributeError):
+        return False
+
+
+def get_connection(as_dict: bool = False) -> pymssql.Connection:
+    """Returns the cached connection if it is still alive, otherwise opens and caches a new one.
+    Callers should commit or roll back their work but not close the connection"""
+    conn = _CONNECTIONS.get(as_dict)
+    if conn is not None:
+        if is_alive(conn):
+            CONNECT_METRICS["reuses"] += 1
+            return conn
+        logging.warning("Cached DB connection is dead, reconnecting")
+        CONNECT_METRICS["reconnects"] += 1
+        close_connection(as_dict)
+
+    conn = connect(as_dict)
+    _CONNECTIONS[as_dict] = conn
+    return conn
+
+
+def close_connection(as_dict: bool | None = None) -> None:
+    """Closes and forgets the cached connection(s)"""
+    keys = list(_CONNECTIONS) if as_dict is None else [as_dict]
+    for key in keys:
+        conn = _CONNECTIONS.pop(key, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except pymssql.Error:
+                pass
+
+
+def get_connect_metrics() -> dict:
+    """Returns a snapshot of the connection counters and login timings"""
+    return dict(CONNECT_METRICS)
@@ -0,0 +1,59 @@
+# pylint: skip-file
+"""Tests for the shared anomaly engine"""
+
+import numpy as np
+import pandas as pd
+from anomaly_engine import add_zscores, count_anomalies, get_anomaly_summary
+
+
+def get_measurements():
+    """Returns readings for two plants, each with one moisture spike"""
+    moisture = [50.0] * 10 + [500.0]
+    return pd.DataFrame({
+        "plant_id": [1] * 11 + [2] * 11,
+        "moisture": moisture + [v / 10 for v in moisture],
+        "temperature": np.linspace(10, 20, 22)
+    })
+
+
+def test_add_zscores_scores_each_plant_against_itself():
+    """Test z-scores use each plant's own mean and sample standard deviation"""
+    measurements = get_measurements()
+
+    scored = add_zscores(measurements)
+
+    for plant_id, readings in measurements.groupby("plant_id"):
+        for metric in ("moisture", "temperature"):
+            expected = (readings[metric] - readings[metric].mean()) / readings[metric].std()
+            np.testing.assert_allclose(scored.loc[readings.index, f"{metric}_zscore"], expected,
+                                       atol=1e-12)
+    assert list(measurements.columns) == ["plant_id", "moisture", "temperature"]
+
+
+def test_add_zscores_single_reading_is_nan():
+    """Test a plant with one reading has no z-score rather than a division error"""
+    scored = add_zscores(pd.DataFrame({"plant_id": [1], "moisture": [1.0],
+                                       "temperature": [1.0]}))
+
+    assert scored["moisture_zscore"].isna().all()
+
+
+def test_count_anomalies_counts_beyond_threshold():
+    """Test each plant's readings beyond the threshold are counted per metric"""
+    scored = pd.DataFrame({"plant_id": [1, 1, 2, 2],
+                           "moisture_zscore": [3.0, -2.6, 2.5, 0.0],
+                           "temperature_zscore": [0.0, 0.0, -4.0, np.nan]})
+
+    counts = count_anomalies(scored)
+
+    assert counts.to_dict("index") == {
+        1: {"moisture_anomalies": 2, "temperature_anomalies": 0},
+        2: {"moisture_anomalies": 0, "temperature_anomalies": 1}}
+
+
+def test_get_anomaly_summary_flags_spikes():
+    """Test each plant's moisture spike is its only anomaly"""
+    summary = get_anomaly_summary(get_measurements())
+
+    assert summary["moisture_anomalies"].tolist() == [1, 1]
+    assert summary["temperature_anomalies"].tolist() == [0, 0]
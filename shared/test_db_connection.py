@@ -0,0 +1,67 @@
+# pylint: skip-file
+"""Tests for the cached db connection"""
+
+from unittest.mock import patch, MagicMock
+import pytest
+import pymssql
+import db_connection
+from db_connection import get_connection, close_connection, get_connect_metrics
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Fixture clearing the connection cache around each test"""
+    db_connection._CONNECTIONS.clear()
+    yield
+    db_connection._CONNECTIONS.clear()
+
+
+@patch("db_connection.pymssql.connect")
+def test_get_connection_reuses_live_connection(mock_connect):
+    """Test a live cached connection is returned without reconnecting"""
+    reuses = get_connect_metrics()["reuses"]
+
+    first = get_connection()
+    second = get_connection()
+
+    assert first is second
+    mock_connect.assert_called_once()
+    assert get_connect_metrics()["reuses"] == reuses + 1
+
+
+@patch("db_connection.pymssql.connect")
+def test_get_connection_reconnects_dead_connection(mock_connect):
+    """Test a dead cached connection is closed and replaced"""
+    dead_conn = MagicMock()
+    dead_conn.cursor.return_value.execute.side_effect = pymssql.OperationalError
+    live_conn = MagicMock()
+    mock_connect.side_effect = [dead_conn, live_conn]
+    reconnects = get_connect_metrics()["reconnects"]
+
+    get_connection()
+    conn = get_connection()
+
+    assert conn is live_conn
+    dead_conn.close.assert_called_once()
+    assert get_connect_metrics()["reconnects"] == reconnects + 1
+
+
+@patch("db_connection.pymssql.connect")
+def test_get_connection_caches_per_row_format(mock_connect):
+    """Test dict and tuple row connections are cached separately"""
+    mock_connect.side_effect = [MagicMock(), MagicMock()]
+
+    assert get_connection() is not get_connection(as_dict=True)
+    assert mock_connect.call_args.kwargs["as_dict"] is True
+
+
+@patch("db_connection.pymssql.connect")
+def test_close_connection(mock_connect):
+    """Test closing forgets the cached connection"""
+    mock_connect.side_effect = [MagicMock(), MagicMock()]
+    conn = get_connection()
+
+    close_connection()
+
+    conn.close.assert_called_once()
+    assert get_connection() is not conn
@@ -0,0 +1,17 @@
+--Migration: adds the alert state table used to deduplicate anomaly emails
+
+USE lmnh_plants;
+GO
+
+IF OBJECT_ID('alert_state') IS NULL
+CREATE TABLE alert_state (
+    plant_id TINYINT NOT NULL,
+    sensor_type VARCHAR(20) NOT NULL,
+    is_active BIT NOT NULL,
+    notified BIT NOT NULL,
+    last_sent DATETIME NULL,
+    updated_at DATETIME NOT NULL,
+    CONSTRAINT PK_alert_state PRIMARY KEY (plant_id, sensor_type),
+    CONSTRAINT FK_alert_plant_id FOREIGN KEY (plant_id) REFERENCES plant (plant_id)
+);
+GO
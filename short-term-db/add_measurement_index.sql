@@ -0,0 +1,12 @@
+--Migration: adds the covering measurement_time index to an existing measurement table
+
+USE lmnh_plants;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_measurement_time_plant' AND object_id = OBJECT_ID('measurement'))
+    CREATE NONCLUSTERED INDEX IX_measurement_time_plant
+    ON measurement (measurement_time, plant_id)
+    INCLUDE (moisture, temperature)
+    WITH (ONLINE = ON);
+GO
@@ -0,0 +1,20 @@
+--Migration: removes duplicate readings and adds the (plant_id, measurement_time) idempotency guard
+
+USE lmnh_plants;
+GO
+
+--Keep the first copy of every repeated reading
+WITH ranked AS (
+    SELECT ROW_NUMBER() OVER (PARTITION BY plant_id, measurement_time
+                              ORDER BY measurement_id) AS copy_number
+    FROM measurement
+)
+DELETE FROM ranked
+WHERE copy_number > 1;
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'UX_measurement_plant_time' AND object_id = OBJECT_ID('measurement'))
+    CREATE UNIQUE NONCLUSTERED INDEX UX_measurement_plant_time
+    ON measurement (plant_id, measurement_time)
+    WITH (IGNORE_DUP_KEY = ON, ONLINE = ON);
+GO
@@ -0,0 +1,17 @@
+--Migration: adds the running statistics table used by the incremental anomaly detector
+
+USE lmnh_plants;
+GO
+
+IF OBJECT_ID('plant_statistics') IS NULL
+CREATE TABLE plant_statistics (
+    plant_id TINYINT PRIMARY KEY NOT NULL,
+    sample_count INT NOT NULL,
+    moisture_mean FLOAT NOT NULL,
+    moisture_m2 FLOAT NOT NULL,
+    temperature_mean FLOAT NOT NULL,
+    temperature_m2 FLOAT NOT NULL,
+    last_measurement_time DATETIME NOT NULL,
+    CONSTRAINT FK_statistics_plant_id FOREIGN KEY (plant_id) REFERENCES plant (plant_id)
+);
+GO
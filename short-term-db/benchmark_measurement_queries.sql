@@ -0,0 +1,86 @@
+--Query-plan benchmark for the hot measurement queries against a seeded 10M row table.
+--Seeds measurement_benchmark (51 plants, one reading a minute, ~136 days), then runs each query
+--before and after adding the covering index. Compare the logical reads and CPU time reported
+--by STATISTICS IO / TIME, and the plans captured by STATISTICS XML.
+
+USE lmnh_plants;
+GO
+
+DROP TABLE IF EXISTS measurement_benchmark;
+
+CREATE TABLE measurement_benchmark (
+    measurement_id INT IDENTITY(1,1) NOT NULL,
+    plant_id TINYINT NOT NULL,
+    measurement_time DATETIME NOT NULL,
+    last_watered DATETIME NOT NULL,
+    moisture FLOAT NOT NULL,
+    temperature FLOAT NOT NULL,
+    CONSTRAINT PK_measurement_benchmark PRIMARY KEY (measurement_id)
+);
+GO
+
+WITH digits AS (
+    SELECT n FROM (VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9)) AS d (n)
+),
+tally AS (
+    SELECT TOP (10000000) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) - 1 AS n
+    FROM digits a, digits b, digits c, digits d, digits e, digits f, digits g
+)
+INSERT INTO measurement_benchmark WITH (TABLOCK)
+    (plant_id, measurement_time, last_watered, moisture, temperature)
+SELECT n % 51,
+       DATEADD(MINUTE, -(n / 51), GETDATE()),
+       DATEADD(HOUR, -(n % 24), DATEADD(MINUTE, -(n / 51), GETDATE())),
+       80 + (n % 200) / 10.0,
+       10 + (n % 97) / 10.0
+FROM tally;
+GO
+
+CREATE OR ALTER PROCEDURE run_measurement_benchmark
+AS
+BEGIN
+    DECLARE @now DATETIME = GETDATE();
+
+    --Anomaly detector: last 15 minutes
+    SELECT plant_id, moisture, temperature
+    FROM measurement_benchmark
+    WHERE measurement_time > DATEADD(MINUTE, -15, @now)
+    ORDER BY measurement_time DESC;
+
+    --Dashboard: last 24 hours
+    SELECT plant_id, measurement_time, moisture, temperature
+    FROM measurement_benchmark
+    WHERE measurement_time > DATEADD(HOUR, -24, @now);
+
+    --Dashboard: last 24 hours for one plant
+    SELECT measurement_time, moisture, temperature
+    FROM measurement_benchmark
+    WHERE measurement_time > DATEADD(HOUR, -24, @now) AND plant_id = 5;
+
+    --Archiver: rows older than the cutoff
+    SELECT COUNT(*)
+    FROM measurement_benchmark
+    WHERE measurement_time < DATEADD(HOUR, -24 * 135, @now);
+END
+GO
+
+SET STATISTICS IO, TIME, XML ON;
+PRINT 'Without IX_measurement_time_plant';
+EXEC run_measurement_benchmark;
+SET STATISTICS IO, TIME, XML OFF;
+GO
+
+CREATE NONCLUSTERED INDEX IX_measurement_benchmark_time_plant
+ON measurement_benchmark (measurement_time, plant_id)
+INCLUDE (moisture, temperature);
+GO
+
+SET STATISTICS IO, TIME, XML ON;
+PRINT 'With IX_measurement_time_plant';
+EXEC run_measurement_benchmark;
+SET STATISTICS IO, TIME, XML OFF;
+GO
+
+DROP PROCEDURE run_measurement_benchmark;
+DROP TABLE measurement_benchmark;
+GO
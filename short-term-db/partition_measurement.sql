@@ -0,0 +1,105 @@
+--Optional migration: partitions measurement by hour of measurement_time.
+--Old hours can then be removed by truncating whole partitions instead of a row-by-row DELETE.
+--Run after add_measurement_index.sql. Requires SQL Server 2016 SP1 or later.
+
+USE lmnh_plants;
+GO
+
+CREATE PARTITION FUNCTION pf_measurement_hour (DATETIME)
+AS RANGE RIGHT FOR VALUES ();
+GO
+
+CREATE PARTITION SCHEME ps_measurement_hour
+AS PARTITION pf_measurement_hour ALL TO ([PRIMARY]);
+GO
+
+--Adds hourly boundaries from @from_time up to @hours_ahead hours past the current hour
+CREATE OR ALTER PROCEDURE add_measurement_partitions
+    @from_time DATETIME = NULL,
+    @hours_ahead INT = 3
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @boundary DATETIME = DATEADD(HOUR, DATEDIFF(HOUR, 0, COALESCE(@from_time, GETDATE())), 0);
+    DECLARE @last_boundary DATETIME = DATEADD(HOUR, DATEDIFF(HOUR, 0, GETDATE()) + @hours_ahead, 0);
+
+    WHILE @boundary <= @last_boundary
+    BEGIN
+        IF NOT EXISTS (SELECT 1
+                       FROM sys.partition_range_values rv
+                       JOIN sys.partition_functions pf ON pf.function_id = rv.function_id
+                       WHERE pf.name = 'pf_measurement_hour' AND CAST(rv.value AS DATETIME) = @boundary)
+        BEGIN
+            ALTER PARTITION SCHEME ps_measurement_hour NEXT USED [PRIMARY];
+            ALTER PARTITION FUNCTION pf_measurement_hour() SPLIT RANGE (@boundary);
+        END
+        SET @boundary = DATEADD(HOUR, 1, @boundary);
+    END
+END
+GO
+
+--Truncates every partition holding rows older than @cutoff, merges their boundaries away
+--and adds boundaries for the coming hours. Returns the number of rows removed.
+CREATE OR ALTER PROCEDURE switch_out_old_measurements
+    @cutoff DATETIME
+AS
+BEGIN
+    SET NOCOUNT ON;
+    DECLARE @boundary DATETIME;
+    DECLARE @rows_deleted BIGINT = 0;
+
+    WHILE 1 = 1
+    BEGIN
+        SET @boundary = NULL;
+        SELECT TOP 1 @boundary = CAST(rv.value AS DATETIME)
+        FROM sys.partition_range_values rv
+        JOIN sys.partition_functions pf ON pf.function_id = rv.function_id
+        WHERE pf.name = 'pf_measurement_hour'
+        ORDER BY rv.boundary_id;
+
+        IF @boundary IS NULL OR @boundary > @cutoff
+            BREAK;
+
+        --With RANGE RIGHT, partition 1 holds every row below the lowest boundary
+        SELECT @rows_deleted += COALESCE(SUM(p.rows), 0)
+        FROM sys.partitions p
+        WHERE p.object_id = OBJECT_ID('measurement') AND p.index_id = 1 AND p.partition_number = 1;
+
+        TRUNCATE TABLE measurement WITH (PARTITIONS (1));
+        ALTER PARTITION FUNCTION pf_measurement_hour() MERGE RANGE (@boundary);
+    END
+
+    EXEC add_measurement_partitions;
+    SELECT @rows_deleted AS rows_deleted;
+END
+GO
+
+--Rebuild the table and its covering index on the partition scheme.
+--The clustered key must contain the partitioning column, so it becomes (measurement_time, measurement_id).
+DECLARE @first_measurement DATETIME = COALESCE((SELECT MIN(measurement_time) FROM measurement), GETDATE());
+EXEC add_measurement_partitions @from_time = @first_measurement;
+
+DECLARE @drop_primary_key NVARCHAR(200) = (
+    SELECT 'ALTER TABLE measurement DROP CONSTRAINT ' + QUOTENAME(name)
+    FROM sys.key_constraints
+    WHERE parent_object_id = OBJECT_ID('measurement') AND type = 'PK');
+EXEC sp_executesql @drop_primary_key;
+
+ALTER TABLE measurement
+ADD CONSTRAINT PK_measurement PRIMARY KEY CLUSTERED (measurement_time, measurement_id)
+ON ps_measurement_hour (measurement_time);
+
+CREATE NONCLUSTERED INDEX IX_measurement_time_plant
+ON measurement (measurement_time, plant_id)
+INCLUDE (moisture, temperature)
+WITH (DROP_EXISTING = ON)
+ON ps_measurement_hour (measurement_time);
+
+--Partition truncation needs every index aligned, including the idempotency guard
+IF EXISTS (SELECT 1 FROM sys.indexes
+           WHERE name = 'UX_measurement_plant_time' AND object_id = OBJECT_ID('measurement'))
+    CREATE UNIQUE NONCLUSTERED INDEX UX_measurement_plant_time
+    ON measurement (plant_id, measurement_time)
+    WITH (IGNORE_DUP_KEY = ON, DROP_EXISTING = ON)
+    ON ps_measurement_hour (measurement_time);
+GO
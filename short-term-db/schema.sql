@@ -3,7 +3,7 @@
 USE lmnh_plants;
 GO
 
-DROP TABLE IF EXISTS measurement, plant, plant_type, botanist, origin;
+DROP TABLE IF EXISTS alert_state, plant_statistics, measurement, plant, plant_type, botanist, origin;
 
 
 CREATE TABLE plant_type (
@@ -38,13 +38,48 @@ CREATE TABLE plant (
     CONSTRAINT FK_location_id FOREIGN KEY (location_id) REFERENCES origin (location_id),
 );
 
+--Running per-plant statistics and watermark kept by the anomaly detector
+CREATE TABLE plant_statistics (
+    plant_id TINYINT PRIMARY KEY NOT NULL,
+    sample_count INT NOT NULL,
+    moisture_mean FLOAT NOT NULL,
+    moisture_m2 FLOAT NOT NULL,
+    temperature_mean FLOAT NOT NULL,
+    temperature_m2 FLOAT NOT NULL,
+    last_measurement_time DATETIME NOT NULL,
+    CONSTRAINT FK_statistics_plant_id FOREIGN KEY (plant_id) REFERENCES plant (plant_id)
+);
+
+--Open sensor alerts, so botanists are only emailed when an alert opens or clears
+CREATE TABLE alert_state (
+    plant_id TINYINT NOT NULL,
+    sensor_type VARCHAR(20) NOT NULL,
+    is_active BIT NOT NULL,
+    notified BIT NOT NULL,
+    last_sent DATETIME NULL,
+    updated_at DATETIME NOT NULL,
+    CONSTRAINT PK_alert_state PRIMARY KEY (plant_id, sensor_type),
+    CONSTRAINT FK_alert_plant_id FOREIGN KEY (plant_id) REFERENCES plant (plant_id)
+);
+
 CREATE TABLE measurement (
-    measurement_id INT IDENTITY(1,1) PRIMARY KEY,
+    measurement_id INT IDENTITY(1,1) NOT NULL,
     plant_id TINYINT NOT NULL,
     measurement_time DATETIME NOT NULL,
     last_watered DATETIME NOT NULL,
     moisture FLOAT NOT NULL,
     temperature FLOAT NOT NULL,
+    CONSTRAINT PK_measurement PRIMARY KEY (measurement_id),
     CONSTRAINT FK_plant_id FOREIGN KEY (plant_id) REFERENCES plant (plant_id)
 );
+
+--Covers the anomaly detector, archiver and dashboard queries, which all filter on measurement_time
+CREATE NONCLUSTERED INDEX IX_measurement_time_plant
+ON measurement (measurement_time, plant_id)
+INCLUDE (moisture, temperature);
+
+--Idempotency guard: a repeated reading for a plant is discarded with a warning instead of failing its batch
+CREATE UNIQUE NONCLUSTERED INDEX UX_measurement_plant_time
+ON measurement (plant_id, measurement_time)
+WITH (IGNORE_DUP_KEY = ON);
 GO
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""Benchmarks extract, transform and load end to end against the local sensor API simulator"""
+import argparse
+import logging
+import resource
+import sqlite3
+import time
+from datetime import datetime
+import numpy as np
+from extract import get_plant_data_async_batch, MAX_CONCURRENCY
+from transform import read_batch, clean_batch
+from load import upload_rows_in_batches, BATCH_SIZE
+from watermark import get_watermarks, filter_new_measurements, update_watermarks, clear_watermarks
+from metrics import span, get_metrics, reset_metrics
+from sensor_api_simulator import SensorApiSimulator, SimulatorConfig
+
+MEASUREMENT_TABLE_SQL = """
+    CREATE TABLE measurement (
+        measurement_id INTEGER PRIMARY KEY,
+        plant_id INTEGER NOT NULL,
+        measurement_time TEXT NOT NULL,
+        last_watered TEXT NOT NULL,
+        moisture REAL NOT NULL,
+        temperature REAL NOT NULL,
+        UNIQUE (plant_id, measurement_time)
+    );
+    """
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+class LocalCursor:
+    """Translates pymssql's %s placeholders for a sqlite cursor"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self.cursor = cursor
+
+    def execute(self, sql: str, params: tuple = ()):
+        """Executes a pymssql-style statement"""
+        return self.cursor.execute(sql.replace("%s", "?"), params)
+
+    def fetchall(self) -> list[tuple]:
+        """Returns every remaining row"""
+        return self.cursor.fetchall()
+
+    def close(self) -> None:
+        """Closes the cursor"""
+        self.cursor.close()
+
+
+class LocalConnection:
+    """In-memory sqlite stand-in for the short-term database connection"""
+
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(MEASUREMENT_TABLE_SQL)
+
+    def cursor(self) -> LocalCursor:
+        """Returns a new cursor"""
+        return LocalCursor(self.connection.cursor())
+
+    def commit(self) -> None:
+        """Commits the open transaction"""
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        """Rolls back the open transaction"""
+        self.connection.rollback()
+
+
+def run_pipeline(conn: LocalConnection, plant_ids: range, base_url: str,
+                 concurrency: int) -> tuple[int, int]:
+    """Runs one extract, transform and load pass. Returns the plants fetched and rows inserted"""
+    with span("extract"):
+        plant_data = get_plant_data_async_batch(plant_ids, concurrency, base_url)
+    with span("transform"):
+        batch = clean_batch(read_batch(plant_data))
+    with span("watermark"):
+        new_batch = filter_new_measurements(batch, get_watermarks(conn))
+    if new_batch:
+        with span("load"):
+            upload_rows_in_batches(new_batch.to_rows(), conn, BATCH_SIZE)
+        update_watermarks(new_batch)
+    return len(plant_data), len(new_batch)
+
+
+def get_peak_rss_mb() -> float:
+    """Returns the process's peak resident set size in MB (ru_maxrss is in KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark(config: SimulatorConfig, runs: int, concurrency: int) -> dict:
+    """Runs the pipeline runs times against a fresh simulator and database.
+    Stage timings are the totals across every run"""
+    clear_watermarks()
+    reset_metrics()
+    conn = LocalConnection()
+    run_latencies = []
+    plants_fetched = rows_inserted = 0
+
+    with SensorApiSimulator(config) as simulator:
+        start = time.perf_counter()
+        for _ in range(runs):
+            run_start = time.perf_counter()
+            fetched, inserted = run_pipeline(
+                conn, range(config.plant_count), simulator.url, concurrency)
+            run_latencies.append(time.perf_counter() - run_start)
+            plants_fetched += fetched
+            rows_inserted += inserted
+        elapsed = time.perf_counter() - start
+        request_latencies = list(simulator.latencies)
+
+    return {
+        "runs": runs,
+        "plants_fetched": plants_fetched,
+        "rows_inserted": rows_inserted,
+        "plants_per_second": plants_fetched / elapsed,
+        "run_p50_ms": np.percentile(run_latencies, 50) * 1000,
+        "run_p99_ms": np.percentile(run_latencies, 99) * 1000,
+        "request_p50_ms": np.percentile(request_latencies, 50) * 1000,
+        "request_p99_ms": np.percentile(request_latencies, 99) * 1000,
+        "peak_rss_mb": get_peak_rss_mb(),
+        **{f"{name}_ms": value for name, value in get_metrics()["timings"].items()},
+        **get_metrics()["counters"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline against a local API")
+    parser.add_argument("--plants", type=int, default=51)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    results = benchmark(SimulatorConfig(plant_count=args.plants, latency=args.latency,
+                                        jitter=args.jitter, error_rate=args.error_rate,
+                                        not_found_rate=args.not_found_rate, seed=args.seed),
+                        args.runs, args.concurrency)
+    for name, value in results.items():
+        print(f"{name:>18}: {value:,.2f}" if isinstance(value, float) else f"{name:>18}: {value}")
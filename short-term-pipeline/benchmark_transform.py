@@ -0,0 +1,54 @@
+"""Benchmarks the transform step against the row-wise implementation on synthetic data"""
+import time
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from transform import clean_data
+
+ROW_COUNT = 1_000_000
+
+
+def generate_raw_data(row_count: int = ROW_COUNT) -> pd.DataFrame:
+    """Generates raw rows shaped like the plant-measurements csv"""
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2025-01-01")
+    measurement_time = start + pd.to_timedelta(
+        rng.integers(0, 365 * 24 * 3600, row_count), unit="s")
+    last_watered = measurement_time - pd.to_timedelta(
+        rng.integers(0, 24 * 3600, row_count), unit="s")
+    return pd.DataFrame({
+        "plant_id": rng.integers(0, 51, row_count),
+        "temperature": rng.normal(12, 2, row_count),
+        "moisture": rng.normal(90, 5, row_count),
+        "last_watered": last_watered.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "measurement_time": measurement_time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+
+def clean_data_rowwise(data: pd.DataFrame) -> pd.DataFrame:
+    """The previous transform: inferred parsing and a per-row +1 hour shift"""
+    for column in ("measurement_time", "last_watered"):
+        data[column] = pd.to_datetime(data[column], errors="coerce")
+    data['temperature'] = data['temperature'].round(2)
+    data['moisture'] = data['moisture'].round(2)
+    for column in ("measurement_time", "last_watered"):
+        data[column] = data[column].apply(lambda x: x + timedelta(hours=1))
+    return data
+
+
+def time_transform(name: str, transform, raw_data: pd.DataFrame) -> float:
+    """Times a single transform over a copy of the raw data"""
+    data = raw_data.copy()
+    start = time.perf_counter()
+    transform(data)
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {elapsed:.2f}s ({len(raw_data) / elapsed:,.0f} rows/s)")
+    return elapsed
+
+
+if __name__ == "__main__":
+    raw = generate_raw_data()
+    print(f"Transforming {len(raw):,} rows")
+    rowwise = time_transform("row-wise", clean_data_rowwise, raw)
+    vectorised = time_transform("vectorised", clean_data, raw)
+    print(f"Speed-up: {rowwise / vectorised:.1f}x")
@@ -1,13 +1,19 @@
 """Script to extract all plant measurements from API and save to csv file"""
+import asyncio
 import logging
 import time
 import csv
 import os
+import aiohttp
 import requests
 from lambda_multiprocessing import Pool
+from metrics import span, increment, emit_metrics
 
 BASE_URL = "https://data-eng-plants-api.herokuapp.com/plants/"
 PLANT_COUNT = 51
+MAX_CONCURRENCY = 20
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
 
 
 def get_plant_data(plant_id: int):
@@ -45,6 +51,76 @@ def get_plant_data_multiprocessing():
     return [plant for plant in plant_data if plant]
 
 
+async def get_plant_data_async(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                               plant_id: int, retries: int = RETRIES,
+                               base_url: str = BASE_URL) -> dict | None:
+    """Fetches a single plant over a shared session, backing off exponentially on a 500"""
+
+    plant_url = f"{base_url}{plant_id}"
+
+    for attempt in range(retries):
+        logging.info("Attempting to fetch data for plant %s", plant_id)
+        async with semaphore:
+            async with session.get(plant_url) as response:
+                increment("api_requests")
+                increment("api_bytes", response.content_length or 0)
+                if response.status == 200:
+                    logging.info("Plant %s info retrieved", plant_id)
+                    return await response.json()
+                status = response.status
+
+        if status != 500:
+            increment("api_failures")
+            logging.warning(
+                "Failed to fetch data for plant ID %s: %s", plant_id, status)
+            return None
+        if attempt == retries - 1:
+            break
+
+        increment("api_retries")
+        delay = BACKOFF_SECONDS * 2 ** attempt
+        logging.warning("Status code 500 for plant ID %s, retrying in %ss... (Attempt %s)",
+                        plant_id, delay, attempt + 1)
+        await asyncio.sleep(delay)
+
+    increment("api_failures")
+    logging.warning("Giving up on plant ID %s after %s attempts.",
+                    plant_id, retries)
+    return None
+
+
+async def get_all_plant_data_async(plant_ids=range(PLANT_COUNT),
+                                   concurrency: int = MAX_CONCURRENCY,
+                                   base_url: str = BASE_URL) -> list[dict]:
+    """Fetches every plant in plant_ids concurrently using one pooled HTTP session.
+    base_url can point at a stand-in API such as sensor_api_simulator"""
+    plant_ids = list(plant_ids)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        plant_data = await asyncio.gather(
+            *(get_plant_data_async(session, semaphore, plant_id, base_url=base_url)
+              for plant_id in plant_ids),
+            return_exceptions=True)
+
+    results = []
+    for plant_id, plant in zip(plant_ids, plant_data):
+        if isinstance(plant, Exception):
+            logging.error("Error fetching plant ID %s: %s", plant_id, plant)
+        elif plant:
+            results.append(plant)
+    return results
+
+
+def get_plant_data_async_batch(plant_ids=range(PLANT_COUNT),
+                               concurrency: int = MAX_CONCURRENCY,
+                               base_url: str = BASE_URL) -> list[dict]:
+    """Function to get all the plant measurements in a single asyncio event loop"""
+    return asyncio.run(get_all_plant_data_async(plant_ids, concurrency, base_url))
+
+
 def save_to_csv(data: list[dict], file_name: str):
     """Function to save the plant measurement data to a csv file"""
 
@@ -70,7 +146,7 @@ def save_to_csv(data: list[dict], file_name: str):
 
 
 if __name__ == "__main__":
-    start = time.time()
-    end = time.time()
-
-    print(f"Time to run: {end-start}")
+    with span("extract"):
+        all_plant_data = get_plant_data_async_batch()
+    print(f"Fetched {len(all_plant_data)} plants")
+    emit_metrics({"Stage": "extract"})
@@ -1,22 +1,25 @@
 # pylint: disable = no-member
 """Import data to database"""
-import os
 import csv
-from dotenv import load_dotenv
+import time
+import logging
 import pymssql
 import pandas as pd
+from dotenv import load_dotenv
+from db_connection import get_connection, close_connection
+from measurement_batch import MeasurementBatch
+from metrics import span, increment
 
 DATA_PATH = "./data/clean-plant-measurements.csv"
+MEASUREMENT_COLUMNS = "(plant_id, temperature, moisture, last_watered, measurement_time)"
+# SQL Server allows at most 2100 parameters per statement, so 5 columns caps a batch at 420 rows
+MAX_BATCH_SIZE = 420
+BATCH_SIZE = 400
 
 
 def get_connection_to_db() -> pymssql.Connection:
-    """Gets a pymssql connection to the short term MS SQL short-term DB"""
-    load_dotenv()
-    return pymssql.connect(host=os.getenv("DB_HOST"),
-                           database=os.getenv("DB_NAME"),
-                           user=os.getenv("DB_USERNAME"),
-                           password=os.getenv("DB_PASSWORD"),
-                           port=os.getenv("DB_PORT"))
+    """Gets the cached pymssql connection to the short term MS SQL short-term DB"""
+    return get_connection()
 
 
 def get_measurements_from_csv(path: str = DATA_PATH) -> list[dict]:
@@ -46,13 +49,71 @@ def upload_many_rows(rows: list[tuple], conn) -> None:
     conn.commit()
 
 
-def ingress_measurements_to_db(measurements: list[tuple]) -> None:
-    """Ingresses given measurement data into the short-term db"""
+def get_batch_insert_sql(row_count: int) -> str:
+    """Returns a multi-row VALUES insert statement for row_count measurements"""
+    values = ",\n".join(["(%s, %s, %s, %s, %s)"] * row_count)
+    return f"INSERT into measurement\n{MEASUREMENT_COLUMNS}\nVALUES\n{values};"
+
+
+def upload_rows_in_batches(rows: list[tuple], conn, batch_size: int = BATCH_SIZE,
+                           commit_every: int | None = None) -> float:
+    """Uploads rows as multi-row INSERT statements of batch_size rows, one round trip each.
+    Commits every commit_every batches, or once at the end if not given.
+    Returns the achieved rows per second"""
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    cur = conn.cursor()
+    start = time.perf_counter()
+
+    for batch_number, offset in enumerate(range(0, len(rows), batch_size), 1):
+        batch = rows[offset:offset + batch_size]
+        params = tuple(value for row in batch for value in row)
+        with span("db_insert"):
+            cur.execute(get_batch_insert_sql(len(batch)), params)
+        increment("db_round_trips")
+        if commit_every and batch_number % commit_every == 0:
+            with span("db_commit"):
+                conn.commit()
+    with span("db_commit"):
+        conn.commit()
+
+    elapsed = time.perf_counter() - start
+    rows_per_second = len(rows) / elapsed if elapsed else float(len(rows))
+    logging.info("Inserted %s rows in %.2fs (%.0f rows/s)",
+                 len(rows), elapsed, rows_per_second)
+    return rows_per_second
+
+
+def ingress_measurements_to_db(measurements: list[tuple], batch_size: int | None = None,
+                               commit_every: int | None = None) -> None:
+    """Ingresses given measurement data into the short-term db. Uses multi-row batched
+    inserts when a batch_size is given. The rows go in one transaction, unless commit_every
+    is given too, when every commit_every batches are committed as they go, so a failure
+    only rolls back the batches since the last commit"""
     conn = get_connection_to_db()
-    upload_many_rows(measurements, conn)
-    conn.close()
+    try:
+        if batch_size:
+            upload_rows_in_batches(measurements, conn, batch_size, commit_every)
+        else:
+            upload_many_rows(measurements, conn)
+    except Exception:
+        # The connection is cached across invocations, so a half-inserted transaction
+        # must not be left open for the next commit. If it can't be rolled back, drop it
+        try:
+            conn.rollback()
+        except pymssql.Error:
+            close_connection()
+        raise
+
+
+def ingress_measurement_batch(batch: MeasurementBatch, batch_size: int = BATCH_SIZE) -> int:
+    """Ingresses a cleaned measurement batch with multi-row batched inserts.
+    Returns the number of rows inserted"""
+    rows = batch.to_rows()
+    ingress_measurements_to_db(rows, batch_size)
+    return len(rows)
 
 
 if __name__ == "__main__":
+    load_dotenv()
     plant_measurements = get_measurements_from_csv()
     ingress_measurements_to_db(plant_measurements)
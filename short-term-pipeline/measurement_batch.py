@@ -0,0 +1,81 @@
+"""A compact, array-backed batch of plant measurements"""
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# int64 epoch nanoseconds use this value for a missing time, the same as NaT
+NAT = np.iinfo(np.int64).min
+COLUMN_DTYPES = {
+    "plant_id": np.uint16,
+    "temperature": np.float32,
+    "moisture": np.float32,
+    "last_watered": np.int64,
+    "measurement_time": np.int64
+}
+TIME_COLUMNS = ("last_watered", "measurement_time")
+
+
+@dataclass
+class MeasurementBatch:
+    """Measurements held as one typed numpy array per column, in the measurement
+    table's column order. Times are naive epoch nanoseconds"""
+    plant_id: np.ndarray
+    temperature: np.ndarray
+    moisture: np.ndarray
+    last_watered: np.ndarray
+    measurement_time: np.ndarray
+
+    def __post_init__(self):
+        for column, dtype in COLUMN_DTYPES.items():
+            setattr(self, column, np.asarray(getattr(self, column), dtype=dtype))
+        if len({len(getattr(self, column)) for column in COLUMN_DTYPES}) > 1:
+            raise ValueError("All measurement columns must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.plant_id)
+
+    @classmethod
+    def empty(cls, size: int = 0) -> "MeasurementBatch":
+        """Returns a batch of size unfilled rows"""
+        return cls(**{column: np.empty(size, dtype=dtype)
+                      for column, dtype in COLUMN_DTYPES.items()})
+
+    def select(self, rows: np.ndarray) -> "MeasurementBatch":
+        """Returns a new batch of the rows picked by a boolean mask or index array"""
+        return MeasurementBatch(**{column: getattr(self, column)[rows]
+                                   for column in COLUMN_DTYPES})
+
+    def get_times(self, column: str) -> np.ndarray:
+        """Returns a time column as a datetime64 view of the same memory"""
+        return getattr(self, column).view("datetime64[ns]")
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns a DataFrame whose columns share memory with the batch"""
+        columns = {column: (self.get_times(column) if column in TIME_COLUMNS
+                            else getattr(self, column))
+                   for column in COLUMN_DTYPES}
+        return pd.DataFrame(columns, copy=False)
+
+    def to_arrow(self) -> pa.Table:
+        """Returns an arrow table. Numeric buffers are shared with the batch,
+        only a validity bitmap is built for times that are missing"""
+        arrays = [pa.array(self.get_times(column), from_pandas=True) if column in TIME_COLUMNS
+                  else pa.array(getattr(self, column))
+                  for column in COLUMN_DTYPES]
+        return pa.Table.from_arrays(arrays, names=list(COLUMN_DTYPES))
+
+    def to_parquet(self, where, **kwargs) -> None:
+        """Writes the batch as a parquet file to a path or file-like object"""
+        pq.write_table(self.to_arrow(), where, **kwargs)
+
+    def to_rows(self, decimals: int = 2) -> list[tuple]:
+        """Returns measurement tuples ready for insertion, in the measurement table's
+        column order. Readings are widened to float64 before rounding so float32
+        noise doesn't reach the database"""
+        return list(zip(self.plant_id.tolist(),
+                        self.temperature.astype(np.float64).round(decimals).tolist(),
+                        self.moisture.astype(np.float64).round(decimals).tolist(),
+                        self.get_times("last_watered").astype("datetime64[us]").tolist(),
+                        self.get_times("measurement_time").astype("datetime64[us]").tolist()))
@@ -0,0 +1,83 @@
+"""Lightweight timing spans and counters, emitted as CloudWatch embedded metric format (EMF) JSON"""
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "LMNHPlants/ShortTermPipeline")
+
+_METRICS = {"timings": {}, "counters": {}}
+_DISABLED_SPAN = nullcontext()
+
+
+@contextmanager
+def _timed_span(name: str):
+    """Adds the time spent inside the block to the named timing, in milliseconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _METRICS["timings"]
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def span(name: str):
+    """Returns a context manager timing its block as the named span.
+    When metrics are disabled this is a shared no-op, so hot paths pay almost nothing"""
+    if not METRICS_ENABLED:
+        return _DISABLED_SPAN
+    return _timed_span(name)
+
+
+def increment(name: str, value: int = 1) -> None:
+    """Adds value to the named counter"""
+    if METRICS_ENABLED:
+        counters = _METRICS["counters"]
+        counters[name] = counters.get(name, 0) + value
+
+
+def get_metrics() -> dict:
+    """Returns the timings and counters recorded since the last reset"""
+    return {"timings": dict(_METRICS["timings"]), "counters": dict(_METRICS["counters"])}
+
+
+def reset_metrics() -> None:
+    """Clears every recorded timing and counter"""
+    _METRICS["timings"].clear()
+    _METRICS["counters"].clear()
+
+
+def get_unit(name: str) -> str:
+    """Returns the CloudWatch unit for a counter from its name"""
+    return "Bytes" if name.endswith("_bytes") else "Count"
+
+
+def format_emf(metrics: dict, dimensions: dict[str, str]) -> dict:
+    """Returns the metrics as a CloudWatch embedded metric format document"""
+    definitions = ([{"Name": name, "Unit": "Milliseconds"} for name in metrics["timings"]]
+                   + [{"Name": name, "Unit": get_unit(name)} for name in metrics["counters"]])
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": definitions
+            }]
+        },
+        **{key: str(value) for key, value in dimensions.items()},
+        **{name: round(value, 3) for name, value in metrics["timings"].items()},
+        **metrics["counters"]
+    }
+
+
+def emit_metrics(dimensions: dict[str, str]) -> dict | None:
+    """Prints the recorded metrics as one EMF JSON line, which CloudWatch
+    turns into metrics from the lambda's logs, then resets them"""
+    if not METRICS_ENABLED:
+        return None
+    document = format_emf(get_metrics(), dimensions)
+    print(json.dumps(document))
+    reset_metrics()
+    return document
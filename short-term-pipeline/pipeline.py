@@ -1,9 +1,12 @@
 # pylint: disable= broad-exception-caught
 """Script to merge extract, transform and load scripts into a single pipeline"""
 import logging
-from extract import get_plant_data
-from transform import read_data, clean_data
-from load import get_measurements_from_df, ingress_measurements_to_db
+from extract import get_plant_data_async_batch
+from transform import read_batch, clean_batch
+from load import ingress_measurement_batch, BATCH_SIZE
+from db_connection import get_connect_metrics
+from metrics import span, increment, emit_metrics
+from watermark import get_watermarks, filter_new_measurements, update_watermarks
 from dotenv import load_dotenv
 
 logging.basicConfig(
@@ -11,45 +14,80 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
 )
 
+METRIC_DIMENSIONS = {"Pipeline": "short-term"}
+
+
+def get_plant_ids(event: dict) -> list[int]:
+    """Returns the plant ids requested by an event.
+    Accepts a single 'plant_id', a list of 'plant_ids' or a 'plant_range' of [start, stop)"""
+    if 'plant_ids' in event:
+        return [int(plant_id) for plant_id in event['plant_ids']]
+    if 'plant_range' in event:
+        start, stop = event['plant_range']
+        return list(range(int(start), int(stop)))
+    return [int(event.get('plant_id'))]
+
 
 def handler(event, context):
-    """Lambda Handler to add measurements to db"""
+    """Lambda Handler to add measurements for one or more plants to db"""
     logging.info('Event: %s', event)
     logging.info('Context: %s', context)
-    plant_id = event.get('plant_id')
     try:
-        plant_id = int(plant_id)
-    except ValueError:
+        plant_ids = get_plant_ids(event)
+    except (TypeError, ValueError):
         return {'status': 400}
 
     try:
         load_dotenv()
-        logging.info("Getting plant data from API")
-        plant_data = get_plant_data(plant_id)
+        logging.info("Getting data for %s plants from API", len(plant_ids))
+        increment("plants_requested", len(plant_ids))
+        with span("extract"):
+            plant_data = get_plant_data_async_batch(plant_ids)
+        increment("plants_fetched", len(plant_data))
         logging.info("Plant data extracted")
+        if not plant_data:
+            logging.info("No plant data returned... Exiting...")
+            return {'status': 404, 'reason': 'No plant data found'}
+
         logging.info("Cleaning plant data")
-        raw_data = read_data([plant_data])
-        logging.info("Created DataFrame")
-        cleaned_data = clean_data(raw_data)
+        with span("transform"):
+            batch = clean_batch(read_batch(plant_data))
         logging.info("Data cleaned")
+        with span("watermark"):
+            new_batch = filter_new_measurements(batch, get_watermarks())
+        rows_skipped = len(batch) - len(new_batch)
+        increment("rows_skipped", rows_skipped)
+        logging.info("Skipped %s readings already ingested", rows_skipped)
+        if not new_batch:
+            return {'status': 200, 'body': 'No new measurements', 'rows_inserted': 0,
+                    'rows_skipped': rows_skipped}
+
         logging.info("Inserting clean data to database")
-        plant_measurements = get_measurements_from_df(cleaned_data)
-        logging.info(plant_measurements)
-        ingress_measurements_to_db(plant_measurements)
-        logging.info("Data inserted successfully")
+        with span("load"):
+            rows_inserted = ingress_measurement_batch(new_batch, BATCH_SIZE)
+        update_watermarks(new_batch)
+        increment("rows_inserted", rows_inserted)
+        logging.info("%s rows inserted successfully", rows_inserted)
+        logging.info("DB connection metrics: %s", get_connect_metrics())
 
         return {
             'status': 200,
-            'body': 'Pipeline completed successfully!'
+            'body': 'Pipeline completed successfully!',
+            'rows_inserted': rows_inserted,
+            'rows_skipped': rows_skipped
         }
 
     except Exception as e:
+        increment("pipeline_failures")
         logging.error("Error: %s", e)
         return {
             'status': 500,
             'body': f"Pipeline failed with error: {str(e)}"
         }
 
+    finally:
+        emit_metrics(METRIC_DIMENSIONS)
+
 
 if __name__ == "__main__":
-    handler({'plant_id': 1}, None)
+    handler({'plant_range': [0, 51]}, None)
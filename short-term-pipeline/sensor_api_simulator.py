@@ -0,0 +1,160 @@
+"""Local stand-in for the plants API, serving synthetic plants for tests and benchmarks"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECORDING_FORMAT = "%Y-%m-%d %H:%M:%S"
+WATERED_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+PLANT_NAMES = [("Venus flytrap", None), ("Corpse flower", None),
+               ("Rafflesia arnoldii", None), ("Black bat flower", None),
+               ("Pitcher plant", ["Sarracenia catesbaei"]),
+               ("Wollemi pine", ["Wollemia nobilis"]),
+               ("Bird of paradise", ["Heliconia schiedeana 'Fire and Ice'"])]
+BOTANISTS = [{"email": "carl.linnaeus@lnhm.co.uk", "name": "Carl Linnaeus",
+              "phone": "(146)994-1635x35992"},
+             {"email": "gertrude.jekyll@lnhm.co.uk", "name": "Gertrude Jekyll",
+              "phone": "001-481-273-3691x127"},
+             {"email": "eliza.andrews@lnhm.co.uk", "name": "Eliza Andrews",
+              "phone": "(846)669-6651x75948"}]
+ORIGINS = [["-19.32556", "-41.25528", "Resplendor", "BR", "America/Sao_Paulo"],
+           ["33.95015", "-118.03917", "South Whittier", "US", "America/Los_Angeles"],
+           ["7.65649", "4.92235", "Efon-Alaaye", "NG", "Africa/Lagos"],
+           ["51.30001", "13.10984", "Oschatz", "DE", "Europe/Berlin"]]
+
+
+@dataclass
+class SimulatorConfig:
+    """How the simulated API behaves"""
+    plant_count: int = 51
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    not_found_rate: float = 0.0
+    reading_interval: timedelta = timedelta(minutes=1)
+    seed: int = 0
+
+
+class PlantRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /plants/<id> with the real API's payload shapes"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Responds to a plant request after the configured latency"""
+        start = time.perf_counter()
+        status, payload = self.server.get_response(self.path)
+        body = json.dumps(payload).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.latencies.append(time.perf_counter() - start)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin, redefined-outer-name
+        """Keeps request logging out of benchmark output"""
+
+
+class SensorApiSimulator(ThreadingHTTPServer):
+    """A threaded HTTP server standing in for the plants API.
+    Every request for a plant returns a new reading one reading_interval after the last"""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, config: SimulatorConfig | None = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), PlantRequestHandler)
+        self.config = config or SimulatorConfig()
+        self.latencies = []
+        self.random = random.Random(self.config.seed)
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self.reading_counts = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """Base url to pass to extract in place of BASE_URL"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/plants/"
+
+    def get_plant(self, plant_id: int) -> dict:
+        """Returns the next synthetic reading for a plant"""
+        with self.lock:
+            reading_number = self.reading_counts.get(plant_id, 0)
+            self.reading_counts[plant_id] = reading_number + 1
+            temperature = self.random.gauss(12, 2)
+            soil_moisture = self.random.gauss(90, 5)
+
+        recording_taken = self.started_at + reading_number * self.config.reading_interval
+        last_watered = recording_taken - timedelta(hours=plant_id % 24, minutes=plant_id)
+        name, scientific_name = PLANT_NAMES[plant_id % len(PLANT_NAMES)]
+        plant = {
+            "botanist": BOTANISTS[plant_id % len(BOTANISTS)],
+            "last_watered": last_watered.strftime(WATERED_FORMAT),
+            "name": name,
+            "origin_location": ORIGINS[plant_id % len(ORIGINS)],
+            "plant_id": plant_id,
+            "recording_taken": recording_taken.strftime(RECORDING_FORMAT),
+            "soil_moisture": soil_moisture,
+            "temperature": temperature
+        }
+        if scientific_name:
+            plant["scientific_name"] = scientific_name
+        return plant
+
+    def get_response(self, path: str) -> tuple[int, dict]:
+        """Returns the status and payload for a request path"""
+        config = self.config
+        with self.lock:
+            delay = max(0.0, config.latency + self.random.uniform(-config.jitter, config.jitter))
+            roll = self.random.random()
+        time.sleep(delay)
+
+        try:
+            plant_id = int(path.rstrip("/").rsplit("/", 1)[-1])
+        except ValueError:
+            return 404, {"error": "Not found"}
+        if roll < config.error_rate:
+            return 500, {"error": "Internal server error"}
+        is_missing = roll < config.error_rate + config.not_found_rate
+        if is_missing or not 0 <= plant_id < config.plant_count:
+            return 404, {"error": "plant not found", "plant_id": plant_id}
+        return 200, self.get_plant(plant_id)
+
+    def start(self) -> "SensorApiSimulator":
+        """Serves requests on a background thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Stops serving and closes the socket"""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a local stand-in for the plants API")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--plants", type=int, default=51)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    simulator = SensorApiSimulator(SimulatorConfig(
+        plant_count=args.plants, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, not_found_rate=args.not_found_rate), port=args.port)
+    print(f"Serving {args.plants} plants at {simulator.url}")
+    simulator.serve_forever()
@@ -0,0 +1,53 @@
+# pylint: skip-file
+"""Tests for the worker script"""
+
+import json
+from unittest.mock import patch
+import pytest
+from worker import get_plant_shards, get_plant_data_lambda
+
+
+def test_get_plant_shards_even():
+    """Test ids that divide evenly are split into equal shards"""
+    assert get_plant_shards(50, 5) == [(0, 10), (10, 20), (20, 30), (30, 40), (40, 50)]
+
+
+def test_get_plant_shards_uneven():
+    """Test the remainder is spread one id at a time over the first shards"""
+    shards = get_plant_shards(51, 4)
+
+    assert shards == [(0, 13), (13, 26), (26, 39), (39, 51)]
+    assert [stop - start for start, stop in shards] == [13, 13, 13, 12]
+
+
+@pytest.mark.parametrize("plant_count, shard_count", [(51, 1), (51, 4), (7, 3), (51, 50)])
+def test_get_plant_shards_cover_every_id_once(plant_count, shard_count):
+    """Test shards are contiguous and cover every id exactly once"""
+    shards = get_plant_shards(plant_count, shard_count)
+
+    assert [plant_id for start, stop in shards for plant_id in range(start, stop)] \
+        == list(range(plant_count))
+    sizes = [stop - start for start, stop in shards]
+    assert max(sizes) - min(sizes) <= 1
+
+
+@pytest.mark.parametrize("shard_count, expected", [(100, 5), (0, 1), (-2, 1)])
+def test_get_plant_shards_clamps_shard_count(shard_count, expected):
+    """Test there is at least one shard and never more shards than ids"""
+    assert len(get_plant_shards(5, shard_count)) == expected
+
+
+def test_get_plant_shards_no_plants():
+    """Test there are no shards, rather than one empty shard, when there are no plants"""
+    assert get_plant_shards(0, 4) == []
+
+
+@patch("worker.boto3.client")
+def test_get_plant_data_lambda_invokes_each_shard(mock_client):
+    """Test one pipeline lambda is invoked per shard with its plant_range"""
+    get_plant_data_lambda(51, 4)
+
+    calls = mock_client.return_value.invoke.call_args_list
+    assert [json.loads(c.kwargs["Payload"])["plant_range"] for c in calls] == [
+        [0, 13], [13, 26], [26, 39], [39, 51]]
+    assert all(c.kwargs["InvocationType"] == "Event" for c in calls)
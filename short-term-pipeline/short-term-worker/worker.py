@@ -1,6 +1,7 @@
-"""Lambda function to retrieve plant data from API for given ID"""
+"""Lambda function to shard the plant id range across pipeline invocations"""
 import logging
 import json
+import os
 import uuid
 import boto3
 
@@ -8,34 +9,54 @@ logger = logging.getLogger()
 logger.setLevel("INFO")
 
 PLANT_COUNT = 51
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+PIPELINE_ARN = 'arn:aws:lambda:eu-west-2:129033205317:function:c16-louis-measurements-etl'
 
 
-def get_plant_data_lambda():
-    """Function to get all the plant measurements using multiple lambdas"""
+def get_plant_shards(plant_count: int, shard_count: int) -> list[tuple[int, int]]:
+    """Splits range(plant_count) into at most shard_count contiguous [start, stop) ranges.
+    No plants gives no shards"""
+    if plant_count <= 0:
+        return []
+    shard_count = max(1, min(shard_count, plant_count))
+    shard_size, remainder = divmod(plant_count, shard_count)
+
+    shards = []
+    start = 0
+    for shard in range(shard_count):
+        stop = start + shard_size + (1 if shard < remainder else 0)
+        shards.append((start, stop))
+        start = stop
+    return shards
+
+
+def get_plant_data_lambda(plant_count: int = PLANT_COUNT, shard_count: int = SHARD_COUNT):
+    """Function to get all the plant measurements using one lambda per shard of plants"""
 
     lambda_client = boto3.client('lambda')
 
-    for plant_id in range(PLANT_COUNT):
+    for start, stop in get_plant_shards(plant_count, shard_count):
         payload = {
-            'plant_id': plant_id,
+            'plant_range': [start, stop],
             'task_id': str(uuid.uuid4())
         }
 
         lambda_client.invoke(
-            FunctionName='arn:aws:lambda:eu-west-2:129033205317:function:c16-louis-measurements-etl',
+            FunctionName=PIPELINE_ARN,
             InvocationType='Event',
             Payload=json.dumps(payload)
         )
-        logger.info("Created lambda %s for plant %s",
-                    payload['task_id'], payload['plant_id'])
+        logger.info("Created lambda %s for plants %s to %s",
+                    payload['task_id'], start, stop - 1)
 
 
 def handler(event, context):
     """Lambda handler for HTTP requests"""
     logger.info("Event: %s", event)
     logger.info("Context: %s", context)
-    # plant_id = event.get('plant_id')
-    get_plant_data_lambda()
+    event = event or {}
+    get_plant_data_lambda(int(event.get('plant_count', PLANT_COUNT)),
+                          int(event.get('shard_count', SHARD_COUNT)))
 
     return {'status': 200}
 
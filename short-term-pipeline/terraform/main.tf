@@ -46,7 +46,8 @@ resource "aws_lambda_function" "etl-measurements-lambda" {
                 DB_USERNAME=var.DB_USERNAME,
                 DB_HOST=var.DB_HOST,
                 DB_PORT=var.DB_PORT,
-                DB_PASSWORD=var.DB_PASSWORD
+                DB_PASSWORD=var.DB_PASSWORD,
+                METRICS_ENABLED=var.METRICS_ENABLED
     }
   }
 }
@@ -79,4 +80,9 @@ resource "aws_lambda_function" "api-worker-lambda" {
   image_uri = data.aws_ecr_image.louis-api-worker-image.image_uri
   role = aws_iam_role.louis-api-worker-lambda-iam.arn
   package_type = "Image"
+  environment {
+    variables = {
+                SHARD_COUNT=var.SHARD_COUNT
+    }
+  }
 }
\ No newline at end of file
@@ -27,4 +27,15 @@ variable "DB_PORT" {
 variable "existing_vpc_name" {
   type = string
   description = "VPC Name"
-}
\ No newline at end of file
+}
+
+variable "SHARD_COUNT" {
+  type = string
+  description = "Number of pipeline invocations the worker splits the plant range across"
+  default = "1"
+}
+variable "METRICS_ENABLED" {
+  type = string
+  description = "Whether the pipeline prints EMF timing and counter metrics to its logs"
+  default = "true"
+}
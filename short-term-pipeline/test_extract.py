@@ -1,10 +1,48 @@
 # pylint: skip-file
 """Tests for the extract script"""
 
+import asyncio
 import csv
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
-from extract import get_plant_data, save_to_csv
+from extract import (get_plant_data, save_to_csv, get_plant_data_async,
+                     get_all_plant_data_async)
+
+
+class FakeResponse:
+    """Minimal stand-in for an aiohttp response context manager"""
+
+    def __init__(self, status, payload=None):
+        self.status = status
+        self.payload = payload
+        self.content_length = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Minimal stand-in for an aiohttp session returning queued responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def get(self, url):
+        self.urls.append(url)
+        return self.responses.pop(0)
 
 
 @patch("extract.requests.get")
@@ -86,3 +124,67 @@ def test_save_to_csv_empty(tmp_path):
     save_to_csv([], str(fake_file))
 
     assert not fake_file.exists()
+
+
+@patch("extract.asyncio.sleep", new_callable=AsyncMock)
+def test_get_plant_data_async_success(mock_sleep):
+    """Test successful async API response"""
+    session = FakeSession([FakeResponse(200, {"plant_id": 1})])
+
+    result = asyncio.run(get_plant_data_async(
+        session, asyncio.Semaphore(1), 1))
+
+    assert result == {"plant_id": 1}
+    assert session.urls == [
+        "https://data-eng-plants-api.herokuapp.com/plants/1"]
+    mock_sleep.assert_not_called()
+
+
+@patch("extract.asyncio.sleep", new_callable=AsyncMock)
+def test_get_plant_data_async_500_backoff(mock_sleep):
+    """Test async retries back off exponentially and then succeed"""
+    session = FakeSession([FakeResponse(500), FakeResponse(500),
+                           FakeResponse(200, {"plant_id": 1})])
+
+    result = asyncio.run(get_plant_data_async(
+        session, asyncio.Semaphore(1), 1))
+
+    assert result == {"plant_id": 1}
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [0.5, 1.0]
+
+
+@patch("extract.asyncio.sleep", new_callable=AsyncMock)
+def test_get_plant_data_async_gives_up(mock_sleep):
+    """Test async fetch returns None after exhausting retries, without backing off after the last"""
+    session = FakeSession([FakeResponse(500)] * 3)
+
+    result = asyncio.run(get_plant_data_async(
+        session, asyncio.Semaphore(1), 1))
+
+    assert result is None
+    assert len(session.urls) == 3
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [0.5, 1.0]
+
+
+def test_get_plant_data_async_failure():
+    """Test async fetch returns None for a non-500 error"""
+    session = FakeSession([FakeResponse(404)])
+
+    result = asyncio.run(get_plant_data_async(
+        session, asyncio.Semaphore(1), 1))
+
+    assert result is None
+
+
+@patch("extract.aiohttp.ClientSession")
+def test_get_all_plant_data_async(mock_session):
+    """Test every plant is fetched over one session and failures are dropped"""
+    session = FakeSession([FakeResponse(200, {"plant_id": 0}),
+                           FakeResponse(404),
+                           FakeResponse(200, {"plant_id": 2})])
+    mock_session.return_value = session
+
+    result = asyncio.run(get_all_plant_data_async(range(3), concurrency=1))
+
+    mock_session.assert_called_once()
+    assert result == [{"plant_id": 0}, {"plant_id": 2}]
@@ -1,88 +1,141 @@
 # pylint: skip-file
-"""Tests for the extract script"""
+"""Tests for the load script"""
 
-import csv
+from unittest.mock import mock_open
 from unittest.mock import patch, MagicMock
 import pytest
-from extract import get_plant_data, save_to_csv
+import pymssql
+from load import (get_connection_to_db, upload_many_rows, ingress_measurements_to_db,
+                  get_measurements_from_csv as get_measurements, upload_rows_in_batches,
+                  ingress_measurement_batch)
+from measurement_batch import MeasurementBatch
 
 
-@patch("extract.requests.get")
-def test_get_plant_data_success(mock_get):
-    """Test successful API response"""
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {"plant_id": 1, "temperature": 25.5}
-    mock_get.return_value = mock_response
+@pytest.fixture
+def fake_data():
+    """Fixture providing sample data"""
+    return [
+        (1, 25.5, 40, "2024-03-01", "2024-03-02 12:30:00"),
+        (2, 22.0, 35, "2024-03-02", "2024-03-03 15:45:00")
+    ]
 
-    result = get_plant_data(1)
-    assert result == {"plant_id": 1, "temperature": 25.5}
-    mock_get.assert_called_with(
-        "https://data-eng-plants-api.herokuapp.com/plants/1", timeout=30)
 
+@patch("load.pymssql.connect")
+def test_get_connection_to_db(mock_connect):
+    """Test that database connection is established"""
+    mock_connect.return_value = MagicMock()
 
-@patch("extract.requests.get")
-def test_get_plant_data_500_retry(mock_get):
-    """Test retries when the API returns a 500 error"""
-    mock_response = MagicMock()
-    mock_response.status_code = 500
-    mock_get.side_effect = [mock_response, mock_response, mock_response]
+    conn = get_connection_to_db()
 
-    result = get_plant_data(1)
-    assert result is None
+    mock_connect.assert_called_once()
+    assert conn is not None
 
 
-@patch("extract.requests.get")
-def test_get_plant_data_failure(mock_get):
-    """Test failure when the API returns a non-500 error"""
-    mock_response = MagicMock()
-    mock_response.status_code = 404
-    mock_get.return_value = mock_response
+@patch("builtins.open", new_callable=mock_open,
+       read_data="plant_id,temperature,moisture,last_watered,measurement_time\n1,25.5,40,2024-03-01,2024-03-02 12:30:00\n2,22.0,35,2024-03-02,2024-03-03 15:45:00\n")
+def test_get_measurements(mock_file):
+    """Test that measurements are correctly read from CSV"""
+    measurements = get_measurements()
 
-    result = get_plant_data(1)
-    assert result is None
+    assert len(measurements) == 2
+    assert measurements[0] == (
+        "1", "25.5", "40", "2024-03-01", "2024-03-02 12:30:00")
 
 
-@pytest.fixture
-def sample_data():
-    """Fixture providing sample plant measurement data"""
-    return [
-        {"plant_id": 1, "temperature": 25.5, "soil_moisture": 40,
-            "last_watered": "2024-03-01", "recording_taken": "2024-03-02"},
-        {"plant_id": 2, "temperature": 22.0, "soil_moisture": 35,
-            "last_watered": "2024-03-02", "recording_taken": "2024-03-03"}
-    ]
+@patch("load.pymssql.Connection")
+def test_upload_many_rows(mock_conn, fake_data):
+    """Test that multiple rows are inserted into the database"""
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+
+    upload_many_rows(fake_data, mock_conn)
+
+    mock_cursor.executemany.assert_called_once()
+
+    executed_sql = mock_cursor.executemany.call_args[0][0].strip()
+    assert executed_sql.startswith("INSERT into measurement")
+
+
+@patch("load.get_connection_to_db")
+@patch("load.upload_many_rows")
+def test_ingress_measurements_to_db(mock_upload, mock_get_conn, fake_data):
+    """Test that measurements are uploaded to the database"""
+    mock_conn = MagicMock()
+    mock_get_conn.return_value = mock_conn
+
+    ingress_measurements_to_db(fake_data)
+
+    mock_upload.assert_called_once_with(fake_data, mock_conn)
+    mock_conn.close.assert_not_called()
+
+
+def test_upload_rows_in_batches(fake_data):
+    """Test rows are sent as multi-row inserts of the requested batch size"""
+    mock_conn = MagicMock()
+    mock_cursor = mock_conn.cursor.return_value
+
+    upload_rows_in_batches(fake_data * 3, mock_conn, batch_size=4, commit_every=1)
+
+    assert mock_cursor.execute.call_count == 2
+    first_sql, first_params = mock_cursor.execute.call_args_list[0].args
+    assert first_sql.startswith("INSERT into measurement")
+    assert first_sql.count("(%s, %s, %s, %s, %s)") == 4
+    assert len(first_params) == 20
+    assert len(mock_cursor.execute.call_args_list[1].args[1]) == 10
+    assert mock_conn.commit.call_count == 3
+
+
+@patch("load.get_connection_to_db")
+@patch("load.upload_rows_in_batches")
+def test_ingress_measurements_to_db_batched(mock_upload, mock_get_conn, fake_data):
+    """Test a batch size routes measurements through the batched uploader"""
+    ingress_measurements_to_db(fake_data, batch_size=100)
+
+    mock_upload.assert_called_once_with(
+        fake_data, mock_get_conn.return_value, 100, None)
+
 
+@patch("load.get_connection_to_db")
+@patch("load.upload_rows_in_batches")
+def test_ingress_measurements_to_db_commit_every(mock_upload, mock_get_conn, fake_data):
+    """Test the commit frequency is passed through to the batched uploader"""
+    ingress_measurements_to_db(fake_data, batch_size=100, commit_every=5)
 
-def test_save_to_csv(sample_data, tmp_path):
-    """Test saving plant data to CSV file with the correct folder structure"""
+    mock_upload.assert_called_once_with(
+        fake_data, mock_get_conn.return_value, 100, 5)
 
-    fake_folder = tmp_path / "data"
-    fake_folder.mkdir()
-    fake_file = fake_folder / "fake_data.csv"
 
-    save_to_csv(sample_data, str(fake_file))
+@patch("load.close_connection")
+@patch("load.get_connection_to_db")
+@patch("load.upload_rows_in_batches", side_effect=ValueError("bad row"))
+def test_ingress_measurements_to_db_rolls_back_any_error(mock_upload, mock_get_conn,
+                                                         mock_close, fake_data):
+    """Test that a non-database error mid-batch rolls back the cached connection"""
+    with pytest.raises(ValueError):
+        ingress_measurements_to_db(fake_data, batch_size=100)
 
-    assert fake_file.exists()
+    mock_get_conn.return_value.rollback.assert_called_once()
+    mock_close.assert_not_called()
 
-    with open(fake_file, newline='', encoding='utf-8') as f:
-        reader = list(csv.reader(f))
 
-    assert reader[0] == ["plant_id", "temperature", "moisture",
-                         "last_watered", "measurement_time"]
-    assert reader[1] == ["1", "25.5", "40",
-                         "2024-03-01", "2024-03-02"]
-    assert reader[2] == ["2", "22.0", "35",
-                         "2024-03-02", "2024-03-03"]
+@patch("load.close_connection")
+@patch("load.get_connection_to_db")
+@patch("load.upload_rows_in_batches", side_effect=ValueError("bad row"))
+def test_ingress_measurements_to_db_drops_connection_if_rollback_fails(
+        mock_upload, mock_get_conn, mock_close, fake_data):
+    """Test that the cached connection is discarded when it can't be rolled back"""
+    mock_get_conn.return_value.rollback.side_effect = pymssql.OperationalError()
 
+    with pytest.raises(ValueError):
+        ingress_measurements_to_db(fake_data, batch_size=100)
 
-def test_save_to_csv_empty(tmp_path):
-    """Test save_to_csv if there is no data to be saved"""
+    mock_close.assert_called_once_with()
 
-    fake_folder = tmp_path / "data"
-    fake_folder.mkdir()
-    fake_file = fake_folder / "fake_data.csv"
 
-    save_to_csv([], str(fake_file))
+@patch("load.ingress_measurements_to_db")
+def test_ingress_measurement_batch(mock_ingress):
+    """Test that a batch is ingressed as measurement tuples"""
+    batch = MeasurementBatch([1, 2], [12.35, 11.0], [90.13, 80.0], [0, 0], [1, 2])
 
-    assert not fake_file.exists()
+    assert ingress_measurement_batch(batch, 100) == 2
+    mock_ingress.assert_called_once_with(batch.to_rows(), 100)
@@ -0,0 +1,63 @@
+# pylint: skip-file
+"""Tests for the metrics script"""
+
+import json
+from unittest.mock import patch
+import pytest
+import metrics
+from metrics import span, increment, get_metrics, emit_metrics, reset_metrics
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    """Clears recorded metrics around each test"""
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+@patch("metrics.time.perf_counter", side_effect=[1.0, 1.25, 2.0, 2.5])
+def test_span_accumulates_milliseconds(mock_perf_counter):
+    """Test that repeated spans add to the same timing"""
+    with span("load"):
+        pass
+    with span("load"):
+        pass
+
+    assert get_metrics()["timings"] == {"load": 750.0}
+
+
+def test_increment_counters():
+    """Test that counters add up"""
+    increment("api_retries")
+    increment("api_retries")
+    increment("api_bytes", 512)
+
+    assert get_metrics()["counters"] == {"api_retries": 2, "api_bytes": 512}
+
+
+def test_emit_metrics_prints_emf(capsys):
+    """Test that metrics are printed as one EMF line and then reset"""
+    increment("rows_inserted", 51)
+    increment("api_bytes", 1024)
+
+    document = emit_metrics({"Pipeline": "short-term"})
+
+    assert json.loads(capsys.readouterr().out) == document
+    definition = document["_aws"]["CloudWatchMetrics"][0]
+    assert definition["Dimensions"] == [["Pipeline"]]
+    assert {"Name": "api_bytes", "Unit": "Bytes"} in definition["Metrics"]
+    assert document["Pipeline"] == "short-term"
+    assert document["rows_inserted"] == 51
+    assert get_metrics() == {"timings": {}, "counters": {}}
+
+
+@patch.object(metrics, "METRICS_ENABLED", False)
+def test_disabled_metrics_record_nothing(capsys):
+    """Test that disabled metrics are no-ops"""
+    with span("extract"):
+        increment("rows_inserted")
+
+    assert emit_metrics({"Pipeline": "short-term"}) is None
+    assert capsys.readouterr().out == ""
+    assert get_metrics() == {"timings": {}, "counters": {}}
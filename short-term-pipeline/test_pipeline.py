@@ -0,0 +1,98 @@
+# pylint: skip-file
+"""Tests for the pipeline script"""
+
+from unittest.mock import patch
+import numpy as np
+import pytest
+from pipeline import get_plant_ids, handler, METRIC_DIMENSIONS
+from metrics import get_metrics, reset_metrics
+
+API_READINGS = [
+    {"plant_id": 1, "temperature": 12.3456, "soil_moisture": 90.129,
+     "last_watered": "Thu, 03 Apr 2025 14:03:04 GMT", "recording_taken": "2025-04-04 10:00:01"},
+    {"plant_id": 2, "temperature": 11.0, "soil_moisture": 80.0,
+     "last_watered": "Sun, 12 Jan 2025 01:00:00 GMT", "recording_taken": "2025-04-04 10:00:00"}
+]
+# Plant 1's reading was already ingested on the last run (10:00:01 BST is 11:00:01 local)
+WATERMARKS = {1: int(np.datetime64("2025-04-04T11:00:01", "ns").astype(np.int64))}
+
+
+def test_get_plant_ids_range():
+    """Test a plant_range event gives the ids from start up to stop"""
+    assert get_plant_ids({'plant_range': [3, 7]}) == [3, 4, 5, 6]
+
+
+def test_get_plant_ids_list():
+    """Test a plant_ids event gives the listed ids as ints"""
+    assert get_plant_ids({'plant_ids': [5, "8", 2]}) == [5, 8, 2]
+
+
+def test_get_plant_ids_single():
+    """Test a plant_id event gives that one id"""
+    assert get_plant_ids({'plant_id': "12"}) == [12]
+
+
+@pytest.mark.parametrize("event", [
+    {},
+    {'plant_id': "not an id"},
+    {'plant_range': [1]},
+    {'plant_range': ["a", 4]},
+    {'plant_ids': 5},
+])
+def test_get_plant_ids_invalid(event):
+    """Test events without usable plant ids raise"""
+    with pytest.raises((TypeError, ValueError)):
+        get_plant_ids(event)
+
+
+@pytest.mark.parametrize("event", [None, {}, {'plant_range': [1, 2, 3]}])
+@patch("pipeline.get_plant_data_async_batch")
+def test_handler_invalid_event(mock_extract, event):
+    """Test the handler rejects an invalid event without calling the API"""
+    assert handler(event, None) == {'status': 400}
+    mock_extract.assert_not_called()
+
+
+@pytest.fixture
+def pipeline_io():
+    """Patches the handler's I/O, capturing the metrics as they are emitted"""
+    reset_metrics()
+    emitted = []
+    with patch("pipeline.load_dotenv"), \
+            patch("pipeline.get_plant_data_async_batch", return_value=API_READINGS) as extract, \
+            patch("pipeline.get_watermarks", return_value=WATERMARKS), \
+            patch("pipeline.ingress_measurement_batch",
+                  side_effect=lambda batch, batch_size: len(batch)) as ingress, \
+            patch("pipeline.update_watermarks") as update, \
+            patch("pipeline.emit_metrics",
+                  side_effect=lambda dimensions: emitted.append((dimensions, get_metrics()))):
+        yield {"extract": extract, "ingress": ingress, "update": update, "emitted": emitted}
+    reset_metrics()
+
+
+def test_handler_inserts_only_new_measurements(pipeline_io):
+    """Test a run extracts, cleans, drops readings behind the watermark, inserts the rest,
+    advances the watermarks past them and emits its metrics"""
+    result = handler({'plant_ids': [1, 2]}, None)
+
+    assert result == {'status': 200, 'body': 'Pipeline completed successfully!',
+                      'rows_inserted': 1, 'rows_skipped': 1}
+    pipeline_io["extract"].assert_called_once_with([1, 2])
+    inserted = pipeline_io["ingress"].call_args.args[0]
+    assert inserted.plant_id.tolist() == [2]
+    pipeline_io["update"].assert_called_once_with(inserted)
+
+    dimensions, metrics = pipeline_io["emitted"][0]
+    assert dimensions == METRIC_DIMENSIONS
+    assert metrics["counters"] == {"plants_requested": 2, "plants_fetched": 2,
+                                   "rows_skipped": 1, "rows_inserted": 1}
+    assert {"extract", "transform", "watermark", "load"} <= set(metrics["timings"])
+
+
+def test_handler_emits_metrics_on_failure(pipeline_io):
+    """Test a failed insert leaves the watermarks alone and still emits metrics"""
+    pipeline_io["ingress"].side_effect = RuntimeError("db down")
+
+    assert handler({'plant_ids': [1, 2]}, None)['status'] == 500
+    pipeline_io["update"].assert_not_called()
+    assert pipeline_io["emitted"][0][1]["counters"]["pipeline_failures"] == 1
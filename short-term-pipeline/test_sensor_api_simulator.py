@@ -0,0 +1,63 @@
+# pylint: skip-file
+"""Tests for the sensor API simulator and pipeline benchmark"""
+
+import requests
+import pytest
+from extract import get_plant_data_async_batch
+from sensor_api_simulator import SensorApiSimulator, SimulatorConfig
+from benchmark_pipeline import benchmark
+
+
+@pytest.fixture
+def fast_config():
+    """Fixture providing a simulator config with no latency"""
+    return SimulatorConfig(plant_count=5, latency=0, jitter=0)
+
+
+def test_simulator_payload_shape(fast_config):
+    """Test that a plant response has the real API's fields and formats"""
+    with SensorApiSimulator(fast_config) as simulator:
+        response = requests.get(f"{simulator.url}3", timeout=5)
+
+    plant = response.json()
+    assert response.status_code == 200
+    assert plant["plant_id"] == 3
+    assert set(plant) >= {"botanist", "last_watered", "name", "origin_location",
+                          "recording_taken", "soil_moisture", "temperature"}
+    assert plant["last_watered"].endswith(" GMT")
+    assert len(plant["origin_location"]) == 5
+
+
+def test_simulator_readings_advance(fast_config):
+    """Test that each request returns a newer reading"""
+    with SensorApiSimulator(fast_config) as simulator:
+        first = requests.get(f"{simulator.url}1", timeout=5).json()
+        second = requests.get(f"{simulator.url}1", timeout=5).json()
+
+    assert second["recording_taken"] > first["recording_taken"]
+
+
+def test_simulator_errors():
+    """Test that unknown plants return 404 and the error rate returns 500"""
+    with SensorApiSimulator(SimulatorConfig(plant_count=2, latency=0, jitter=0)) as simulator:
+        assert requests.get(f"{simulator.url}7", timeout=5).status_code == 404
+    with SensorApiSimulator(SimulatorConfig(latency=0, jitter=0, error_rate=1)) as simulator:
+        assert requests.get(f"{simulator.url}1", timeout=5).status_code == 500
+
+
+def test_extract_against_simulator(fast_config):
+    """Test that the async extract fetches every plant from the simulator"""
+    with SensorApiSimulator(fast_config) as simulator:
+        plants = get_plant_data_async_batch(range(7), 3, simulator.url)
+
+    assert sorted(plant["plant_id"] for plant in plants) == [0, 1, 2, 3, 4]
+
+
+def test_benchmark_inserts_every_reading(fast_config):
+    """Test that the end to end benchmark loads one row per plant per run"""
+    results = benchmark(fast_config, runs=3, concurrency=5)
+
+    assert results["plants_fetched"] == 15
+    assert results["rows_inserted"] == 15
+    assert results["plants_per_second"] > 0
+    assert results["peak_rss_mb"] > 0
@@ -1,66 +1,96 @@
 # pylint: skip-file
-"""Tests for the load script"""
+"""Tests for the transform script and measurement batches"""
 
-from unittest.mock import mock_open
-from unittest.mock import patch, MagicMock
+from datetime import datetime
 import pytest
-from load import (get_connection_to_db, get_measurements, upload_many_rows,
-                  ingress_measurements_to_db)
+import numpy as np
+import pandas as pd
+from transform import (parse_rfc1123, transform_to_datetime, correct_timezones,
+                       read_data, clean_data, read_batch, clean_batch)
+from measurement_batch import MeasurementBatch
 
 
 @pytest.fixture
-def fake_data():
-    """Fixture providing sample data"""
-    return [
-        (1, 25.5, 40, "2024-03-01", "2024-03-02 12:30:00"),
-        (2, 22.0, 35, "2024-03-02", "2024-03-03 15:45:00")
-    ]
+def raw_df():
+    """Fixture providing raw API shaped rows, one in GMT and one in BST"""
+    return pd.DataFrame({
+        "plant_id": [1, 2],
+        "last_watered": ["Thu, 09 Jan 2025 14:03:04 GMT", "Thu, 03 Apr 2025 13:54:32 GMT"],
+        "measurement_time": ["2025-01-09 16:19:32", "2025-04-03 16:19:37"]
+    })
+
+
+def test_parse_rfc1123():
+    """Test RFC-1123 strings are parsed to UTC and invalid values coerced"""
+    parsed = parse_rfc1123(pd.Series(["Thu, 03 Apr 2025 14:03:04 GMT", "not a date", None]))
+
+    assert parsed[0] == pd.Timestamp("2025-04-03 14:03:04", tz="UTC")
+    assert parsed[1:].isna().all()
 
 
-@patch("load.pymssql.connect")
-def test_get_connection_to_db(mock_connect):
-    """Test that database connection is established"""
-    mock_connect.return_value = MagicMock()
+def test_correct_timezones_follows_dst(raw_df):
+    """Test conversion to local time only adds an hour during daylight saving"""
+    result = correct_timezones(transform_to_datetime(raw_df))
 
-    conn = get_connection_to_db()
+    assert result["measurement_time"].tolist() == [
+        pd.Timestamp("2025-01-09 16:19:32"), pd.Timestamp("2025-04-03 17:19:37")]
+    assert result["last_watered"].tolist() == [
+        pd.Timestamp("2025-01-09 14:03:04"), pd.Timestamp("2025-04-03 14:54:32")]
+    assert result["measurement_time"].dt.tz is None
 
-    mock_connect.assert_called_once()
-    assert conn is not None
+
+@pytest.fixture
+def api_readings():
+    """Fixture providing raw API readings"""
+    return [
+        {"plant_id": 1, "temperature": 12.3456, "soil_moisture": 90.129,
+         "last_watered": "Thu, 03 Apr 2025 14:03:04 GMT", "recording_taken": "2025-04-04 10:00:01"},
+        {"plant_id": 2, "temperature": 11.0, "soil_moisture": 80.0,
+         "last_watered": "Sun, 12 Jan 2025 01:00:00 GMT", "recording_taken": "2025-01-12 09:00:00"},
+        {"error": "plant not found"}
+    ]
 
 
-@patch("builtins.open", new_callable=mock_open,
-       read_data="plant_id,temperature,moisture,last_watered,measurement_time\n1,25.5,40,2024-03-01,2024-03-02 12:30:00\n2,22.0,35,2024-03-02,2024-03-03 15:45:00\n")
-def test_get_measurements(mock_file):
-    """Test that measurements are correctly read from CSV"""
-    measurements = get_measurements()
+def test_clean_batch_matches_dataframe_path(api_readings):
+    """Test that the batch path produces the same rows as the DataFrame path"""
+    batch = clean_batch(read_batch(api_readings))
+    expected = clean_data(read_data(api_readings[:2]))
 
-    assert len(measurements) == 2
-    assert measurements[0] == (
-        "1", "25.5", "40", "2024-03-01", "2024-03-02 12:30:00")
+    assert len(batch) == 2
+    assert batch.plant_id.dtype == "uint16"
+    assert batch.temperature.dtype == "float32"
+    assert batch.to_rows() == [
+        (1, 12.35, 90.13, datetime(2025, 4, 3, 15, 3, 4), datetime(2025, 4, 4, 11, 0, 1)),
+        (2, 11.0, 80.0, datetime(2025, 1, 12, 1, 0), datetime(2025, 1, 12, 9, 0))]
+    assert list(expected["measurement_time"]) == [row[4] for row in batch.to_rows()]
 
 
-@patch("load.pymssql.Connection")
-def test_upload_many_rows(mock_conn, fake_data):
-    """Test that multiple rows are inserted into the database"""
-    mock_cursor = MagicMock()
-    mock_conn.cursor.return_value = mock_cursor
+def test_clean_batch_drops_incomplete_readings(api_readings):
+    """Test readings missing a value or time are dropped before they reach NOT NULL columns"""
+    complete = api_readings[0]
+    readings = [complete,
+                {**complete, "plant_id": 3, "temperature": None},
+                {**complete, "plant_id": 4, "soil_moisture": None},
+                {**complete, "plant_id": 5, "last_watered": None},
+                {**complete, "plant_id": 6, "recording_taken": "not a time"}]
 
-    upload_many_rows(fake_data, mock_conn)
+    batch = clean_batch(read_batch(readings))
 
-    mock_cursor.executemany.assert_called_once()
+    assert batch.plant_id.tolist() == [1]
+    assert None not in batch.to_rows()[0]
 
-    executed_sql = mock_cursor.executemany.call_args[0][0].strip()
-    assert executed_sql.startswith("INSERT into measurement")
 
+def test_batch_to_dataframe_shares_memory(api_readings):
+    """Test that the DataFrame view doesn't copy the batch's arrays"""
+    batch = read_batch(api_readings)
+    df = batch.to_dataframe()
 
-@patch("load.get_connection_to_db")
-@patch("load.upload_many_rows")
-def test_ingress_measurements_to_db(mock_upload, mock_get_conn, fake_data):
-    """Test that measurements are uploaded to the database"""
-    mock_conn = MagicMock()
-    mock_get_conn.return_value = mock_conn
+    assert np.shares_memory(df["plant_id"].to_numpy(), batch.plant_id)
+    assert np.shares_memory(df["measurement_time"].to_numpy(), batch.measurement_time)
+    assert str(df["last_watered"].dtype) == "datetime64[ns]"
 
-    ingress_measurements_to_db(fake_data)
 
-    mock_upload.assert_called_once_with(fake_data, mock_conn)
-    mock_conn.close.assert_called_once()
+def test_batch_mismatched_columns():
+    """Test that columns of different lengths are rejected"""
+    with pytest.raises(ValueError):
+        MeasurementBatch([1], [1.0], [1.0], [0], [0, 1])
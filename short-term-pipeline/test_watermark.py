@@ -0,0 +1,72 @@
+# pylint: skip-file
+"""Tests for the watermark script"""
+
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+import numpy as np
+import pytest
+import watermark
+from measurement_batch import MeasurementBatch
+
+
+def to_ns(*args):
+    """Returns a naive datetime as epoch nanoseconds"""
+    return int(np.datetime64(datetime(*args), "ns").astype(np.int64))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Clears the cached watermarks around each test"""
+    watermark.clear_watermarks()
+    yield
+    watermark.clear_watermarks()
+
+
+@pytest.fixture
+def batch():
+    """Fixture providing a batch with one old reading and one repeated reading"""
+    return MeasurementBatch(
+        plant_id=[1, 1, 2, 2, 3],
+        temperature=[10.0, 11.0, 12.0, 12.0, 13.0],
+        moisture=[80.0, 81.0, 82.0, 82.0, 83.0],
+        last_watered=[0] * 5,
+        measurement_time=[to_ns(2025, 4, 4, 10, 0), to_ns(2025, 4, 4, 10, 1),
+                          to_ns(2025, 4, 4, 10, 1), to_ns(2025, 4, 4, 10, 1),
+                          to_ns(2025, 4, 4, 10, 1)])
+
+
+def test_filter_new_measurements(batch):
+    """Test that readings at or before a watermark and repeats are dropped"""
+    new_batch = watermark.filter_new_measurements(batch, {1: to_ns(2025, 4, 4, 10, 0)})
+
+    assert new_batch.plant_id.tolist() == [1, 2, 3]
+    assert new_batch.temperature.tolist() == [11.0, 12.0, 13.0]
+
+
+def test_update_watermarks_only_moves_forward(batch):
+    """Test that watermarks advance to each plant's latest reading and never go back"""
+    watermark._CACHE["watermarks"] = {3: to_ns(2025, 4, 5)}
+    watermark.update_watermarks(batch)
+
+    assert watermark._CACHE["watermarks"] == {1: to_ns(2025, 4, 4, 10, 1),
+                                              2: to_ns(2025, 4, 4, 10, 1),
+                                              3: to_ns(2025, 4, 5)}
+
+
+def test_get_watermarks_loads_once():
+    """Test that the watermarks are read from the database once per cold start"""
+    conn = MagicMock()
+    conn.cursor.return_value.fetchall.return_value = [(1, datetime(2025, 4, 4, 10, 0))]
+
+    assert watermark.get_watermarks(conn) == {1: to_ns(2025, 4, 4, 10, 0)}
+    assert watermark.get_watermarks(conn) == {1: to_ns(2025, 4, 4, 10, 0)}
+    conn.cursor.return_value.execute.assert_called_once_with(watermark.WATERMARK_SQL)
+
+
+@patch("watermark.get_connection")
+def test_get_watermarks_uses_cached_connection(mock_get_connection):
+    """Test that the shared connection is used when none is given"""
+    mock_get_connection.return_value.cursor.return_value.fetchall.return_value = []
+
+    assert watermark.get_watermarks() == {}
+    mock_get_connection.assert_called_once()
@@ -1,7 +1,15 @@
 # pylint: disable=duplicate-code
 """Script to transform plant measurement data to fit the defined schema"""
-from datetime import timedelta
+import logging
+import numpy as np
 import pandas as pd
+from measurement_batch import MeasurementBatch, NAT
+
+MEASUREMENT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+MONTH_NUMBERS = {month: f"{number:02d}" for number, month in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+LOCAL_TIMEZONE = "Europe/London"
+DATETIME_COLUMNS = ("measurement_time", "last_watered")
 
 
 def read_csv_data(file_name: str) -> pd.DataFrame:
@@ -24,23 +32,33 @@ def read_data(data: list[dict]) -> pd.DataFrame:
     return pd.DataFrame(data_list)
 
 
+def parse_rfc1123(times: pd.Series) -> pd.Series:
+    """Parses fixed-width RFC-1123 strings ('Thu, 03 Apr 2025 14:03:04 GMT') as UTC datetimes.
+    Slicing into ISO strings keeps parsing on pandas' vectorised ISO path instead of strptime"""
+    times = times.astype("string")
+    iso_times = (times.str.slice(12, 16) + "-" + times.str.slice(8, 11).map(MONTH_NUMBERS)
+                 + "-" + times.str.slice(5, 7) + " " + times.str.slice(17, 25))
+    return pd.to_datetime(iso_times, format=MEASUREMENT_TIME_FORMAT, errors="coerce", utc=True)
+
+
 def transform_to_datetime(data: pd.DataFrame) -> pd.DataFrame:
-    """transforming all columns with a date into datetime objects"""
+    """transforming all columns with a date into UTC datetime objects,
+    parsing with the API's explicit formats"""
 
     data['measurement_time'] = pd.to_datetime(
-        data['measurement_time'], errors="coerce")
-    data['last_watered'] = pd.to_datetime(
-        data['last_watered'], errors="coerce")
+        data['measurement_time'], format=MEASUREMENT_TIME_FORMAT, errors="coerce", utc=True)
+    data['last_watered'] = parse_rfc1123(data['last_watered'])
 
     return data
 
 
-def correct_timezones(data: pd.DataFrame) -> pd.DataFrame:
-    '''Corrects measurement time to account for Daylight saving times'''
-    data['measurement_time'] = data['measurement_time'].apply(
-        lambda x: x+timedelta(hours=1))
-    data['last_watered'] = data['last_watered'].apply(
-        lambda x: x+timedelta(hours=1))
+def correct_timezones(data: pd.DataFrame, timezone: str = LOCAL_TIMEZONE) -> pd.DataFrame:
+    '''Converts UTC datetimes to naive local time, following the zone's daylight saving rules'''
+    for column in DATETIME_COLUMNS:
+        times = data[column]
+        if times.dt.tz is None:
+            times = times.dt.tz_localize("UTC")
+        data[column] = times.dt.tz_convert(timezone).dt.tz_localize(None)
     return data
 
 
@@ -61,6 +79,51 @@ def clean_data(data: pd.DataFrame) -> pd.DataFrame:
     return clean_data_df
 
 
+def get_epoch_nanoseconds(times: pd.Series) -> pd.Index:
+    """Returns UTC datetimes as naive epoch nanoseconds, with NaT as int64 min"""
+    return pd.DatetimeIndex(times).tz_convert(None).as_unit("ns").asi8
+
+
+def read_batch(data: list[dict]) -> MeasurementBatch:
+    """reading from list of data straight into a typed measurement batch,
+    parsing times to UTC. Readings without a plant_id are dropped"""
+    readings = [plant for plant in data if plant.get("plant_id") is not None]
+    batch = MeasurementBatch.empty(len(readings))
+    batch.plant_id[:] = [plant["plant_id"] for plant in readings]
+    batch.temperature[:] = [plant.get("temperature") for plant in readings]
+    batch.moisture[:] = [plant.get("soil_moisture") for plant in readings]
+    batch.last_watered[:] = get_epoch_nanoseconds(parse_rfc1123(
+        pd.Series([plant.get("last_watered") for plant in readings], dtype="string")))
+    batch.measurement_time[:] = get_epoch_nanoseconds(pd.to_datetime(
+        pd.Series([plant.get("recording_taken") for plant in readings], dtype="string"),
+        format=MEASUREMENT_TIME_FORMAT, errors="coerce", utc=True))
+    return batch
+
+
+def drop_incomplete_readings(batch: MeasurementBatch) -> MeasurementBatch:
+    '''Returns the batch without readings missing a temperature, moisture or either time,
+    since every measurement column is NOT NULL and one bad row would fail the whole insert'''
+    is_complete = (np.isfinite(batch.temperature) & np.isfinite(batch.moisture)
+                   & (batch.last_watered != NAT) & (batch.measurement_time != NAT))
+    if is_complete.all():
+        return batch
+    logging.warning("Dropping %s incomplete readings", int((~is_complete).sum()))
+    return batch.select(is_complete)
+
+
+def clean_batch(batch: MeasurementBatch, timezone: str = LOCAL_TIMEZONE) -> MeasurementBatch:
+    '''Cleans a measurement batch, dropping incomplete readings, rounding readings and
+    converting UTC times to naive local time'''
+    batch = drop_incomplete_readings(batch)
+    for column in ("temperature", "moisture"):
+        values = getattr(batch, column)
+        values.round(2, out=values)
+    for column in DATETIME_COLUMNS:
+        times = pd.DatetimeIndex(batch.get_times(column)).tz_localize("UTC")
+        getattr(batch, column)[:] = times.tz_convert(timezone).tz_localize(None).as_unit("ns").asi8
+    return batch
+
+
 def save_clean_data_to_csv(data: pd.DataFrame):
     """applying all transformations to the dataframe and saving clean
     data to csv file"""
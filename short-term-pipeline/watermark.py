@@ -0,0 +1,66 @@
+# pylint: disable=no-member
+"""Per-plant watermarks of the last ingested measurement_time, kept across warm invocations"""
+import numpy as np
+import pymssql
+from db_connection import get_connection
+from measurement_batch import MeasurementBatch, NAT
+
+WATERMARK_SQL = """
+    SELECT plant_id, MAX(measurement_time)
+    FROM measurement
+    GROUP BY plant_id;
+    """
+
+_CACHE = {"loaded": False, "watermarks": {}}
+
+
+def load_watermarks(conn: pymssql.Connection) -> dict[int, int]:
+    """Loads the latest measurement_time of every plant from the database,
+    as naive local epoch nanoseconds"""
+    cur = conn.cursor()
+    cur.execute(WATERMARK_SQL)
+    watermarks = {plant_id: int(np.datetime64(measurement_time, "ns").astype(np.int64))
+                  for plant_id, measurement_time in cur.fetchall()}
+    cur.close()
+    return watermarks
+
+
+def get_watermarks(conn: pymssql.Connection | None = None) -> dict[int, int]:
+    """Returns the cached watermarks, loading them from the database on a cold start"""
+    if not _CACHE["loaded"]:
+        _CACHE["watermarks"] = load_watermarks(conn or get_connection())
+        _CACHE["loaded"] = True
+    return _CACHE["watermarks"]
+
+
+def clear_watermarks() -> None:
+    """Forces the next lookup to reload the watermarks"""
+    _CACHE["loaded"] = False
+    _CACHE["watermarks"] = {}
+
+
+def filter_new_measurements(batch: MeasurementBatch,
+                            watermarks: dict[int, int]) -> MeasurementBatch:
+    """Returns the cleaned measurements that are newer than their plant's watermark,
+    dropping missing times and repeats of a reading within the batch"""
+    plant_ids, inverse = np.unique(batch.plant_id, return_inverse=True)
+    limits = np.array([watermarks.get(plant_id, NAT) for plant_id in plant_ids.tolist()],
+                      dtype=np.int64)
+    is_new = (batch.measurement_time > limits[inverse]) & (batch.measurement_time != NAT)
+
+    keys = np.stack([batch.plant_id.astype(np.int64), batch.measurement_time], axis=1)
+    _, first_rows = np.unique(keys, axis=0, return_index=True)
+    is_first = np.zeros(len(batch), dtype=bool)
+    is_first[first_rows] = True
+
+    return batch.select(is_new & is_first)
+
+
+def update_watermarks(batch: MeasurementBatch) -> None:
+    """Advances the cached watermarks past an ingested batch"""
+    watermarks = _CACHE["watermarks"]
+    plant_ids, inverse = np.unique(batch.plant_id, return_inverse=True)
+    latest = np.full(len(plant_ids), NAT, dtype=np.int64)
+    np.maximum.at(latest, inverse, batch.measurement_time)
+    for plant_id, measurement_time in zip(plant_ids.tolist(), latest.tolist()):
+        watermarks[plant_id] = max(watermarks.get(plant_id, NAT), measurement_time)